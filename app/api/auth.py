@@ -6,9 +6,11 @@ from datetime import datetime, timedelta
 import logging
 import uuid
 
-from app.core.auth import supabase
+from app.core.auth import supabase, verified_tokens
 from app.core.config import settings
+from app.core.entitlements import entitlements
 from app.db.client import log_login_activity
+from app.db.executor import run_sync
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -58,7 +60,7 @@ async def login(request: LoginRequest, response: Response, req: Request):
         logger.info(f"Attempting Supabase authentication for: {request.email}")
         
         # Authenticate with Supabase
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_sync(supabase.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password,
         })
@@ -67,6 +69,9 @@ async def login(request: LoginRequest, response: Response, req: Request):
         session = auth_response.session
         user = auth_response.user
         
+        # Re-resolve the plan on the next request in case it changed
+        entitlements.invalidate(user.id)
+        
         # Set cookie if remember is True
         if request.remember:
             expires = datetime.now() + timedelta(days=30)
@@ -128,7 +133,7 @@ async def signup(request: SignupRequest):
     
     try:
         # Create user with Supabase
-        auth_response = supabase.auth.sign_up({
+        auth_response = await run_sync(supabase.auth.sign_up, {
             "email": request.email,
             "password": request.password,
             "options": {
@@ -159,6 +164,9 @@ async def logout(
     if not token:
         return {"message": "No active session"}
     
+    # Stop accepting the token from the verified token cache
+    verified_tokens.discard(token)
+    
     # Check if Supabase is configured
     if not supabase:
         # Just clear the cookie for development
@@ -167,7 +175,7 @@ async def logout(
     
     try:
         # Sign out with Supabase
-        supabase.auth.sign_out()
+        await run_sync(supabase.auth.sign_out)
         
         # Clear cookie
         response.delete_cookie(key="access_token")
@@ -197,7 +205,7 @@ async def refresh_token(refresh_token: str):
     
     try:
         # Refresh token with Supabase
-        auth_response = supabase.auth.refresh_session(refresh_token)
+        auth_response = await run_sync(supabase.auth.refresh_session, refresh_token)
         
         # Get new session
         session = auth_response.session
@@ -225,7 +233,7 @@ async def reset_password(email: str):
     
     try:
         # Send password reset email with Supabase
-        supabase.auth.reset_password_email(email)
+        await run_sync(supabase.auth.reset_password_email, email)
         
         return {"message": "Password reset email sent"}
     except Exception as e:
@@ -259,7 +267,7 @@ async def get_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends
     
     try:
         # Get user with Supabase
-        user = supabase.auth.get_user(credentials.credentials)
+        user = await run_sync(supabase.auth.get_user, credentials.credentials)
         
         return user.user
     except Exception as e:
@@ -0,0 +1,344 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 512
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best content coding ("br" or "gzip") a client accepts."""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Timestamps written without an offset are UTC
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def last_modified(data: Any) -> Optional[datetime]:
+    """Latest `updated_at` (or `created_at`) among the rows of a response."""
+    rows = data if isinstance(data, list) else [data]
+    latest = None
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        stamp = _parse_timestamp(row.get("updated_at") or row.get("created_at"))
+        if stamp is not None and (latest is None or stamp > latest):
+            latest = stamp
+    # HTTP dates have second precision
+    return latest.replace(microsecond=0) if latest else None
+
+class CachedBody:
+    """A serialized response with its validators and compressed variants."""
+
+    __slots__ = ("version", "expires_at", "etag", "last_modified", "headers", "body", "encoded")
+
+    def __init__(
+        self,
+        version: Hashable,
+        expires_at: float,
+        body: bytes,
+        modified: Optional[datetime],
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.version = version
+        self.expires_at = expires_at
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.last_modified = modified
+        self.headers = headers or {}
+        self.encoded: Dict[str, bytes] = {}
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """
+        Get the ETag of the body in a content coding.
+
+        Each coding is a different representation with different bytes, so
+        it gets its own strong tag ("<hash>-br", "<hash>-gzip").
+        """
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def encode(self, encoding: Optional[str]) -> bytes:
+        """Get the body in a content coding, compressing it once per coding."""
+        if encoding is None:
+            return self.body
+        encoded = self.encoded.get(encoding)
+        if encoded is None:
+            encoded = self.encoded[encoding] = _compress(self.body, encoding)
+        return encoded
+
+class ResponseCache:
+    """
+    Caches serialized JSON responses, with ETags and compressed bodies.
+
+    Entries are keyed by endpoint, entitlement tier and query parameters,
+    and tagged with the version of the data they were built from. Once the
+    data version changes (or `ttl` seconds pass, to pick up writes made by
+    other processes) the entry is rebuilt on the next request.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[CachedBody]:
+        """Get a still-valid entry for a key and data version."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.version == version and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, version: Hashable, data: Any, headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        """Serialize data and cache it, with any extra headers it is served with."""
+        body = json.dumps(jsonable_encoder(data), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        entry = CachedBody(version, time.monotonic() + self.ttl, body, last_modified(data), headers)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and hit/miss counters of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "name": "responses",
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+def _not_modified(request: Request, entry: CachedBody, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    # If-Modified-Since is only consulted without If-None-Match
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or entry.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return entry.last_modified <= since
+
+async def conditional_json(
+    request: Request,
+    cache: ResponseCache,
+    key: Hashable,
+    version: Hashable,
+    load: Callable[[], Awaitable[Any]],
+    private: bool = False,
+    headers: Optional[Callable[[Any], Dict[str, str]]] = None,
+) -> Response:
+    """
+    Serve JSON with validators, answering conditional requests with 304.
+
+    `load` is only awaited when no cached entry exists for the key and data
+    version, so a matching If-None-Match is answered without querying or
+    serializing anything. The ETag names the content coding the client is
+    sent, so caches never confuse compressed and uncompressed bodies.
+
+    Args:
+        request: The incoming request
+        cache: Cache holding the serialized responses
+        key: Endpoint, tier and query parameters identifying the response
+        version: Version of the underlying data
+        load: Coroutine function producing the response data
+        private: Whether the response depends on the user's credentials
+        headers: Function returning extra headers for the loaded data, cached
+            along with the body
+    """
+    entry = cache.get(key, version)
+    if entry is None:
+        data = await load()
+        entry = cache.put(key, version, data, headers(data) if headers else None)
+
+    encoding = None
+    if len(entry.body) >= MIN_COMPRESS_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+
+    etag = entry.etag_for(encoding)
+    response_headers = {
+        **entry.headers,
+        "ETag": etag,
+        "Cache-Control": f"{'private' if private else 'public'}, no-cache",
+        "Vary": "Accept-Encoding, Authorization, Cookie",
+    }
+    if entry.last_modified is not None:
+        response_headers["Last-Modified"] = format_datetime(entry.last_modified, usegmt=True)
+
+    if _not_modified(request, entry, etag):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding is not None:
+        response_headers["Content-Encoding"] = encoding
+
+    return Response(content=entry.encode(encoding), media_type="application/json", headers=response_headers)
+
+# "first-last", "first-" or "-suffix length" of a `bytes=` Range header
+_BYTE_RANGE = re.compile(r"([0-9]*)-([0-9]*)")
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into inclusive (start, end) offsets.
+
+    Returns None when the header is absent, malformed or can't be honoured
+    as a single range (the whole body is sent instead, as RFC 9110 asks for
+    invalid ranges).
+
+    Raises:
+        ValueError: If a well-formed range lies entirely outside the body
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    match = _BYTE_RANGE.fullmatch(spec)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length <= 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+
+    if start >= size:
+        raise ValueError("Range starts past the end")
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+def _read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+async def ranged_file(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serve a file with validators and byte-range support, so interrupted
+    downloads of large files can be resumed.
+
+    Args:
+        request: The incoming request
+        path: File to serve
+        media_type: Content type of the file
+        etag: Strong ETag of the file's contents (quoted)
+        headers: Extra response headers
+    """
+    response_headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    # A Range is ignored if the client's copy is of another version
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**response_headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=response_headers)
+
+    start, end = byte_range
+    body = await run_in_threadpool(_read_range, path, start, end)
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=body, status_code=206, media_type=media_type, headers=response_headers)
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, AsyncIterator, Callable, FrozenSet, Optional
+from datetime import datetime, timezone
+import json
+import logging
 
-from app.core.auth import get_current_user, can_access_category
-from app.db import client
-from app.db.models import Location, LocationCreate, LocationUpdate, Category
+from app.core.auth import get_access_token, get_current_user, get_entitlement
+from app.core.config import settings
+from app.core.entitlements import Entitlement
+from app.db import bulk, client
+from app.db.hours import minute_of_week
+from app.db.models import Location, LocationCreate, LocationUpdate, Category, FavoritesUpdate
+from app.db.packs import PackInfo, is_version, pack_builder
+from app.db.spatial import parse_bbox
 from app.api.auth import auth_router
+from app.api.responses import ResponseCache, conditional_json, ranged_file
+
+# Initialize logger
+logger = logging.getLogger(__name__)
 
 # Create API router
 api_router = APIRouter()
@@ -12,57 +25,329 @@ api_router = APIRouter()
 # Include auth routes
 api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 
+# Serialized responses of the read-mostly endpoints, with ETags
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
+
+def _response_variant(user: Optional[Dict[str, Any]], entitlement: Entitlement) -> str:
+    """Which version of a response a user gets (anonymous, free or premium)."""
+    return "anonymous" if user is None else entitlement.tier
+
+def _check_location_access(location: Dict[str, Any], user: Optional[Dict[str, Any]], entitlement: Entitlement) -> None:
+    """Raise 403 if the user can't see a location."""
+    if location.get("premium_only", False) and user is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You need a premium subscription to access this location",
+        )
+    
+    if not entitlement.can_access(location["category_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You need a premium subscription to access this category",
+        )
+
+def _mark_favorites(locations: List[Dict[str, Any]], favorites: Optional[FrozenSet[int]]) -> List[Dict[str, Any]]:
+    """Add an `is_favorite` flag to each location (not for anonymous visitors)."""
+    if favorites is None:
+        return locations
+    return [{**location, "is_favorite": location["id"] in favorites} for location in locations]
+
 @api_router.get("/categories", response_model=List[Dict[str, Any]])
-async def get_categories(user: Optional[Dict[str, Any]] = Depends(get_current_user)):
+async def get_categories(
+    request: Request,
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+):
     """Get all categories."""
-    categories = await client.get_categories()
-    
-    # Filter out premium categories for free users
-    if user is None:
-        categories = [cat for cat in categories if not cat.get("premium_only", False)]
+    async def load():
+        categories = await client.get_categories()
+        
+        # Filter out premium categories for free users
+        if user is None:
+            categories = [cat for cat in categories if not cat.get("premium_only", False)]
+        
+        return categories
     
-    return categories
+    return await conditional_json(
+        request,
+        response_cache,
+        ("categories", _response_variant(user, entitlement)),
+        client.dataset_versions["categories"],
+        load,
+        private=user is not None,
+    )
+
+async def _stream_ndjson(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    visible: Callable[[Dict[str, Any]], bool],
+) -> AsyncIterator[bytes]:
+    """Serialize pages of rows as NDJSON, one chunk per page, skipping rows the viewer can't see."""
+    try:
+        async for page in pages:
+            chunk = "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in page if visible(row))
+            if chunk:
+                yield chunk.encode("utf-8")
+    except Exception as e:
+        # Headers are already sent; aborting the stream tells the client it's incomplete
+        logger.error(f"Error streaming locations: {str(e)}")
+        raise
 
 @api_router.get("/locations", response_model=List[Dict[str, Any]])
 async def get_locations(
+    request: Request,
     category_id: Optional[str] = None,
     search: Optional[str] = None,
+    bbox: Optional[str] = Query(None, description="Viewport as minLng,minLat,maxLng,maxLat"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Current map zoom level"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitude to search around"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Longitude to search around"),
+    radius: Optional[float] = Query(None, gt=0, le=50000, description="Search radius in meters"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    open_now: bool = Query(False, description="Only locations open right now"),
+    open_at: Optional[datetime] = Query(None, description="Only locations open at this time (ISO 8601; local time without an offset)"),
+    sort: Optional[str] = Query(None, pattern="^(popular|trending)$", description="Rank by views and favorites, all-time (decaying weekly) or right now"),
+    stream: bool = Query(False, description="Stream every match as NDJSON"),
     user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+    access_token: Optional[str] = Depends(get_access_token),
 ):
     """
     Get locations with optional filtering.
     
+    With `stream=true` or `Accept: application/x-ndjson`, every matching
+    location is streamed as NDJSON while it is read from the database page
+    by page, instead of one JSON page. Search, nearest and sorted queries
+    stream their single ranked page (`limit`/`offset` apply only to them);
+    other streams start after `cursor` when one is given.
+    
+    Unless ranked by search relevance or distance, locations are ordered by
+    ID. A full page carries an `X-Next-Cursor` header; pass it back as
+    `cursor` to get the next page.
+    
+    When `bbox` is given only locations visible in that viewport are returned,
+    answered from the in-process spatial index.
+    
+    When `lat` and `lng` are given the nearest locations are returned sorted
+    by distance, each with a `distance_meters` field; `radius` restricts them
+    to that many meters.
+    
+    `open_now=true` or `open_at` only returns locations whose operating
+    hours include that moment, answered from the opening-hours index.
+    Times without a UTC offset are in the locations' timezone.
+    
+    `sort=popular` or `sort=trending` ranks locations by their time-decayed
+    view and favorite scores, read from the in-process rankings kept per
+    category and map cell. Ranked pages are cached for up to
+    RESPONSE_CACHE_TTL seconds and use `offset` rather than cursors.
+    
+    For signed-in users every location carries an `is_favorite` flag.
+    
     Free users can only access non-premium locations in free categories.
     """
     # Check if the user can access the requested category
-    if category_id and not can_access_category(user, category_id):
+    if category_id and not entitlement.can_access(category_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You need a premium subscription to access this category",
         )
     
-    # Get locations
-    locations = await client.get_locations(
-        category_id=category_id,
-        search_query=search,
-        limit=limit,
-        offset=offset,
+    # Parse the viewport
+    viewport = None
+    if bbox:
+        try:
+            viewport = parse_bbox(bbox)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid bbox: {str(e)}",
+            )
+    
+    if (lat is None) != (lng is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="lat and lng must be given together",
+        )
+    
+    if radius is not None and lat is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="radius requires lat and lng",
+        )
+    
+    if open_now and open_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="open_now and open_at can't be used together",
+        )
+    open_time = datetime.now(timezone.utc) if open_now else open_at
+    # Results only change per minute of the week
+    open_minute = None if open_time is None else minute_of_week(open_time, client.location_timezone)
+    
+    # One cached set per user, so flagging a page is a lookup per row
+    favorites = await client.get_favorite_ids(user["id"], access_token) if user else None
+    
+    if sort and (search or lat is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort can't be used with search or lat/lng",
+        )
+    
+    paginated = not search and lat is None and not sort
+    if cursor and not paginated:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="cursor can't be used with search, lat/lng or sort",
+        )
+    
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        if paginated:
+            # Checked before streaming starts, while a 400 can still be sent
+            try:
+                after_id = client.decode_location_cursor(cursor) if cursor else None
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid cursor: {str(e)}",
+                )
+            pages = client.iter_locations(
+                category_id=category_id,
+                bbox=viewport,
+                page_size=settings.STREAM_PAGE_SIZE,
+                open_at=open_time,
+                after_id=after_id,
+            )
+        else:
+            async def ranked_page():
+                yield await client.get_locations(
+                    category_id=category_id,
+                    search_query=search,
+                    bbox=viewport,
+                    latitude=lat,
+                    longitude=lng,
+                    radius=radius,
+                    limit=limit,
+                    offset=offset,
+                    open_at=open_time,
+                    sort=sort,
+                )
+            pages = ranked_page()
+        
+        # Free users only get non-premium locations, checked per row as
+        # they stream
+        def visible(location):
+            return user is not None or not location.get("premium_only", False)
+        
+        async def marked_pages():
+            async for page in pages:
+                yield _mark_favorites(page, favorites)
+        
+        return StreamingResponse(_stream_ndjson(marked_pages(), visible), media_type="application/x-ndjson")
+    
+    async def load():
+        # Free users only get non-premium locations. Filtering in the query
+        # rather than afterwards keeps pages full, so cursors stay valid.
+        locations = await client.get_locations(
+            category_id=category_id,
+            premium_only=False if user is None else None,
+            search_query=search,
+            bbox=viewport,
+            latitude=lat,
+            longitude=lng,
+            radius=radius,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            open_at=open_time,
+            sort=sort,
+        )
+        return _mark_favorites(locations, favorites)
+    
+    def next_cursor(locations):
+        if paginated and len(locations) == limit:
+            return {"X-Next-Cursor": client.location_cursor(locations[-1])}
+        return {}
+    
+    # zoom doesn't change the result, so it isn't part of the key. Users
+    # without favorites share their tier's responses.
+    owner = user["id"] if favorites else None
+    key = ("locations", _response_variant(user, entitlement), owner, category_id, search, viewport, lat, lng, radius, limit, offset, cursor, open_minute, sort)
+    try:
+        return await conditional_json(
+            request,
+            response_cache,
+            key,
+            (client.dataset_versions["locations"], favorites),
+            load,
+            private=user is not None,
+            headers=next_cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {str(e)}",
+        )
+
+# Media types of the bulk import/export formats
+BULK_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@api_router.get("/locations/export")
+async def export_locations(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Stream every location as NDJSON or CSV (admin only).
+    
+    The table is read page by page while the response is sent, so exports
+    never hold the whole table in memory.
+    """
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can export locations",
+        )
+    
+    return StreamingResponse(
+        bulk.export_locations(format),
+        media_type=BULK_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="locations.{format}"'},
     )
+
+@api_router.get("/locations/clusters", response_model=List[Dict[str, Any]])
+async def get_location_clusters(
+    bbox: str = Query(..., description="Viewport as minLng,minLat,maxLng,maxLat"),
+    zoom: int = Query(..., ge=0, le=22, description="Current map zoom level"),
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+):
+    """
+    Get pre-aggregated marker clusters for a viewport.
     
-    # Filter out premium locations for free users
-    if user is None:
-        locations = [loc for loc in locations if not loc.get("premium_only", False)]
+    The number of clusters depends on the viewport size rather than on how
+    many locations are inside it. Premium locations are left out for
+    anonymous users.
+    """
+    try:
+        viewport = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid bbox: {str(e)}",
+        )
     
-    return locations
+    clusters = await client.get_location_clusters(viewport, zoom, include_premium=user is not None)
+    return clusters
 
 @api_router.get("/locations/{location_id}", response_model=Dict[str, Any])
 async def get_location(
+    request: Request,
     location_id: int,
     user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+    access_token: Optional[str] = Depends(get_access_token),
 ):
-    """Get a specific location by ID."""
+    """Get a specific location by ID, recording the view."""
     location = await client.get_location(location_id)
     
     if not location:
@@ -71,21 +356,45 @@ async def get_location(
             detail="Location not found",
         )
     
-    # Check if the user can access this location
-    if location.get("premium_only", False) and user is None:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You need a premium subscription to access this location",
-        )
+    _check_location_access(location, user, entitlement)
+    
+    # Queued for the background view writer; never waits for the database
+    client.record_location_view(location_id, user["id"] if user else None, request.client.host if request.client else None)
+    
+    if user:
+        location = {**location, "is_favorite": location_id in await client.get_favorite_ids(user["id"], access_token)}
+    return location
+
+@api_router.get("/tiles/{z}/{x}/{y}")
+async def get_location_tile(
+    z: int = Path(..., ge=0, le=settings.TILE_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    entitlement: Entitlement = Depends(get_entitlement),
+):
+    """
+    Get the locations in a slippy-map tile as a GeoJSON FeatureCollection.
     
-    # Check if the user can access this category
-    if not can_access_category(user, location["category_id"]):
+    Tiles are filtered by the caller's entitlement, so free users only get
+    locations in the free categories.
+    """
+    if x >= 1 << z or y >= 1 << z:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You need a premium subscription to access this category",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tile not found",
         )
     
-    return location
+    tile = await client.get_location_tile(z, x, y, entitlement.tier)
+    
+    return Response(
+        content=tile,
+        media_type="application/geo+json",
+        headers={
+            # Free tiles are the same for everyone, so shared caches may keep them
+            "Cache-Control": "private, max-age=300" if entitlement.is_premium else "public, max-age=300",
+            "Vary": "Authorization, Cookie",
+        },
+    )
 
 @api_router.post("/locations", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
 async def create_location(
@@ -104,6 +413,45 @@ async def create_location(
     new_location = await client.create_location(location.dict())
     return new_location
 
+@api_router.post("/locations/import", response_model=Dict[str, Any])
+async def import_locations(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Defaults to the Content-Type"),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Bulk import locations from an NDJSON or CSV request body (admin only).
+    
+    The body is parsed as it arrives and saved in batches. Rows with an `id`
+    update that location. Returns the number of rows received, imported and
+    failed, with the line number and reason of each failure. If the database
+    times out or can't be reached the import stops and the report is
+    returned with a 503, its `aborted` naming the first line not known to
+    be saved.
+    """
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can import locations",
+        )
+    
+    if not client.supabase:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase not configured",
+        )
+    
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    
+    report = await bulk.import_locations(request.stream(), format)
+    if report.aborted:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=report.to_dict(),
+        )
+    return report.to_dict()
+
 @api_router.put("/locations/{location_id}", response_model=Dict[str, Any])
 async def update_location(
     location_id: int,
@@ -159,14 +507,124 @@ async def delete_location(
             detail="Failed to delete location",
         )
 
+@api_router.get("/offline/regions", response_model=List[Dict[str, Any]])
+async def get_offline_regions():
+    """Get the regions that can be downloaded for offline use."""
+    return [
+        {"id": region, "bbox": list(bbox)}
+        for region, bbox in pack_builder.regions.items()
+    ]
+
+async def _get_region_pack(
+    region: str,
+    categories: Optional[str],
+    tiles: bool,
+    entitlement: Entitlement,
+) -> PackInfo:
+    """Resolve the current pack for a request, checking the user's plan."""
+    if not entitlement.is_premium:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You need a premium subscription to download offline maps",
+        )
+    
+    if region not in pack_builder.regions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Region not found",
+        )
+    
+    category_ids = None
+    if categories:
+        category_ids = sorted({category.strip() for category in categories.split(",") if category.strip()})
+        known = {cat["id"] for cat in await client.get_categories()}
+        unknown = [category for category in category_ids if category not in known]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown categories: {', '.join(unknown)}",
+            )
+    
+    pack = await pack_builder.get_pack(region, category_ids, tiles)
+    if pack is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Offline maps are temporarily unavailable",
+        )
+    return pack
+
+@api_router.get("/offline/regions/{region}/manifest", response_model=Dict[str, Any])
+async def get_region_pack_manifest(
+    region: str,
+    categories: Optional[str] = Query(None, description="Comma-separated category IDs (all if omitted)"),
+    tiles: bool = Query(False, description="Include precomputed map tiles"),
+    entitlement: Entitlement = Depends(get_entitlement),
+):
+    """
+    Get the current version of a region pack and the versions it has
+    delta packs from (premium only).
+    
+    Clients compare the version with the one they hold and download either
+    nothing, a delta or the full pack.
+    """
+    pack = await _get_region_pack(region, categories, tiles, entitlement)
+    return pack.to_dict()
+
+@api_router.get("/offline/regions/{region}/pack")
+async def get_region_pack(
+    request: Request,
+    region: str,
+    categories: Optional[str] = Query(None, description="Comma-separated category IDs (all if omitted)"),
+    tiles: bool = Query(False, description="Include precomputed map tiles"),
+    since: Optional[str] = Query(None, description="Pack version the client already has"),
+    entitlement: Entitlement = Depends(get_entitlement),
+):
+    """
+    Download a region pack as gzipped JSON (premium only).
+    
+    With `since`, a delta pack from that version is sent when one exists,
+    otherwise the full pack; the `X-Pack-Type` header says which. Byte
+    ranges are supported so interrupted downloads can be resumed.
+    """
+    pack = await _get_region_pack(region, categories, tiles, entitlement)
+    
+    path, pack_type = pack.path, "full"
+    if since and is_version(since):
+        if since == pack.version:
+            return Response(status_code=304, headers={"ETag": f'"{pack.version}"'})
+        delta = pack.deltas.get(since)
+        if delta is not None and delta.exists():
+            path, pack_type = delta, "delta"
+    
+    etag = f'"{pack.version}"' if pack_type == "full" else f'"{since}-{pack.version}"'
+    return await ranged_file(
+        request,
+        str(path),
+        "application/gzip",
+        etag,
+        headers={
+            "X-Pack-Type": pack_type,
+            "X-Pack-Version": pack.version,
+            "Content-Disposition": f'attachment; filename="{path.name}"',
+        },
+    )
+
 @api_router.get("/subscription-plans", response_model=List[Dict[str, Any]])
-async def get_subscription_plans():
+async def get_subscription_plans(request: Request):
     """Get all subscription plans."""
-    plans = await client.get_subscription_plans()
-    return plans
+    return await conditional_json(
+        request,
+        response_cache,
+        ("subscription-plans",),
+        client.dataset_versions["subscription_plans"],
+        client.get_subscription_plans,
+    )
 
 @api_router.get("/user/subscription", response_model=Dict[str, Any])
-async def get_user_subscription(user: Dict[str, Any] = Depends(get_current_user)):
+async def get_user_subscription(
+    user: Dict[str, Any] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+):
     """Get the current user's subscription."""
     if not user:
         raise HTTPException(
@@ -174,8 +632,194 @@ async def get_user_subscription(user: Dict[str, Any] = Depends(get_current_user)
             detail="Not authenticated",
         )
     
-    subscription = await client.get_user_subscription(user["id"])
-    if not subscription:
+    if not entitlement.subscription:
         return {"plan_id": "free", "name": "Free Plan"}
     
-    return subscription
\ No newline at end of file
+    return entitlement.subscription
+
+def _require_user(user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+        )
+    return user
+
+async def _favorite_locations(
+    location_ids: List[int],
+    user: Dict[str, Any],
+    entitlement: Entitlement,
+) -> None:
+    """Check that locations exist and the user can see them before favoriting them."""
+    locations = await client.find_locations(location_ids)
+    missing = sorted(set(location_ids) - {location["id"] for location in locations})
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Locations not found: {', '.join(map(str, missing))}",
+        )
+    for location in locations:
+        _check_location_access(location, user, entitlement)
+
+async def _update_favorites(user_id: str, access_token: Optional[str], add: List[int], remove: List[int]) -> FrozenSet[int]:
+    try:
+        favorites = await client.remove_favorites(user_id, remove, access_token)
+        if add:
+            favorites = await client.add_favorites(user_id, add, access_token)
+        return favorites
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        logger.error(f"Error updating favorites: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Favorites could not be saved",
+        )
+
+@api_router.get("/favorites", response_model=List[Dict[str, Any]])
+async def get_favorites(
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+    access_token: Optional[str] = Depends(get_access_token),
+):
+    """Get the current user's favorite locations, ordered by ID."""
+    user = _require_user(user)
+    favorites = await client.get_favorite_ids(user["id"], access_token)
+    locations = await client.find_locations(favorites)
+    # Hide favorites of locations the user's plan no longer covers
+    locations = [location for location in locations if entitlement.can_access(location["category_id"])]
+    return _mark_favorites(locations, favorites)
+
+@api_router.post("/favorites", response_model=Dict[str, Any])
+async def update_favorites(
+    update: FavoritesUpdate,
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+    access_token: Optional[str] = Depends(get_access_token),
+):
+    """
+    Add and remove many favorites at once, for clients syncing offline changes.
+    
+    Each list is written with a single query, and adding a favorite twice or
+    removing one that isn't there is not an error. Returns the IDs of every
+    favorite afterwards.
+    """
+    user = _require_user(user)
+    if set(update.add) & set(update.remove):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A location can't be both added and removed",
+        )
+    
+    await _favorite_locations(update.add, user, entitlement)
+    favorites = await _update_favorites(user["id"], access_token, update.add, update.remove)
+    return {"favorites": sorted(favorites)}
+
+@api_router.put("/favorites/{location_id}", response_model=Dict[str, Any])
+async def add_favorite(
+    location_id: int,
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    entitlement: Entitlement = Depends(get_entitlement),
+    access_token: Optional[str] = Depends(get_access_token),
+):
+    """Mark a location as a favorite of the current user."""
+    user = _require_user(user)
+    await _favorite_locations([location_id], user, entitlement)
+    await _update_favorites(user["id"], access_token, [location_id], [])
+    return {"location_id": location_id, "is_favorite": True}
+
+@api_router.delete("/favorites/{location_id}", response_model=Dict[str, Any])
+async def remove_favorite(
+    location_id: int,
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+    access_token: Optional[str] = Depends(get_access_token),
+):
+    """Remove a location from the current user's favorites."""
+    user = _require_user(user)
+    await _update_favorites(user["id"], access_token, [], [location_id])
+    return {"location_id": location_id, "is_favorite": False}
+
+@api_router.get("/admin/cache-stats", response_model=List[Dict[str, Any]])
+async def get_cache_stats(user: Dict[str, Any] = Depends(get_current_user)):
+    """Get query cache sizes and hit/miss counters (admin only)."""
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view cache stats",
+        )
+    
+    return client.get_cache_stats() + [response_cache.stats()]
+
+@api_router.get("/admin/location-views/{location_id}", response_model=List[Dict[str, Any]])
+async def get_location_views(
+    location_id: int,
+    period: str = Query("hour", pattern="^(hour|day)$"),
+    limit: int = Query(24, ge=1, le=366),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Get a location's view counts per hour or day, newest first (admin only)."""
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view location views",
+        )
+    
+    return await client.get_location_view_counts(location_id, period, limit)
+
+@api_router.get("/admin/login-stats", response_model=Dict[str, Any])
+async def get_login_stats(
+    period: str = Query("hour", pattern="^(minute|hour|day)$"),
+    limit: int = Query(24, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100, description="Number of IP addresses and user agents"),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Get login counts by status per minute, hour or day, newest first, and
+    today's most frequent IP addresses and user agents (admin only).
+    
+    Read from rollups kept up to date as logins are logged, so this never
+    scans the login activities.
+    """
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view login stats",
+        )
+    
+    return await client.get_login_stats(period, limit, top)
+
+@api_router.get("/admin/login-activities", response_model=List[Dict[str, Any]])
+async def get_login_activities(
+    response: Response,
+    user_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Get login activities, most recent first (admin only).
+    
+    A full page carries an `X-Next-Cursor` header; pass it back as `cursor`
+    to get the next page.
+    """
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view login activities",
+        )
+    
+    try:
+        activities = await client.get_login_activities(user_id=user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {str(e)}",
+        )
+    
+    if len(activities) == limit:
+        response.headers["X-Next-Cursor"] = client.login_activity_cursor(activities[-1])
+    
+    return activities
\ No newline at end of file
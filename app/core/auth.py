@@ -1,11 +1,19 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client, Client
-from typing import Optional, Dict, Any
+from supabase.lib.client_options import ClientOptions
+from typing import Optional, Dict, Any, Tuple
+from collections import OrderedDict
+import hashlib
 import logging
+import time
 from datetime import datetime
 
+import jwt
+
 from app.core.config import settings
+from app.core.entitlements import Entitlement, entitlements
+from app.db.executor import run_sync
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -13,7 +21,11 @@ logger = logging.getLogger(__name__)
 # Initialize Supabase client with error handling
 try:
     if settings.SUPABASE_URL and settings.SUPABASE_KEY:
-        supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        supabase: Client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=ClientOptions(postgrest_client_timeout=settings.DB_TIMEOUT),
+        )
     else:
         logger.warning("Supabase credentials not configured. Using mock client.")
         supabase = None
@@ -24,6 +36,140 @@ except Exception as e:
 # Security scheme for JWT tokens
 security = HTTPBearer(auto_error=False)
 
+# JWKS client for asymmetric Supabase signing keys; keys are cached after
+# the first fetch, which `load_signing_keys` does at startup
+jwks_client = jwt.PyJWKClient(settings.SUPABASE_JWKS_URL) if settings.SUPABASE_JWKS_URL else None
+
+# Algorithms accepted for each kind of signing key
+SECRET_ALGORITHMS = ["HS256"]
+JWKS_ALGORITHMS = ["RS256", "ES256"]
+
+class VerifiedTokenCache:
+    """
+    LRU cache of authenticated users keyed by a hash of their access token.
+    
+    Entries expire at the token's `exp` claim or after the configured TTL,
+    whichever comes first, so a cached token is never trusted past its
+    lifetime.
+    """
+    
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached user for a token, or None if missing or expired."""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return user
+    
+    def put(self, token: str, user: Dict[str, Any], expires_at: Optional[float] = None) -> None:
+        """Cache the user for a token until `expires_at` (a Unix timestamp)."""
+        ttl_expiry = time.time() + self.ttl
+        expires_at = min(expires_at, ttl_expiry) if expires_at else ttl_expiry
+        
+        key = self._key(token)
+        self._entries[key] = (expires_at, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def discard(self, token: str) -> None:
+        """Forget a token, e.g. on logout."""
+        self._entries.pop(self._key(token), None)
+
+# Cache of tokens that have already been verified
+verified_tokens = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+def load_signing_keys() -> None:
+    """Fetch the JWKS signing keys so the first request doesn't pay for it."""
+    if not jwks_client:
+        return
+    
+    try:
+        jwks_client.get_signing_keys()
+        logger.info("Loaded Supabase JWKS signing keys")
+    except Exception as e:
+        logger.error(f"Error loading JWKS signing keys: {str(e)}")
+
+def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify an access token locally and return its claims.
+    
+    Returns None if the token can't be verified locally because no matching
+    key is configured. Raises jwt.InvalidTokenError if the token is invalid.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    
+    if algorithm in SECRET_ALGORITHMS and settings.SUPABASE_JWT_SECRET:
+        key = settings.SUPABASE_JWT_SECRET
+    elif algorithm in JWKS_ALGORITHMS and jwks_client:
+        try:
+            key = jwks_client.get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as e:
+            logger.warning(f"No JWKS signing key for token: {str(e)}")
+            return None
+    else:
+        return None
+    
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience="authenticated",
+        options={"require": ["exp", "sub"]},
+    )
+
+def user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a user dict shaped like Supabase Auth's user from token claims."""
+    return {
+        "id": claims["sub"],
+        "aud": claims.get("aud"),
+        "role": claims.get("role"),
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "app_metadata": claims.get("app_metadata", {}),
+        "user_metadata": claims.get("user_metadata", {}),
+        "is_anonymous": claims.get("is_anonymous", False),
+    }
+
+def get_access_token(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> Optional[str]:
+    """
+    Get the caller's access token, from the session cookie or the
+    Authorization header.
+    
+    Queries made on the user's behalf send it to Supabase, so row level
+    security applies to that user. It isn't verified here; see
+    get_current_user.
+    """
+    # Check for token in cookies first (for browser sessions)
+    token = request.cookies.get("access_token")
+    
+    # If not in cookies, check for token in Authorization header
+    if not token and credentials:
+        token = credentials.credentials
+    return token
+
 async def get_current_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
@@ -46,21 +192,42 @@ async def get_current_user(
             "created_at": datetime.now().isoformat(),
         }
         
-    # Check for token in cookies first (for browser sessions)
-    token = request.cookies.get("access_token")
-    
-    # If not in cookies, check for token in Authorization header
-    if not token and credentials:
-        token = credentials.credentials
+    token = get_access_token(request, credentials)
     
     # If no token found, return None (unauthenticated)
     if not token:
         return None
     
+    # Tokens seen before are answered from the cache
+    user_data = verified_tokens.get(token)
+    if user_data:
+        return user_data
+    
+    # Verify the token locally when a signing key is configured
     try:
-        # Verify the token with Supabase
-        user = supabase.auth.get_user(token)
+        claims = decode_token(token)
+    except jwt.InvalidTokenError as e:
+        logger.info(f"Rejected token: {str(e)}")
+        return None
+    
+    if claims is not None:
+        user_data = user_from_claims(claims)
+        verified_tokens.put(token, user_data, claims["exp"])
+        logger.info(f"Authenticated user: {user_data.get('email')}")
+        return user_data
+    
+    try:
+        # Fall back to verifying the token with Supabase
+        user = await run_sync(supabase.auth.get_user, token)
         user_data = user.dict()["user"]
+        
+        # Cache the result until the token expires
+        try:
+            expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.InvalidTokenError:
+            expires_at = None
+        verified_tokens.put(token, user_data, expires_at)
+        
         logger.info(f"Authenticated user: {user_data.get('email')}")
         return user_data
     except Exception as e:
@@ -68,41 +235,26 @@ async def get_current_user(
         # Invalid token
         return None
 
+async def get_entitlement(
+    user: Optional[Dict[str, Any]] = Depends(get_current_user),
+) -> Entitlement:
+    """Dependency resolving the current user's entitlement."""
+    return await entitlements.resolve(user)
+
 async def get_subscription_plan(user_id: str) -> str:
     """Get the user's subscription plan."""
-    if not user_id or not supabase:
+    if not user_id:
         return settings.FREE_PLAN_ID
     
-    try:
-        # Query the user's subscription from Supabase
-        response = supabase.table("user_subscriptions").select("plan_id").eq("user_id", user_id).execute()
-        
-        if response.data and len(response.data) > 0:
-            return response.data[0]["plan_id"]
-        else:
-            # Default to free plan if no subscription found
-            return settings.FREE_PLAN_ID
-    except Exception as e:
-        logger.error(f"Error getting subscription plan: {str(e)}")
-        # On error, default to free plan
-        return settings.FREE_PLAN_ID
+    entitlement = await entitlements.resolve_user_id(user_id)
+    return entitlement.plan_id
 
-def has_premium_access(user: Optional[Dict[str, Any]]) -> bool:
+async def has_premium_access(user: Optional[Dict[str, Any]]) -> bool:
     """Check if the user has premium access."""
-    if not user:
-        return False
-    
-    # Get the user's subscription plan
-    plan_id = get_subscription_plan(user["id"])
-    
-    # Check if the plan is premium
-    return plan_id == settings.PREMIUM_PLAN_ID
+    entitlement = await entitlements.resolve(user)
+    return entitlement.is_premium
 
-def can_access_category(user: Optional[Dict[str, Any]], category: str) -> bool:
+async def can_access_category(user: Optional[Dict[str, Any]], category: str) -> bool:
     """Check if the user can access a specific category."""
-    # Premium users can access all categories
-    if has_premium_access(user):
-        return True
-    
-    # Free users can only access certain categories
-    return category in settings.FREE_CATEGORIES
\ No newline at end of file
+    entitlement = await entitlements.resolve(user)
+    return entitlement.can_access(category)
\ No newline at end of file
@@ -15,11 +15,114 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
     
+    # Supabase call settings (worker threads for blocking client calls, and
+    # per-call timeout in seconds)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "16"))
+    DB_TIMEOUT: float = float(os.getenv("DB_TIMEOUT", "10"))
+    
+    # Database backend ("supabase", or "local" for an in-memory stand-in of
+    # the data tables used in development and load tests) and the local
+    # backend's seed data (NDJSON locations; empty uses the sample data),
+    # added latency and jitter in seconds, and share of calls that fail or
+    # stall past DB_TIMEOUT
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "supabase")
+    LOCAL_DB_SEED_PATH: str = os.getenv("LOCAL_DB_SEED_PATH", "")
+    LOCAL_DB_LATENCY: float = float(os.getenv("LOCAL_DB_LATENCY", "0"))
+    LOCAL_DB_JITTER: float = float(os.getenv("LOCAL_DB_JITTER", "0"))
+    LOCAL_DB_ERROR_RATE: float = float(os.getenv("LOCAL_DB_ERROR_RATE", "0"))
+    LOCAL_DB_STALL_RATE: float = float(os.getenv("LOCAL_DB_STALL_RATE", "0"))
+    
+    # Login activity writer (queue bound, batch size, seconds between flushes,
+    # and file that unwritable events spill to; empty drops them instead)
+    LOGIN_LOG_QUEUE_SIZE: int = int(os.getenv("LOGIN_LOG_QUEUE_SIZE", "10000"))
+    LOGIN_LOG_BATCH_SIZE: int = int(os.getenv("LOGIN_LOG_BATCH_SIZE", "500"))
+    LOGIN_LOG_FLUSH_INTERVAL: float = float(os.getenv("LOGIN_LOG_FLUSH_INTERVAL", "2"))
+    LOGIN_LOG_SPILL_PATH: str = os.getenv("LOGIN_LOG_SPILL_PATH", "cache/login_activities.ndjson")
+    
+    # Login activity rollups kept in memory (minutes, hours and days of
+    # counts by status, and IP addresses and user agents tracked per day)
+    LOGIN_STATS_MINUTES: int = int(os.getenv("LOGIN_STATS_MINUTES", "120"))
+    LOGIN_STATS_HOURS: int = int(os.getenv("LOGIN_STATS_HOURS", "48"))
+    LOGIN_STATS_DAYS: int = int(os.getenv("LOGIN_STATS_DAYS", "30"))
+    LOGIN_STATS_TOP_SIZE: int = int(os.getenv("LOGIN_STATS_TOP_SIZE", "100"))
+    
+    # Location view recording (seconds within which repeat views by the same
+    # viewer count once, viewer/location pairs remembered, writer queue
+    # bound, batch size, seconds between flushes, spill file, and hours and
+    # days of view counts kept in memory)
+    VIEW_DEDUP_WINDOW: float = float(os.getenv("VIEW_DEDUP_WINDOW", "1800"))
+    VIEW_DEDUP_SIZE: int = int(os.getenv("VIEW_DEDUP_SIZE", "100000"))
+    VIEW_LOG_QUEUE_SIZE: int = int(os.getenv("VIEW_LOG_QUEUE_SIZE", "10000"))
+    VIEW_LOG_BATCH_SIZE: int = int(os.getenv("VIEW_LOG_BATCH_SIZE", "500"))
+    VIEW_LOG_FLUSH_INTERVAL: float = float(os.getenv("VIEW_LOG_FLUSH_INTERVAL", "5"))
+    VIEW_LOG_SPILL_PATH: str = os.getenv("VIEW_LOG_SPILL_PATH", "cache/location_views.ndjson")
+    VIEW_COUNT_HOURS: int = int(os.getenv("VIEW_COUNT_HOURS", "48"))
+    VIEW_COUNT_DAYS: int = int(os.getenv("VIEW_COUNT_DAYS", "30"))
+    
+    # Catalogue snapshot served during outages and used to warm new workers
+    # (refreshed every SNAPSHOT_INTERVAL seconds, which also reloads the
+    # in-process location indexes if the table changed; 0 disables refreshing)
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", "cache/catalogue.snap")
+    SNAPSHOT_INTERVAL: int = int(os.getenv("SNAPSHOT_INTERVAL", "600"))
+    
+    # Rows per page read from the database for streamed location listings
+    STREAM_PAGE_SIZE: int = int(os.getenv("STREAM_PAGE_SIZE", "500"))
+    
+    # Offline region packs for premium users (regions as
+    # name:minLng,minLat,maxLng,maxLat separated by ";", output directory,
+    # previous versions kept as delta sources, lowest zoom of the clusters and
+    # tiles in a pack, highest tile zoom, and seconds before a pack is checked
+    # for writes made by other workers)
+    OFFLINE_REGIONS: str = os.getenv("OFFLINE_REGIONS", "jakarta:106.65,-6.40,107.00,-6.05")
+    PACK_DIR: str = os.getenv("PACK_DIR", "cache/packs")
+    PACK_HISTORY: int = int(os.getenv("PACK_HISTORY", "5"))
+    PACK_MIN_ZOOM: int = int(os.getenv("PACK_MIN_ZOOM", "10"))
+    PACK_TILE_MAX_ZOOM: int = int(os.getenv("PACK_TILE_MAX_ZOOM", "14"))
+    PACK_MAX_AGE: int = int(os.getenv("PACK_MAX_AGE", "300"))
+    
+    # Bulk location import (rows per insert request, errors kept per report)
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+    IMPORT_MAX_ERRORS: int = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+    
+    # Local JWT verification (the project's JWT secret for HS256 tokens, and/or
+    # the JWKS endpoint for asymmetric keys; leave both empty to always ask
+    # Supabase Auth)
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWKS_URL: str = os.getenv("SUPABASE_JWKS_URL", "")
+    
+    # Verified token cache (entries also expire at the token's own exp)
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_TTL: int = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+    
+    # Metrics (bearer token required to scrape /metrics, empty for none, and
+    # seconds between event-loop lag probes, 0 to disable them)
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    METRICS_LOOP_INTERVAL: float = float(os.getenv("METRICS_LOOP_INTERVAL", "0.5"))
+    
     # Map settings - Jakarta, Indonesia coordinates
     DEFAULT_LAT: float = float(os.getenv("DEFAULT_LAT", "-6.2088"))  # Jakarta latitude
     DEFAULT_LNG: float = float(os.getenv("DEFAULT_LNG", "106.8456"))  # Jakarta longitude
     DEFAULT_ZOOM: int = int(os.getenv("DEFAULT_ZOOM", "13"))
     
+    # Timezone of the locations' operating hours
+    LOCATION_TIMEZONE: str = os.getenv("LOCATION_TIMEZONE", "Asia/Jakarta")
+    
+    # Spatial index settings (grid cell size in degrees, ~1.1 km at the equator)
+    SPATIAL_INDEX_CELL_SIZE: float = float(os.getenv("SPATIAL_INDEX_CELL_SIZE", "0.01"))
+    
+    # Marker clustering settings (zoom above which points are not clustered,
+    # and cluster cell width in pixels)
+    CLUSTER_MAX_ZOOM: int = int(os.getenv("CLUSTER_MAX_ZOOM", "16"))
+    CLUSTER_RADIUS: int = int(os.getenv("CLUSTER_RADIUS", "64"))
+    
+    # Location tile settings (highest zoom served, in-memory LRU size,
+    # on-disk cache directory, where an empty directory disables the disk
+    # cache, and seconds before a cached tile is rebuilt, 0 for never)
+    TILE_MAX_ZOOM: int = int(os.getenv("TILE_MAX_ZOOM", "18"))
+    TILE_CACHE_SIZE: int = int(os.getenv("TILE_CACHE_SIZE", "2048"))
+    TILE_CACHE_DIR: str = os.getenv("TILE_CACHE_DIR", "cache/tiles")
+    TILE_CACHE_MAX_AGE: int = int(os.getenv("TILE_CACHE_MAX_AGE", "3600"))
+    
     # Subscription plans
     FREE_PLAN_ID: str = "free"
     PREMIUM_PLAN_ID: str = "premium"
@@ -27,6 +130,39 @@ class Settings(BaseSettings):
     # Category access (which categories are accessible to free users)
     FREE_CATEGORIES: list = ["restaurants", "cafes"]
     
+    # Entitlement cache (how long a user's resolved plan is trusted, users
+    # kept, and seconds before a lookup that failed is retried)
+    ENTITLEMENT_CACHE_TTL: int = int(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))
+    ENTITLEMENT_CACHE_SIZE: int = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000"))
+    ENTITLEMENT_CACHE_ERROR_TTL: float = float(os.getenv("ENTITLEMENT_CACHE_ERROR_TTL", "5"))
+    
+    # Read-through query cache (missing rows are cached for the shorter TTL)
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+    QUERY_CACHE_TTL: int = int(os.getenv("QUERY_CACHE_TTL", "300"))
+    QUERY_CACHE_NEGATIVE_TTL: int = int(os.getenv("QUERY_CACHE_NEGATIVE_TTL", "30"))
+    
+    # Per-user favorite sets (how long a loaded set is trusted, users kept,
+    # and the most favorites a user can have)
+    FAVORITES_CACHE_TTL: int = int(os.getenv("FAVORITES_CACHE_TTL", "300"))
+    FAVORITES_CACHE_SIZE: int = int(os.getenv("FAVORITES_CACHE_SIZE", "10000"))
+    FAVORITES_MAX_PER_USER: int = int(os.getenv("FAVORITES_MAX_PER_USER", "1000"))
+    
+    # Popular and trending rankings (hours for a view's weight to halve, what
+    # a favorite is worth in views, locations kept ranked per category and
+    # geohash cell, the finest cells' geohash precision (cells two levels
+    # coarser are ranked too), and how often the scores are recomputed from
+    # the database in seconds; 0 disables refreshing)
+    POPULAR_HALF_LIFE_HOURS: float = float(os.getenv("POPULAR_HALF_LIFE_HOURS", "168"))
+    TRENDING_HALF_LIFE_HOURS: float = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+    RANKING_FAVORITE_WEIGHT: float = float(os.getenv("RANKING_FAVORITE_WEIGHT", "5"))
+    RANKING_TOP_K: int = int(os.getenv("RANKING_TOP_K", "200"))
+    RANKING_GEOHASH_PRECISION: int = int(os.getenv("RANKING_GEOHASH_PRECISION", "6"))
+    RANKING_REFRESH_INTERVAL: int = int(os.getenv("RANKING_REFRESH_INTERVAL", "600"))
+    
+    # Serialized API responses (kept until the data changes or the TTL passes)
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
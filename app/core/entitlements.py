@@ -0,0 +1,136 @@
+from typing import Optional, Dict, Any, FrozenSet
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.db import client
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class Entitlement:
+    """What a user's subscription plan lets them see."""
+
+    __slots__ = ("plan_id", "subscription", "categories")
+
+    def __init__(
+        self,
+        plan_id: str,
+        subscription: Optional[Dict[str, Any]] = None,
+        categories: Optional[FrozenSet[str]] = None,
+    ):
+        self.plan_id = plan_id
+        self.subscription = subscription
+        # None means every category is allowed
+        self.categories = categories
+
+    @property
+    def is_premium(self) -> bool:
+        return self.plan_id == settings.PREMIUM_PLAN_ID
+
+    @property
+    def tier(self) -> str:
+        """Entitlement tier used to key shared caches ("free" or "premium")."""
+        return "premium" if self.is_premium else "free"
+
+    def can_access(self, category: str) -> bool:
+        """Check if the plan covers a category."""
+        return self.categories is None or category in self.categories
+
+# Entitlement of anonymous users and users without an active subscription
+FREE_ENTITLEMENT = Entitlement(settings.FREE_PLAN_ID, None, frozenset(settings.FREE_CATEGORIES))
+
+class EntitlementService:
+    """
+    Resolves users' subscription plans and caches them in-process.
+
+    Each user's plan is loaded with a single query and kept for `ttl`
+    seconds, so premium checks on the hot path don't touch the database.
+    Concurrent lookups for the same user share one query. Call
+    `invalidate` whenever a user's subscription may have changed.
+
+    If the query fails the user gets the free entitlement for `error_ttl`
+    seconds only, so a database hiccup doesn't downgrade premium users for
+    the whole TTL.
+    """
+
+    def __init__(self, ttl: int = 300, max_size: int = 10000, error_ttl: float = 5):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, user: Optional[Dict[str, Any]]) -> Entitlement:
+        """Get the entitlement of a user (None for anonymous visitors)."""
+        if not user or not user.get("id"):
+            return FREE_ENTITLEMENT
+        return await self.resolve_user_id(user["id"])
+
+    async def resolve_user_id(self, user_id: str) -> Entitlement:
+        """Get the entitlement of a user by ID."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, entitlement = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return entitlement
+            del self._entries[user_id]
+
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(user_id))
+            self._pending[user_id] = pending
+            pending.add_done_callback(lambda task: self._finish(user_id, task))
+
+        # Shield the shared lookup so one cancelled request doesn't cancel it
+        # for everyone else waiting on the same user
+        return await asyncio.shield(pending)
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget a user's cached entitlement, including any lookup in flight."""
+        self._entries.pop(user_id, None)
+        self._pending.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Forget every cached entitlement."""
+        self._entries.clear()
+        self._pending.clear()
+
+    async def _load(self, user_id: str) -> Entitlement:
+        try:
+            subscription = await client.get_user_subscription(user_id)
+        except Exception as e:
+            logger.error(f"Error getting user subscription: {str(e)}")
+            return FREE_ENTITLEMENT
+        plan_id = subscription.get("plan_id") if subscription else None
+
+        if plan_id == settings.PREMIUM_PLAN_ID:
+            return Entitlement(plan_id, subscription, None)
+        return Entitlement(plan_id or settings.FREE_PLAN_ID, subscription, FREE_ENTITLEMENT.categories)
+
+    def _finish(self, user_id: str, task: asyncio.Future) -> None:
+        # Only cache the result if the lookup wasn't invalidated meanwhile
+        if self._pending.get(user_id) is not task:
+            return
+        del self._pending[user_id]
+
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        # _load only returns the shared FREE_ENTITLEMENT when the lookup failed
+        entitlement = task.result()
+        ttl = self.error_ttl if entitlement is FREE_ENTITLEMENT else self.ttl
+        self._entries[user_id] = (time.monotonic() + ttl, entitlement)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+# Shared entitlement service
+entitlements = EntitlementService(
+    settings.ENTITLEMENT_CACHE_TTL,
+    settings.ENTITLEMENT_CACHE_SIZE,
+    settings.ENTITLEMENT_CACHE_ERROR_TTL,
+)
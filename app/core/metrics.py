@@ -0,0 +1,284 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import math
+import time
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Label values of one series, in the order of the metric's label names
+Labels = Tuple[str, ...]
+
+# Latency buckets in seconds, from cache hits to slow database calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Metric(ABC):
+    """Base class of metrics: a name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        """Lines of the exposition format for every series of the metric."""
+
+class Counter(Metric):
+    """A value that only goes up, per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Gauge(Counter):
+    """A value that can go up and down, per label set."""
+
+    kind = "gauge"
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self._values[labels] = value
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets, per label set.
+
+    Recording an observation is a binary search and two additions, so it is
+    cheap enough for every request.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum
+        self._series: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        bucket_names = self.labelnames + ("le",)
+        for labels, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(bucket_names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+class CallbackMetric(Metric):
+    """
+    A metric whose values are read when metrics are scraped, for state that
+    is already tracked elsewhere (such as cache counters).
+
+    `callback` returns a mapping of label values to the current value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {str(e)}")
+            return
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Shared registry and the metrics recorded by the app
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.",
+)
+supabase_requests = registry.counter(
+    "supabase_requests_total", "Supabase calls by table, operation and outcome (ok, error or timeout).",
+    ("table", "operation", "outcome"),
+)
+supabase_request_duration = registry.histogram(
+    "supabase_request_duration_seconds", "Supabase call latency, including time queued for a worker thread.",
+    ("table", "operation"),
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests.
+
+    Requests are labelled with the matched route template (for example
+    `/api/locations/{location_id}`) rather than the raw path, so the number
+    of series stays bounded. A plain ASGI middleware is used instead of
+    `BaseHTTPMiddleware` to keep the overhead to a few dictionary updates,
+    and streamed responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, (method, template))
+            http_requests.inc((method, template, str(status_code)))
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """
+    Measure event-loop lag: how much later than scheduled a sleep wakes up.
+
+    Lag means something is blocking the loop (CPU-bound work or a blocking
+    call outside the executor), delaying every request in the process.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(loop.time() - start - interval, 0.0))
+
+_monitor_task: Optional[asyncio.Task] = None
+
+def start_event_loop_monitor(interval: float) -> None:
+    """Start measuring event-loop lag in the background."""
+    global _monitor_task
+    if interval > 0 and _monitor_task is None:
+        _monitor_task = asyncio.create_task(monitor_event_loop(interval))
+
+async def stop_event_loop_monitor() -> None:
+    """Stop measuring event-loop lag."""
+    global _monitor_task
+    if _monitor_task is not None:
+        _monitor_task.cancel()
+        try:
+            await _monitor_task
+        except asyncio.CancelledError:
+            pass
+        _monitor_task = None
@@ -0,0 +1,169 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+InsertBatch = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+class BatchWriter:
+    """
+    Buffers events in memory and writes them in bulk from a background task.
+
+    Events are queued without waiting, so callers never pay for the insert.
+    The background task flushes a batch once `batch_size` events are waiting
+    or `flush_interval` seconds after the first one arrived. When the queue
+    is full, or a batch can't be inserted, events are appended to a local
+    NDJSON spill file (or dropped if `spill_path` is empty) and replayed
+    after the next successful flush.
+    """
+
+    def __init__(
+        self,
+        insert: InsertBatch,
+        name: str = "events",
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        spill_path: Optional[str] = None,
+    ):
+        self._insert = insert
+        # What the events are, for log messages
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.max_queue = max_queue
+        # Created in start() so the queue belongs to the serving event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Dict[str, Any]] = []
+        self._flushing: Optional[asyncio.Future] = None
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, event: Dict[str, Any]) -> None:
+        """Queue an event for writing without waiting."""
+        if not self.running:
+            self._spill([event])
+            return
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Backpressure: never make the caller wait for the database
+            self._spill([event])
+
+    async def start(self) -> None:
+        """Start the background flush task and replay any spilled events."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        await self._replay_spill()
+
+    async def stop(self) -> None:
+        """Stop the background task and flush everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+
+        pending = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._queue = None
+
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size], replay=False)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(self._batch) < self.batch_size:
+                # Take whatever is already queued before waiting again
+                if not self._queue.empty():
+                    self._batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._batch = self._batch, []
+            # Shielded so shutdown waits for a batch that is being written
+            # instead of cancelling it halfway
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+
+    async def _flush(self, batch: List[Dict[str, Any]], replay: bool = True) -> bool:
+        try:
+            await self._insert(batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} {self.name}: {str(e)}")
+            self._spill(batch)
+            return False
+
+        logger.info(f"Wrote {len(batch)} {self.name}")
+        if replay:
+            await self._replay_spill()
+        return True
+
+    def _spill(self, events: List[Dict[str, Any]]) -> None:
+        if self.spill_path is None:
+            self.dropped += len(events)
+            logger.warning(f"Dropped {len(events)} {self.name}")
+            return
+
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+        except OSError as e:
+            self.dropped += len(events)
+            logger.error(f"Error spilling {self.name}: {str(e)}")
+
+    async def _replay_spill(self) -> None:
+        if self.spill_path is None or not self.spill_path.exists():
+            return
+
+        # Move the file aside first so events spilled during the replay
+        # land in a fresh file instead of being read twice
+        replaying = self.spill_path.with_suffix(self.spill_path.suffix + ".replay")
+        try:
+            os.replace(self.spill_path, replaying)
+            with open(replaying, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            os.remove(replaying)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading spilled {self.name}: {str(e)}")
+            return
+
+        logger.info(f"Replaying {len(events)} spilled {self.name}")
+        for start in range(0, len(events), self.batch_size):
+            if not await self._flush(events[start:start + self.batch_size], replay=False):
+                # The backend is still unreachable; re-spill the rest and retry later
+                self._spill(events[start + self.batch_size:])
+                return
@@ -0,0 +1,308 @@
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from postgrest.exceptions import APIError
+from pydantic import TypeAdapter, ValidationError
+import codecs
+import csv
+import io
+import json
+import logging
+
+from app.core.config import settings
+from app.db import client
+from app.db.models import LocationCreate
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+# Columns of exported locations, in order
+EXPORT_FIELDS = ["id", *LocationCreate.model_fields, "created_at", "updated_at"]
+
+# Columns stored as JSON inside CSV cells
+_JSON_FIELDS = ("operating_hours", "images")
+
+_location_batch = TypeAdapter(List[LocationCreate])
+
+# A parsed row (line number, fields), or the reason it couldn't be parsed
+ParsedRow = Tuple[int, Union[Dict[str, Any], str]]
+
+class ImportReport:
+    """Counts of an import and the errors of the rows that failed."""
+
+    def __init__(self, max_errors: int = 1000):
+        self.max_errors = max_errors
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.aborted: Optional[Dict[str, Any]] = None
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        # Only the first errors are kept, so a bad file can't exhaust memory
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": error})
+
+    def abort(self, line: int, error: str) -> None:
+        # Rows before `line` were saved and rows after it weren't read. The
+        # batch starting at `line` may or may not have been saved.
+        self.aborted = {"line": line, "error": error}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "aborted": self.aborted,
+        }
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines (keeping line endings)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        # Only split on "\n": JSON strings may contain other line separators.
+        # The last piece may be a partial line.
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    """Parse NDJSON incrementally, one object per line."""
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, row
+
+def _from_csv(record: Dict[str, str]) -> Dict[str, Any]:
+    """Convert a CSV record to location fields; empty cells are left unset."""
+    row: Dict[str, Any] = {}
+    for field, value in record.items():
+        if field is None or value is None or value == "":
+            continue
+        if field in _JSON_FIELDS and value.lstrip().startswith(("[", "{")):
+            value = json.loads(value)
+        elif field == "images":
+            value = [image.strip() for image in value.split("|") if image.strip()]
+        row[field] = value
+    return row
+
+async def iter_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    """Parse CSV with a header row incrementally."""
+    header: Optional[List[str]] = None
+    record = ""
+    line_number = 0
+    start_line = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if not record:
+            start_line = line_number
+        record += line
+        # A quoted cell may span lines; wait until every quote is closed
+        if record.count('"') % 2:
+            continue
+
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        try:
+            yield start_line, _from_csv(dict(zip(header, values)))
+        except ValueError as e:
+            yield start_line, f"Invalid JSON cell: {str(e)}"
+
+    if record:
+        yield start_line, "Unterminated quoted cell"
+
+def _validation_message(errors: List[Dict[str, Any]]) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'][1:]) or 'row'}: {error['msg']}"
+        for error in errors
+    )
+
+def _validate_batch(batch: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> List[Tuple[int, Dict[str, Any]]]:
+    """Validate a batch of rows, reporting invalid ones and returning the rest."""
+    ids: List[Optional[int]] = []
+    rows: List[Dict[str, Any]] = []
+    invalid: Dict[int, str] = {}
+    for index, (_, row) in enumerate(batch):
+        location_id = row.pop("id", None)
+        if location_id not in (None, ""):
+            try:
+                location_id = int(location_id)
+            except (TypeError, ValueError):
+                invalid[index] = "id: Input should be a valid integer"
+        ids.append(location_id or None)
+        rows.append(row)
+
+    # Validate the whole batch in one call, then pick out the failures
+    errors_by_row: Dict[int, List[Dict[str, Any]]] = {}
+    try:
+        _location_batch.validate_python(rows)
+    except ValidationError as e:
+        for error in e.errors():
+            errors_by_row.setdefault(error["loc"][0], []).append(error)
+    for index, errors in errors_by_row.items():
+        invalid[index] = _validation_message(errors)
+
+    for index, message in sorted(invalid.items()):
+        report.add_error(batch[index][0], message)
+
+    valid_indexes = [index for index in range(len(batch)) if index not in invalid]
+    locations = _location_batch.validate_python([rows[index] for index in valid_indexes])
+    return [
+        (batch[index][0], {"id": ids[index], **location.model_dump()})
+        for index, location in zip(valid_indexes, locations)
+    ]
+
+def _is_row_error(error: Exception) -> bool:
+    """
+    Whether the database rejected a save because of the rows themselves.
+
+    Data exceptions and constraint violations (SQLSTATE classes 22 and 23,
+    which PostgREST returns as 4xx) roll back the whole statement, so the
+    rows can safely be retried in smaller batches. Timeouts, connection
+    errors and server errors can't be retried that way: the request may
+    still have been saved, and every retry would wait out DB_TIMEOUT again.
+    """
+    return isinstance(error, APIError) and str(error.code or "")[:2] in ("22", "23")
+
+async def _save_rows(
+    rows: List[Tuple[int, Dict[str, Any]]],
+    save: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+    report: ImportReport,
+) -> None:
+    """Save rows in one bulk request, splitting the batch to find rejected rows."""
+    try:
+        saved = await save([row for _, row in rows])
+    except Exception as e:
+        if not _is_row_error(e):
+            raise
+        if len(rows) == 1:
+            report.add_error(rows[0][0], e.message or str(e))
+            return
+        # Bisect so one bad row costs O(log n) extra requests, not one per row
+        middle = len(rows) // 2
+        await _save_rows(rows[:middle], save, report)
+        await _save_rows(rows[middle:], save, report)
+        return
+    report.imported += len(saved)
+
+async def _save_batch(rows: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> None:
+    """Save a batch's new and existing rows as two separate bulk requests."""
+    new_rows = [(line, row) for line, row in rows if row["id"] is None]
+    existing_rows = [(line, row) for line, row in rows if row["id"] is not None]
+    if new_rows:
+        await _save_rows(new_rows, client.bulk_insert_locations, report)
+    if existing_rows:
+        await _save_rows(existing_rows, client.bulk_upsert_locations, report)
+
+async def _import_batch(batch: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> bool:
+    """Validate and save a batch; returns False if the import has to stop."""
+    try:
+        await _save_batch(_validate_batch(batch, report), report)
+        return True
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        logger.error(f"Aborting location import at line {batch[0][0]}: {error}")
+        report.abort(batch[0][0], error)
+        return False
+
+async def import_locations(
+    chunks: AsyncIterable[bytes],
+    format: str = "ndjson",
+    batch_size: int = settings.IMPORT_BATCH_SIZE,
+    max_errors: int = settings.IMPORT_MAX_ERRORS,
+) -> ImportReport:
+    """
+    Import locations from an NDJSON or CSV byte stream.
+
+    The stream is parsed incrementally and saved `batch_size` rows at a
+    time, so memory stays bounded however large the input is. Rows with an
+    `id` update that location; others are created. Rows that fail parsing,
+    validation or database constraints are reported by line number without
+    stopping the import. A timeout or connection failure stops it, recorded
+    in the report's `aborted`.
+
+    Args:
+        chunks: The input, as an async iterable of byte chunks
+        format: "ndjson" or "csv" (with a header row)
+        batch_size: Rows per bulk insert
+        max_errors: Errors kept in the report (the rest are only counted)
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {format}")
+
+    report = ImportReport(max_errors)
+    parsed = iter_csv(chunks) if format == "csv" else iter_ndjson(chunks)
+
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    async for line, row in parsed:
+        report.received += 1
+        if isinstance(row, str):
+            report.add_error(line, row)
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            if not await _import_batch(batch, report):
+                return report
+            batch = []
+    if batch and not await _import_batch(batch, report):
+        return report
+
+    logger.info(f"Imported {report.imported} of {report.received} locations ({report.failed} failed)")
+    return report
+
+def _to_csv_cell(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return "" if value is None else value
+
+async def export_locations(format: str = "ndjson") -> AsyncIterator[bytes]:
+    """
+    Stream every location as NDJSON or CSV, one page of rows at a time.
+
+    Exports can be imported again; rows keep their IDs, so re-importing
+    updates the same locations.
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {format}")
+
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+
+    async for page in client.iter_location_pages():
+        if format == "ndjson":
+            yield "".join(json.dumps(location, ensure_ascii=False) + "\n" for location in page).encode("utf-8")
+            continue
+
+        for location in page:
+            writer.writerow([_to_csv_cell(location.get(field)) for field in EXPORT_FIELDS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import time
+
+# Returned by TTLCache.get on a miss, since None is a valid cached value
+MISSING = object()
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a TTL.
+
+    `None` values are cached too, with the shorter `negative_ttl`, so
+    repeated lookups of rows that don't exist don't keep reaching the
+    database. Hits and misses are counted for monitoring.
+
+    Read-through callers should take `generation` before querying and pass
+    it to `set`, so a result read before a write invalidated the cache is
+    not stored after the invalidation.
+    """
+
+    def __init__(self, name: str, max_size: int = 10000, ttl: float = 300, negative_ttl: Optional[float] = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for a key, or MISSING."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        return MISSING
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Cache a value, evicting the least recently used entries if full."""
+        if generation is not None and generation != self.generation:
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one key."""
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every key."""
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and hit/miss counters of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,27 +1,35 @@
 from supabase import create_client, Client
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from supabase.lib.client_options import ClientOptions
+from typing import List, Dict, Any, AsyncIterator, FrozenSet, Iterable, Optional, Set
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import asyncio
 import logging
 import json
 import os
 
 from app.core.config import settings
 from app.db.models import Location, Category, SubscriptionPlan, UserSubscription
+from app.db.cache import MISSING, TTLCache
+from app.db.clustering import ClusterIndex
+from app.db.executor import execute
+from app.db.geo import geohash, geohash_cover
+from app.db.hours import OpeningHoursIndex, is_open, minute_of_week, parse_operating_hours
+from app.db.login_stats import TOP_KINDS, LoginStats, aggregate_logins, recent_buckets
+from app.db.batch_writer import BatchWriter
+from app.db.pagination import decode_cursor, encode_cursor
+from app.db.ranking import ALL, DecayedRanking, category_group, cell_group
+from app.db.search import CATEGORY_KEYWORDS, SearchIndex
+from app.db.snapshot import CatalogueSnapshot, open_snapshot, write_snapshot
+from app.db.spatial import BBox, SpatialIndex
+from app.db.store import LocationStore
+from app.db.tiles import TileCache, encode_tile, tile_bounds, tiles_for_point
+from app.db.views import ViewRecorder, aggregate_views, bucket_start
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client with error handling
-try:
-    if settings.SUPABASE_URL and settings.SUPABASE_KEY:
-        supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-    else:
-        logger.warning("Supabase credentials not configured. Using mock data.")
-        supabase = None
-except Exception as e:
-    logger.error(f"Failed to initialize Supabase client: {str(e)}")
-    supabase = None
-
 # Sample data for development when Supabase is not configured
 SAMPLE_CATEGORIES = [
     {"id": "restaurants", "name": "Restaurants", "description": "Places to eat", "icon": "utensils", "premium_only": False},
@@ -93,71 +101,874 @@ SAMPLE_SUBSCRIPTION_PLANS = [
     {"id": "premium", "name": "Premium Plan", "description": "Full access to all features", "price": 9.99, "features": ["Access to all categories", "All location details", "No advertisements", "Offline maps"]}
 ]
 
+def _create_backend() -> Optional[Any]:
+    """
+    Create the client the data tables are queried through.
+
+    DB_BACKEND "supabase" uses the Supabase project (or the sample data when
+    no credentials are configured); "local" uses an in-process stand-in
+    seeded with the sample data or LOCAL_DB_SEED_PATH, with injectable
+    latency and failures for load and resilience testing.
+    """
+    if settings.DB_BACKEND == "local":
+        from app.db.local import FaultInjector, create_local_backend
+
+        logger.warning("Using the local database backend. Data is kept in memory only.")
+        return create_local_backend(
+            SAMPLE_CATEGORIES,
+            SAMPLE_LOCATIONS,
+            SAMPLE_SUBSCRIPTION_PLANS,
+            locations_path=settings.LOCAL_DB_SEED_PATH,
+            faults=FaultInjector(
+                latency=settings.LOCAL_DB_LATENCY,
+                jitter=settings.LOCAL_DB_JITTER,
+                error_rate=settings.LOCAL_DB_ERROR_RATE,
+                stall_rate=settings.LOCAL_DB_STALL_RATE,
+                stall_seconds=settings.DB_TIMEOUT * 2,
+            ),
+        )
+    if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+        return create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=ClientOptions(postgrest_client_timeout=settings.DB_TIMEOUT),
+        )
+    logger.warning("Supabase credentials not configured. Using mock data.")
+    return None
+
+# Initialize the database client with error handling
+try:
+    supabase: Optional[Client] = _create_backend()
+except Exception as e:
+    logger.error(f"Failed to initialize database client: {str(e)}")
+    supabase = None
+
+def _create_service_backend() -> Optional[Any]:
+    """
+    Create the client for calls only the service role may make, such as the
+    background writers' database functions.
+
+    Uses SUPABASE_SERVICE_KEY, which bypasses row level security, so it is
+    never used for requests made on a user's behalf. The local backend has
+    no row level security and serves both.
+    """
+    if settings.DB_BACKEND == "local":
+        return supabase
+    if supabase and settings.SUPABASE_SERVICE_KEY:
+        return create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_SERVICE_KEY,
+            options=ClientOptions(postgrest_client_timeout=settings.DB_TIMEOUT),
+        )
+    if supabase:
+        logger.warning("SUPABASE_SERVICE_KEY not configured. Location views and login rollups won't be saved, nor rankings refreshed.")
+    return None
+
+try:
+    supabase_service: Optional[Client] = _create_service_backend()
+except Exception as e:
+    logger.error(f"Failed to initialize service database client: {str(e)}")
+    supabase_service = None
+
+# In-process spatial index over the locations table, used for viewport queries.
+# It is loaded lazily on the first bbox query, kept current by the
+# create/update/delete functions below, and reloaded with every snapshot
+# refresh when other workers have changed the table.
+location_index = SpatialIndex(settings.SPATIAL_INDEX_CELL_SIZE)
+_location_index_loaded = False
+_location_index_lock = asyncio.Lock()
+# Where the loaded index came from: "database" or "snapshot"
+_location_index_source: Optional[str] = None
+# Snapshot version of the rows the index was loaded from (None if unknown)
+_location_index_version: Optional[str] = None
+
+# Last catalogue snapshot written by any worker, served when Supabase is down
+catalogue_snapshot: Optional[CatalogueSnapshot] = None
+_snapshot_task: Optional[asyncio.Task] = None
+
+# Columnar store holding the indexed location rows, used for vectorized
+# filters and distance queries; rows become dicts only when returned
+location_store = LocationStore()
+
+# Marker clusters over every location, and over the non-premium locations
+# that anonymous visitors are allowed to see
+location_clusters = ClusterIndex(max_zoom=settings.CLUSTER_MAX_ZOOM, radius=settings.CLUSTER_RADIUS)
+public_location_clusters = ClusterIndex(max_zoom=settings.CLUSTER_MAX_ZOOM, radius=settings.CLUSTER_RADIUS)
+
+# Full-text search over location names, descriptions, addresses and categories
+location_search = SearchIndex()
+
+# Weekly opening-hours intervals of the stored locations, per distinct
+# operating_hours pattern in the store, and the timezone the hours are in
+location_hours = OpeningHoursIndex()
+location_timezone = ZoneInfo(settings.LOCATION_TIMEZONE)
+
+# Time-decayed popularity of the locations, from views and favorites: all
+# time favorites with a week's half-life, and what is hot right now
+popular_locations = DecayedRanking(settings.POPULAR_HALF_LIFE_HOURS * 3600, settings.RANKING_TOP_K)
+trending_locations = DecayedRanking(settings.TRENDING_HALF_LIFE_HOURS * 3600, settings.RANKING_TOP_K)
+location_rankings = {"popular": popular_locations, "trending": trending_locations}
+_ranking_task: Optional[asyncio.Task] = None
+# Geohash precisions locations are ranked per cell at, finest last; a
+# viewport reads the finest level that covers it with few cells
+RANKING_CELL_PRECISIONS = range(max(settings.RANKING_GEOHASH_PRECISION - 2, 1), settings.RANKING_GEOHASH_PRECISION + 1)
+
+# Encoded location tiles per entitlement tier
+location_tiles = TileCache(settings.TILE_CACHE_SIZE, settings.TILE_CACHE_DIR, settings.TILE_CACHE_MAX_AGE)
+
+# Read-through caches for category and location queries. Location rows are
+# keyed by ID and location list queries by their filters, so a write drops
+# the row it touched and the list results it may appear in.
+category_cache = TTLCache("categories", settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL, settings.QUERY_CACHE_NEGATIVE_TTL)
+location_cache = TTLCache("locations", settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL, settings.QUERY_CACHE_NEGATIVE_TTL)
+location_query_cache = TTLCache("location_queries", settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL, settings.QUERY_CACHE_NEGATIVE_TTL)
+
+# Each user's favorite location IDs, loaded once and replaced on every
+# write made through this process
+favorite_cache = TTLCache("favorites", settings.FAVORITES_CACHE_SIZE, settings.FAVORITES_CACHE_TTL)
+
+# Versions of the data sets served by the API, bumped on every write made
+# through this process so cached responses built from them are rebuilt
+dataset_versions: Dict[str, int] = {"categories": 0, "locations": 0, "subscription_plans": 0}
+
+def _invalidate_location_caches(location_id: Optional[int] = None) -> None:
+    """Drop cached results a write to a location may have changed."""
+    dataset_versions["locations"] += 1
+    if location_id is not None:
+        location_cache.invalidate(location_id)
+    location_query_cache.clear()
+
+def get_cache_stats() -> List[Dict[str, Any]]:
+    """Get the size and hit/miss counters of the query caches."""
+    return [cache.stats() for cache in (category_cache, location_cache, location_query_cache, favorite_cache)]
+
+# Page size used when loading the whole locations table
+LOCATION_LOAD_PAGE_SIZE = 1000
+
+def _index_location(location: Dict[str, Any]) -> None:
+    """Add or move a location in the spatial index."""
+    if not location or location.get("id") is None:
+        return
+    
+    _invalidate_location_tiles(location_store.get(location["id"]))
+    _invalidate_location_tiles(location)
+    
+    location_store.put(location)
+    location_hours.sync(location_store.tables["operating_hours"].values)
+    _index_location_fields(location)
+
+def _index_location_fields(location: Dict[str, Any]) -> None:
+    """Add a stored location to the spatial, search, cluster and ranking indexes."""
+    location_id = location["id"]
+    lng = float(location["longitude"])
+    lat = float(location["latitude"])
+    
+    location_index.insert(location_id, lng, lat)
+    location_search.add(location_id, {
+        "name": location.get("name"),
+        "description": location.get("description"),
+        "address": location.get("address"),
+        "category": f"{location['category_id']} {CATEGORY_KEYWORDS.get(location['category_id'], '')}",
+    })
+    
+    location_clusters.insert(location_id, lng, lat, location["category_id"])
+    if location.get("premium_only"):
+        public_location_clusters.remove(location_id)
+    else:
+        public_location_clusters.insert(location_id, lng, lat, location["category_id"])
+    
+    # A cell's geohash is a prefix of the geohashes of the cells inside it
+    cell = geohash(lat, lng, settings.RANKING_GEOHASH_PRECISION)
+    groups = (ALL, category_group(location["category_id"]), *(cell_group(cell[:precision]) for precision in RANKING_CELL_PRECISIONS))
+    for ranking in location_rankings.values():
+        ranking.set_groups(location_id, groups)
+
+def _unindex_location(location_id: int) -> None:
+    """Remove a location from the spatial index."""
+    _invalidate_location_tiles(location_store.get(location_id))
+    location_index.remove(location_id)
+    location_store.remove(location_id)
+    location_search.remove(location_id)
+    location_clusters.remove(location_id)
+    public_location_clusters.remove(location_id)
+    for ranking in location_rankings.values():
+        ranking.remove(location_id)
+
+def _invalidate_location_tiles(location: Optional[Any]) -> None:
+    """Drop the cached tiles that contain a location."""
+    if location:
+        location_tiles.invalidate(
+            tiles_for_point(float(location["longitude"]), float(location["latitude"]), settings.TILE_MAX_ZOOM)
+        )
+
+async def iter_location_pages(
+    page_size: int = LOCATION_LOAD_PAGE_SIZE,
+    category_id: Optional[str] = None,
+    premium_only: Optional[bool] = None,
+    after_id: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Read the locations table page by page, ordered by ID, starting after
+    `after_id` if given.
+    
+    Unlike `get_locations` this raises if a page can't be read, so a long
+    read never silently continues with fallback data.
+    """
+    if not supabase:
+        locations = _filter_locations(SAMPLE_LOCATIONS, category_id, premium_only)
+        yield [loc for loc in locations if after_id is None or loc["id"] > after_id]
+        return
+    
+    last_id = after_id
+    while True:
+        # Keyset pagination, so every page costs the same as the first
+        query = supabase.table("locations").select("*")
+        if category_id:
+            query = query.eq("category_id", category_id)
+        if premium_only is not None:
+            query = query.eq("premium_only", premium_only)
+        query = query.order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        
+        response = await execute(query)
+        if response.data:
+            yield response.data
+        if len(response.data) < page_size:
+            return
+        last_id = response.data[-1]["id"]
+
+async def _fetch_all_locations() -> List[Dict[str, Any]]:
+    """Fetch every row of the locations table, page by page."""
+    rows: List[Dict[str, Any]] = []
+    async for page in iter_location_pages():
+        rows.extend(page)
+    return rows
+
+async def _ensure_location_index() -> bool:
+    """
+    Build the spatial index from the locations table if it isn't loaded yet.
+    
+    Returns False if the table could not be loaded.
+    """
+    global _location_index_loaded
+    
+    if _location_index_loaded:
+        return True
+    
+    async with _location_index_lock:
+        if _location_index_loaded:
+            return True
+        
+        try:
+            rows = await _fetch_all_locations()
+            source = "database"
+        except Exception as e:
+            logger.error(f"Error loading location index: {str(e)}")
+            if catalogue_snapshot is None:
+                return False
+            # Stale but real: serve the snapshot until the database is back
+            rows = list(catalogue_snapshot.locations())
+            source = "snapshot"
+        
+        _load_location_index(rows, source)
+        return True
+
+def _load_location_index(rows: List[Dict[str, Any]], source: str, version: Optional[str] = None) -> None:
+    """Replace the contents of the in-process indexes."""
+    global _location_index_loaded, _location_index_source, _location_index_version
+    
+    location_index.clear()
+    location_store.clear()
+    location_search.clear()
+    location_hours.clear()
+    location_clusters.clear()
+    public_location_clusters.clear()
+    for ranking in location_rankings.values():
+        ranking.clear_groups()
+    # Load the store a column at a time, then the other indexes per row
+    location_store.bulk_load(rows)
+    location_hours.sync(location_store.tables["operating_hours"].values)
+    for row in rows:
+        _index_location_fields(row)
+    
+    # Tiles and cached responses were built from the old contents. On the
+    # first load this also drops tiles a previous process left on disk,
+    # which may predate changes made since.
+    location_tiles.clear()
+    if _location_index_loaded:
+        _invalidate_location_caches()
+    
+    _location_index_loaded = True
+    _location_index_source = source
+    _location_index_version = version
+    logger.info(f"Location index loaded with {len(location_index)} locations from the {source}")
+
+def open_catalogue_snapshot() -> Optional[CatalogueSnapshot]:
+    """Map the catalogue snapshot file, if one has been written."""
+    global catalogue_snapshot
+    
+    catalogue_snapshot = open_snapshot(settings.SNAPSHOT_PATH)
+    return catalogue_snapshot
+
+async def warm_location_index() -> None:
+    """Load the in-process indexes from the snapshot, so a new worker starts warm."""
+    if _location_index_loaded or catalogue_snapshot is None:
+        return
+    
+    async with _location_index_lock:
+        if _location_index_loaded:
+            return
+        _load_location_index(list(catalogue_snapshot.locations()), "snapshot", catalogue_snapshot.version)
+
+async def refresh_catalogue_snapshot() -> Optional[str]:
+    """
+    Write a fresh catalogue snapshot from the database and swap it in.
+    
+    The in-process indexes are reloaded from the fresh rows unless they were
+    loaded from identical ones (same snapshot version), so changes made
+    through other workers show up within SNAPSHOT_INTERVAL whether the index
+    came from the database or a snapshot. Returns the new snapshot's
+    version, or None if the database is down or the file can't be written.
+    """
+    global catalogue_snapshot
+    
+    if not supabase:
+        return None
+    
+    try:
+        rows = await _fetch_all_locations()
+        categories = (await execute(supabase.table("categories").select("*"))).data
+        plans = (await execute(supabase.table("subscription_plans").select("*"))).data
+    except Exception as e:
+        logger.error(f"Error reading catalogue for snapshot: {str(e)}")
+        return None
+    
+    try:
+        # Serializing and writing is blocking work, so keep it off the event loop
+        version = await asyncio.get_running_loop().run_in_executor(
+            None, write_snapshot, settings.SNAPSHOT_PATH, rows, categories, plans
+        )
+    except OSError as e:
+        logger.error(f"Error writing catalogue snapshot: {str(e)}")
+        version = None
+    
+    async with _location_index_lock:
+        if version is None or version != _location_index_version:
+            _load_location_index(rows, "database", version)
+    
+    if version is None:
+        return None
+    
+    # Readers still holding the previous mapping keep using it until they drop it
+    catalogue_snapshot = open_snapshot(settings.SNAPSHOT_PATH)
+    logger.info(f"Wrote catalogue snapshot {version} with {len(rows)} locations")
+    return version
+
+async def _refresh_snapshots_periodically() -> None:
+    # A missing or stale snapshot is written straight away
+    delay = settings.SNAPSHOT_INTERVAL
+    if catalogue_snapshot is None or catalogue_snapshot.age >= settings.SNAPSHOT_INTERVAL:
+        delay = 0
+    while True:
+        await asyncio.sleep(delay)
+        await refresh_catalogue_snapshot()
+        delay = settings.SNAPSHOT_INTERVAL
+
+async def start_catalogue_snapshots() -> None:
+    """Open the last snapshot, warm the indexes from it and start refreshing it."""
+    global _snapshot_task
+    
+    open_catalogue_snapshot()
+    if catalogue_snapshot is not None:
+        asyncio.create_task(warm_location_index())
+    if supabase and settings.SNAPSHOT_INTERVAL > 0 and _snapshot_task is None:
+        _snapshot_task = asyncio.create_task(_refresh_snapshots_periodically())
+
+async def stop_catalogue_snapshots() -> None:
+    """Stop refreshing the snapshot."""
+    global _snapshot_task
+    
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        try:
+            await _snapshot_task
+        except asyncio.CancelledError:
+            pass
+        _snapshot_task = None
+
+def _fallback_categories() -> List[Dict[str, Any]]:
+    """Categories served when the database can't be reached."""
+    return catalogue_snapshot.categories if catalogue_snapshot is not None else SAMPLE_CATEGORIES
+
+def _fallback_subscription_plans() -> List[Dict[str, Any]]:
+    """Subscription plans served when the database can't be reached."""
+    return catalogue_snapshot.subscription_plans if catalogue_snapshot is not None else SAMPLE_SUBSCRIPTION_PLANS
+
+async def _fallback_locations(
+    category_id: Optional[str],
+    premium_only: Optional[bool],
+    search_query: Optional[str],
+    limit: int,
+    offset: int,
+    after_id: Optional[int],
+) -> List[Dict[str, Any]]:
+    """
+    Locations served when the database can't be reached.
+    
+    Answered from the in-process index, which is loaded from the catalogue
+    snapshot if need be; sample data is only used when neither exists.
+    """
+    if not await _ensure_location_index():
+        return SAMPLE_LOCATIONS
+    
+    if search_query:
+        location_ids = location_store.filter_ids(location_search.search(search_query), category_id, premium_only)
+    else:
+        location_ids = location_store.sorted_ids(category_id, premium_only)
+        if after_id is not None:
+            location_ids = location_ids[bisect_right(location_ids, after_id):]
+    return [location_store.get_dict(location_id) for location_id in location_ids[offset:offset + limit]]
+
+def _fallback_location(location_id: int) -> Optional[Dict[str, Any]]:
+    """A location served when the database can't be reached."""
+    if _location_index_loaded and location_id in location_store:
+        return location_store.get_dict(location_id)
+    if catalogue_snapshot is not None:
+        return catalogue_snapshot.location(location_id)
+    return next((loc for loc in SAMPLE_LOCATIONS if loc["id"] == location_id), None)
+
+def _filter_locations(
+    locations: List[Dict[str, Any]],
+    category_id: Optional[str] = None,
+    premium_only: Optional[bool] = None,
+    search_query: Optional[str] = None,
+    open_at: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Apply the category, premium, search and opening-hours filters to in-memory locations."""
+    if category_id:
+        locations = [loc for loc in locations if loc["category_id"] == category_id]
+    
+    if premium_only is not None:
+        locations = [loc for loc in locations if loc["premium_only"] == premium_only]
+    
+    if search_query:
+        if _location_index_loaded:
+            matches = set(location_search.search(search_query))
+            locations = [loc for loc in locations if loc["id"] in matches]
+        else:
+            search_query = search_query.lower()
+            locations = [
+                loc for loc in locations 
+                if search_query in loc["name"].lower() or 
+                   (loc["description"] and search_query in loc["description"].lower())
+            ]
+    
+    if open_at is not None:
+        minute = minute_of_week(open_at, location_timezone)
+        locations = [loc for loc in locations if is_open(parse_operating_hours(loc.get("operating_hours")), minute)]
+    
+    return locations
+
+def _open_hours_codes(open_at: Optional[datetime], store: Optional[LocationStore] = None) -> Optional[Any]:
+    """Codes of the operating_hours patterns in a store that are open at a time."""
+    if open_at is None:
+        return None
+    store = location_store if store is None else store
+    hours_index = location_hours if store is location_store else OpeningHoursIndex()
+    hours_index.sync(store.tables["operating_hours"].values)
+    return hours_index.open_codes(minute_of_week(open_at, location_timezone))
+
+async def _get_nearest_locations(
+    latitude: float,
+    longitude: float,
+    radius: Optional[float] = None,
+    category_id: Optional[str] = None,
+    premium_only: Optional[bool] = None,
+    search_query: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    open_at: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Get the locations nearest to a point, sorted by distance.
+    
+    Each result carries a `distance_meters` field. Pushed down to PostGIS via
+    the `nearest_locations` function when Supabase is configured, otherwise
+    answered with a vectorized haversine over the cached coordinate arrays.
+    Queries for open locations always use the cached arrays, since the
+    opening-hours index only exists in process.
+    """
+    if supabase and open_at is None:
+        try:
+            response = await execute(supabase.rpc("nearest_locations", {
+                "lat": latitude,
+                "lng": longitude,
+                "radius_meters": radius,
+                "max_results": limit,
+                "result_offset": offset,
+                "category_filter": category_id,
+                "premium_filter": premium_only,
+                "search_filter": search_query,
+            }))
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting nearest locations: {str(e)}")
+    
+    if await _ensure_location_index():
+        store = location_store
+    else:
+        store = LocationStore(len(SAMPLE_LOCATIONS))
+        store.bulk_load(SAMPLE_LOCATIONS)
+    
+    # Text search can't be vectorized, so rank everything in range and
+    # filter afterwards; otherwise only the requested page is selected.
+    k = len(store) if search_query else offset + limit
+    nearest = store.nearest(latitude, longitude, k, radius, category_id, premium_only, _open_hours_codes(open_at, store))
+    
+    if search_query:
+        if store is location_store:
+            matches = set(location_search.search(search_query))
+        else:
+            matches = {loc["id"] for loc in _filter_locations(SAMPLE_LOCATIONS, search_query=search_query)}
+        nearest = [(location_id, distance) for location_id, distance in nearest if location_id in matches]
+    
+    return [
+        {**store.get_dict(location_id), "distance_meters": distance}
+        for location_id, distance in nearest[offset:offset + limit]
+    ]
+
+async def get_location_clusters(
+    bbox: BBox,
+    zoom: int,
+    include_premium: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Get marker clusters visible in a viewport at a zoom level.
+    
+    Clusters carry a count, centroid and per-category breakdown; single
+    locations are returned with the full location row under `location`.
+    
+    Args:
+        bbox: Viewport as (min_lng, min_lat, max_lng, max_lat)
+        zoom: Map zoom level
+        include_premium: Whether premium-only locations are counted
+    """
+    if await _ensure_location_index():
+        clusters_index = location_clusters if include_premium else public_location_clusters
+        get_location_row = location_store.get_dict
+    else:
+        clusters_index = ClusterIndex(max_zoom=settings.CLUSTER_MAX_ZOOM, radius=settings.CLUSTER_RADIUS)
+        locations_by_id = {}
+        for loc in SAMPLE_LOCATIONS:
+            if include_premium or not loc["premium_only"]:
+                clusters_index.insert(loc["id"], loc["longitude"], loc["latitude"], loc["category_id"])
+                locations_by_id[loc["id"]] = loc
+        get_location_row = locations_by_id.get
+    
+    clusters = clusters_index.get_clusters(bbox, zoom)
+    for cluster in clusters:
+        if cluster["count"] == 1:
+            cluster["location"] = get_location_row(cluster["location_id"])
+    
+    return clusters
+
+async def get_region_locations(
+    bbox: BBox,
+    categories: Optional[List[str]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Get every location inside a region, ordered by ID.
+    
+    Used to build offline region packs, so premium-only locations are
+    included. Returns None if the location index could not be loaded.
+    
+    Args:
+        bbox: Region as (min_lng, min_lat, max_lng, max_lat)
+        categories: Only include these categories (None for all)
+    """
+    if not await _ensure_location_index():
+        return None
+    
+    location_ids = sorted(location_index.query(bbox))
+    if categories is not None:
+        location_ids = location_store.filter_ids(location_ids, categories=categories)
+    return [location_store.get_dict(location_id) for location_id in location_ids]
+
+async def get_location_tile(z: int, x: int, y: int, tier: str) -> bytes:
+    """
+    Get a GeoJSON tile of the locations visible to an entitlement tier.
+    
+    Free-tier tiles only contain non-premium locations in the free
+    categories. Tiles are served from the tile cache when possible and are
+    invalidated by the location write functions below.
+    
+    Args:
+        z: Tile zoom level
+        x: Tile column
+        y: Tile row
+        tier: "free" or "premium"
+    """
+    key = (tier, z, x, y)
+    tile = await location_tiles.get(key)
+    if tile is not None:
+        return tile
+    
+    bbox = tile_bounds(z, x, y)
+    # Tiles built from sample data must never land in the cache
+    cacheable = await _ensure_location_index()
+    if cacheable:
+        location_ids = sorted(location_index.query(bbox))
+        if tier != "premium":
+            location_ids = location_store.filter_ids(location_ids, premium_only=False, categories=settings.FREE_CATEGORIES)
+        locations = [location_store.get(location_id) for location_id in location_ids]
+    else:
+        min_lng, min_lat, max_lng, max_lat = bbox
+        locations = [
+            loc for loc in SAMPLE_LOCATIONS
+            if min_lng <= loc["longitude"] <= max_lng and min_lat <= loc["latitude"] <= max_lat
+        ]
+        if tier != "premium":
+            locations = [
+                loc for loc in locations
+                if loc["category_id"] in settings.FREE_CATEGORIES and not loc.get("premium_only")
+            ]
+    
+    tile = encode_tile(locations)
+    if cacheable:
+        location_tiles.put(key, tile)
+    return tile
+
 async def get_categories() -> List[Dict[str, Any]]:
     """Get all location categories."""
     if not supabase:
         return SAMPLE_CATEGORIES
     
+    cached = category_cache.get("all")
+    if cached is not MISSING:
+        return cached
+    
     try:
-        response = supabase.table("categories").select("*").execute()
+        generation = category_cache.generation
+        response = await execute(supabase.table("categories").select("*"))
+        category_cache.set("all", response.data, generation)
         return response.data
     except Exception as e:
         logger.error(f"Error getting categories: {str(e)}")
-        return SAMPLE_CATEGORIES
+        return _fallback_categories()
 
 async def get_category(category_id: str) -> Optional[Dict[str, Any]]:
     """Get a specific category by ID."""
     if not supabase:
         return next((cat for cat in SAMPLE_CATEGORIES if cat["id"] == category_id), None)
     
+    cached = category_cache.get(category_id)
+    if cached is not MISSING:
+        return cached
+    
     try:
-        response = supabase.table("categories").select("*").eq("id", category_id).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        return None
+        generation = category_cache.generation
+        response = await execute(supabase.table("categories").select("*").eq("id", category_id))
+        category = response.data[0] if response.data else None
+        category_cache.set(category_id, category, generation)
+        return category
     except Exception as e:
         logger.error(f"Error getting category: {str(e)}")
-        return next((cat for cat in SAMPLE_CATEGORIES if cat["id"] == category_id), None)
+        return next((cat for cat in _fallback_categories() if cat["id"] == category_id), None)
+
+def _or_filter(query: Any, filters: str) -> Any:
+    """Add a PostgREST `or` filter (the query builder has no method for it)."""
+    query.params = query.params.add("or", f"({filters})")
+    return query
+
+def location_cursor(location: Dict[str, Any]) -> str:
+    """Cursor for the page of locations after this one."""
+    return encode_cursor(location["id"])
+
+def decode_location_cursor(cursor: str) -> int:
+    """
+    ID of the last location before a cursor's page.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    (location_id,) = decode_cursor(cursor, 1)
+    if not isinstance(location_id, int):
+        raise ValueError("Malformed cursor")
+    return location_id
+
+def _ranked_location_ids(
+    sort: str,
+    category_id: Optional[str],
+    premium_only: Optional[bool],
+    bbox: Optional[BBox],
+    hours_codes: Optional[Any],
+    limit: int,
+) -> List[int]:
+    """
+    The first `limit` matching location IDs of a ranking, best first.
+
+    Reads the ranking of the narrowest groups that cover the query (the
+    smallest geohash cells covering the viewport, else the category) and
+    filters it a chunk at a time with the store's columns, each chunk only
+    as large as what is still missing from the page, so pages within the
+    maintained top lists never sort the rest of a group.
+    """
+    ranking = location_rankings[sort]
+    cells = None
+    if bbox is not None:
+        for precision in reversed(RANKING_CELL_PRECISIONS):
+            cells = geohash_cover(bbox, precision)
+            if cells is not None:
+                break
+    
+    if cells is not None:
+        candidates = ranking.ranked_groups(cell_group(cell) for cell in cells)
+    elif category_id:
+        candidates = ranking.ranked(category_group(category_id))
+        # The category is already implied by the group
+        category_id = None
+    else:
+        candidates = ranking.ranked(ALL)
+    
+    mask = None
+    if category_id or premium_only is not None or hours_codes is not None:
+        mask = location_store.mask(category_id, premium_only, hours_codes=hours_codes)
+    
+    location_ids: List[int] = []
+    while len(location_ids) < limit:
+        chunk = [location_id for _, location_id in zip(range(limit - len(location_ids)), candidates)]
+        if not chunk:
+            break
+        chunk = location_store.filter_ids(chunk, mask=mask)
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            chunk = [
+                location_id for location_id, location in zip(chunk, map(location_store.get, chunk))
+                if min_lng <= location["longitude"] <= max_lng and min_lat <= location["latitude"] <= max_lat
+            ]
+        location_ids.extend(chunk)
+    return location_ids[:limit]
 
 async def get_locations(
     category_id: Optional[str] = None,
     premium_only: Optional[bool] = None,
     search_query: Optional[str] = None,
+    bbox: Optional[BBox] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius: Optional[float] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    open_at: Optional[datetime] = None,
+    sort: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     Get locations with optional filtering.
     
+    Unless they are ranked by search relevance, distance or popularity,
+    locations are ordered by ID, and `cursor` (from `location_cursor` on the
+    last row of the previous page) continues after that row at the cost of a
+    first page.
+    
     Args:
         category_id: Filter by category ID
         premium_only: Filter by premium status
-        search_query: Search in name and description
+        search_query: Search in name, description, address and category,
+            ranked by relevance
+        bbox: Only return locations inside (min_lng, min_lat, max_lng, max_lat),
+            answered from the in-process spatial index
+        latitude: Latitude of the point to search around
+        longitude: Longitude of the point to search around
+        radius: Only return locations within this many meters of the point;
+            without it the nearest `limit` locations are returned
         limit: Maximum number of results
         offset: Pagination offset
+        cursor: Continue after the page this cursor was taken from
+        open_at: Only return locations open at this time (naive times are
+            in LOCATION_TIMEZONE), answered from the opening-hours index
+        sort: "popular" or "trending" to rank by the time-decayed view and
+            favorite scores, read from the maintained rankings
+    
+    Raises:
+        ValueError: If the cursor is malformed, or given with a search,
+            nearest or sorted query, or if sort is unknown or combined with
+            a search or nearest query
     """
+    if sort is not None:
+        if sort not in location_rankings:
+            raise ValueError(f"Unknown sort: {sort}")
+        if search_query or latitude is not None:
+            raise ValueError("Sorted queries can't be combined with search or nearest queries")
+    
+    after_id = None
+    if cursor:
+        if search_query or latitude is not None or sort is not None:
+            raise ValueError("Cursors can't be used with search, nearest or sorted queries")
+        after_id = decode_location_cursor(cursor)
+    
+    if sort is not None:
+        if await _ensure_location_index():
+            location_ids = _ranked_location_ids(
+                sort, category_id, premium_only, bbox, _open_hours_codes(open_at), offset + limit
+            )
+            return [location_store.get_dict(location_id) for location_id in location_ids[offset:]]
+        logger.warning(f"Location index unavailable, returning {sort} locations unranked")
+    
+    if latitude is not None and longitude is not None:
+        return await _get_nearest_locations(
+            latitude, longitude, radius, category_id, premium_only, search_query, limit, offset, open_at
+        )
+    
+    # Viewport, search and opening-hours queries are answered from the
+    # in-process indexes
+    if (bbox is not None or search_query or open_at is not None) and await _ensure_location_index():
+        hours_codes = _open_hours_codes(open_at)
+        if search_query:
+            # Ranked by relevance, restricted to the viewport if one is given
+            candidates = location_index.query(bbox) if bbox is not None else None
+            location_ids = location_search.search(search_query, candidates)
+        elif bbox is not None:
+            location_ids = sorted(location_index.query(bbox))
+            if after_id is not None:
+                location_ids = location_ids[bisect_right(location_ids, after_id):]
+        else:
+            # Every filter is a column of the store: one vectorized pass
+            location_ids = location_store.sorted_ids(category_id, premium_only, hours_codes)
+            if after_id is not None:
+                location_ids = location_ids[bisect_right(location_ids, after_id):]
+            return [location_store.get_dict(location_id) for location_id in location_ids[offset:offset + limit]]
+        
+        # Filter with the store's columns and only materialize the page
+        location_ids = location_store.filter_ids(location_ids, category_id, premium_only, hours_codes=hours_codes)
+        return [location_store.get_dict(location_id) for location_id in location_ids[offset:offset + limit]]
+    
+    if bbox is not None or open_at is not None:
+        min_lng, min_lat, max_lng, max_lat = bbox or (-180, -90, 180, 90)
+        filtered_locations = [
+            loc for loc in SAMPLE_LOCATIONS
+            if min_lng <= loc["longitude"] <= max_lng and min_lat <= loc["latitude"] <= max_lat
+            and (after_id is None or loc["id"] > after_id)
+        ]
+        filtered_locations = _filter_locations(filtered_locations, category_id, premium_only, search_query, open_at)
+        return filtered_locations[offset:offset + limit]
+    
     if not supabase:
         # Filter sample data
-        filtered_locations = SAMPLE_LOCATIONS
-        
-        if category_id:
-            filtered_locations = [loc for loc in filtered_locations if loc["category_id"] == category_id]
-        
-        if premium_only is not None:
-            filtered_locations = [loc for loc in filtered_locations if loc["premium_only"] == premium_only]
-        
-        if search_query:
-            search_query = search_query.lower()
-            filtered_locations = [
-                loc for loc in filtered_locations 
-                if search_query in loc["name"].lower() or 
-                   (loc["description"] and search_query in loc["description"].lower())
-            ]
+        filtered_locations = [loc for loc in SAMPLE_LOCATIONS if after_id is None or loc["id"] > after_id]
+        filtered_locations = _filter_locations(filtered_locations, category_id, premium_only, search_query)
         
         # Apply pagination
         return filtered_locations[offset:offset + limit]
     
+    key = (category_id, premium_only, search_query, limit, offset, after_id)
+    cached = location_query_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    
     try:
+        generation = location_query_cache.generation
         query = supabase.table("locations").select("*")
         
         # Apply filters
@@ -168,31 +979,79 @@ async def get_locations(
             query = query.eq("premium_only", premium_only)
         
         if search_query:
-            query = query.or_(f"name.ilike.%{search_query}%,description.ilike.%{search_query}%")
+            query = _or_filter(query, f"name.ilike.%{search_query}%,description.ilike.%{search_query}%")
         
-        # Apply pagination
-        query = query.range(offset, offset + limit - 1)
+        # Keyset pagination over the primary key, so deep pages stay cheap
+        # and don't shift when locations are added
+        query = query.order("id")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        
+        # Apply pagination (the end of range() is exclusive)
+        query = query.range(offset, offset + limit)
         
         # Execute query
-        response = query.execute()
+        response = await execute(query)
+        location_query_cache.set(key, response.data, generation)
         return response.data
     except Exception as e:
         logger.error(f"Error getting locations: {str(e)}")
-        return SAMPLE_LOCATIONS
+        return await _fallback_locations(category_id, premium_only, search_query, limit, offset, after_id)
+
+async def iter_locations(
+    category_id: Optional[str] = None,
+    premium_only: Optional[bool] = None,
+    bbox: Optional[BBox] = None,
+    page_size: int = LOCATION_LOAD_PAGE_SIZE,
+    open_at: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Get every matching location, one page at a time, ordered by ID,
+    starting after `after_id` if given.
+    
+    Viewport and opening-hours queries page through the in-process indexes;
+    everything else pages through the table with keyset pagination.
+    """
+    if bbox is None and open_at is None and supabase:
+        async for page in iter_location_pages(page_size, category_id, premium_only, after_id):
+            yield page
+        return
+    
+    cursor = None if after_id is None else encode_cursor(after_id)
+    while True:
+        page = await get_locations(
+            category_id=category_id,
+            premium_only=premium_only,
+            bbox=bbox,
+            limit=page_size,
+            cursor=cursor,
+            open_at=open_at,
+        )
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        cursor = location_cursor(page[-1])
 
 async def get_location(location_id: int) -> Optional[Dict[str, Any]]:
     """Get a specific location by ID."""
     if not supabase:
         return next((loc for loc in SAMPLE_LOCATIONS if loc["id"] == location_id), None)
     
+    cached = location_cache.get(location_id)
+    if cached is not MISSING:
+        return cached
+    
     try:
-        response = supabase.table("locations").select("*").eq("id", location_id).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        return None
+        generation = location_cache.generation
+        response = await execute(supabase.table("locations").select("*").eq("id", location_id))
+        location = response.data[0] if response.data else None
+        location_cache.set(location_id, location, generation)
+        return location
     except Exception as e:
         logger.error(f"Error getting location: {str(e)}")
-        return next((loc for loc in SAMPLE_LOCATIONS if loc["id"] == location_id), None)
+        return _fallback_location(location_id)
 
 async def create_location(location_data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new location."""
@@ -205,8 +1064,11 @@ async def create_location(location_data: Dict[str, Any]) -> Dict[str, Any]:
         location_data["created_at"] = datetime.now().isoformat()
         location_data["updated_at"] = location_data["created_at"]
         
-        response = supabase.table("locations").insert(location_data).execute()
+        response = await execute(supabase.table("locations").insert(location_data))
         if response.data and len(response.data) > 0:
+            _index_location(response.data[0])
+            _invalidate_location_caches(response.data[0].get("id"))
+            location_cache.set(response.data[0].get("id"), response.data[0])
             return response.data[0]
         return {}
     except Exception as e:
@@ -223,8 +1085,11 @@ async def update_location(location_id: int, location_data: Dict[str, Any]) -> Di
         # Update timestamp
         location_data["updated_at"] = datetime.now().isoformat()
         
-        response = supabase.table("locations").update(location_data).eq("id", location_id).execute()
+        response = await execute(supabase.table("locations").update(location_data).eq("id", location_id))
+        _invalidate_location_caches(location_id)
         if response.data and len(response.data) > 0:
+            _index_location(response.data[0])
+            location_cache.set(location_id, response.data[0])
             return response.data[0]
         return {}
     except Exception as e:
@@ -238,38 +1103,482 @@ async def delete_location(location_id: int) -> bool:
         return False
     
     try:
-        response = supabase.table("locations").delete().eq("id", location_id).execute()
+        response = await execute(supabase.table("locations").delete().eq("id", location_id))
+        _unindex_location(location_id)
+        _invalidate_location_caches(location_id)
+        location_views.forget(location_id)
         return len(response.data) > 0
     except Exception as e:
         logger.error(f"Error deleting location: {str(e)}")
         return False
 
+def _index_saved_locations(saved: List[Dict[str, Any]]) -> None:
+    """
+    Add or move a batch of saved locations in the in-process indexes.
+    
+    Like `_index_location` for each row, but the opening-hours index is
+    synced and the cached tiles and responses dropped once per batch:
+    clearing the tile cache is far cheaper than removing every row's tiles
+    at every zoom one file at a time.
+    """
+    for location in saved:
+        if location.get("id") is None:
+            continue
+        location_store.put(location)
+        _index_location_fields(location)
+    location_hours.sync(location_store.tables["operating_hours"].values)
+    
+    location_tiles.clear()
+    location_cache.clear()
+    _invalidate_location_caches()
+
+async def bulk_insert_locations(locations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Create a batch of new locations in one request.
+    
+    The batch is a single INSERT statement, so it is saved or rolled back as
+    a whole. Unlike the single-row functions this raises on failure, so bulk
+    callers can tell which batch failed and why.
+    
+    Args:
+        locations: Location rows without an `id`, validated by the caller
+        
+    Returns:
+        The created rows
+    """
+    if not supabase:
+        raise RuntimeError("Supabase not configured")
+    
+    now = datetime.now().isoformat()
+    rows = [{key: value for key, value in location.items() if key != "id"} for location in locations]
+    for row in rows:
+        row["updated_at"] = now
+    
+    response = await execute(supabase.table("locations").insert(rows))
+    _index_saved_locations(response.data)
+    return response.data
+
+async def bulk_upsert_locations(locations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Save a batch of existing locations in one request.
+    
+    Every row has an `id` and updates that location (or creates it with that
+    ID). Like `bulk_insert_locations` the batch is a single statement and
+    this raises on failure. New and existing rows are never sent together:
+    PostgREST needs every row of a bulk request to have the same keys.
+    
+    Args:
+        locations: Location rows with an `id`, validated by the caller
+        
+    Returns:
+        The saved rows
+    """
+    if not supabase:
+        raise RuntimeError("Supabase not configured")
+    
+    now = datetime.now().isoformat()
+    rows = [{**location, "updated_at": now} for location in locations]
+    
+    response = await execute(supabase.table("locations").upsert(rows))
+    _index_saved_locations(response.data)
+    return response.data
+
+async def find_locations(location_ids: Iterable[int]) -> List[Dict[str, Any]]:
+    """
+    Get the locations with the given IDs, in ascending ID order.
+    
+    Answered from the in-process index when it is loaded, otherwise with one
+    query. IDs of locations that don't exist are skipped.
+    """
+    location_ids = sorted(set(location_ids))
+    if not location_ids:
+        return []
+    
+    if await _ensure_location_index():
+        return [location_store.get_dict(location_id) for location_id in location_ids if location_id in location_store]
+    
+    try:
+        response = await execute(supabase.table("locations").select("*").in_("id", location_ids).order("id"))
+        return response.data
+    except Exception as e:
+        logger.error(f"Error finding locations: {str(e)}")
+        return [loc for loc in map(_fallback_location, location_ids) if loc is not None]
+
+# Favorites of the mock user, when Supabase is not configured
+_mock_favorites: Dict[str, Set[int]] = {}
+
+def _as_user(query: Any, access_token: Optional[str]) -> Any:
+    """
+    Send a query with the user's access token instead of the anon key, so
+    row level security policies see the user as auth.uid().
+    
+    The header is set on this query only; the client's session is shared by
+    every request.
+    """
+    if access_token:
+        query.headers["Authorization"] = f"Bearer {access_token}"
+    return query
+
+async def get_favorite_ids(user_id: str, access_token: Optional[str] = None) -> FrozenSet[int]:
+    """
+    Get the IDs of a user's favorite locations.
+    
+    The set is loaded with one query and cached, so checking every location
+    of a page against it costs a set lookup per row.
+    
+    Args:
+        user_id: The user's ID
+        access_token: The user's access token, which user_favorites' row
+            level security requires
+    """
+    if not supabase:
+        return frozenset(_mock_favorites.get(user_id, ()))
+    
+    cached = favorite_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    
+    try:
+        generation = favorite_cache.generation
+        response = await execute(_as_user(
+            supabase.table("user_favorites")
+            .select("location_id")
+            .eq("user_id", user_id)
+            .limit(settings.FAVORITES_MAX_PER_USER),
+            access_token,
+        ))
+        favorites = frozenset(row["location_id"] for row in response.data)
+        favorite_cache.set(user_id, favorites, generation)
+        return favorites
+    except Exception as e:
+        logger.error(f"Error getting favorites: {str(e)}")
+        return frozenset()
+
+def _replace_favorites(user_id: str, favorites: FrozenSet[int]) -> None:
+    """Update a cached favorite set after a write."""
+    # Bumps the generation, so a load that started before the write isn't stored
+    favorite_cache.invalidate(user_id)
+    favorite_cache.set(user_id, favorites)
+
+async def add_favorites(user_id: str, location_ids: Iterable[int], access_token: Optional[str] = None) -> FrozenSet[int]:
+    """
+    Add locations to a user's favorites, returning the updated set.
+    
+    All of them are written with a single upsert that skips the ones that
+    are already favorites, so repeating a request changes nothing.
+    
+    Raises:
+        ValueError: If the user would have more than FAVORITES_MAX_PER_USER favorites
+    """
+    location_ids = sorted(set(location_ids))
+    if not location_ids:
+        return await get_favorite_ids(user_id, access_token)
+    
+    old_favorites = await get_favorite_ids(user_id, access_token)
+    favorites = old_favorites | frozenset(location_ids)
+    if len(favorites) > settings.FAVORITES_MAX_PER_USER:
+        raise ValueError(f"A user can have at most {settings.FAVORITES_MAX_PER_USER} favorites")
+    
+    if supabase:
+        rows = [{"user_id": user_id, "location_id": location_id} for location_id in location_ids]
+        await execute(_as_user(
+            supabase.table("user_favorites").upsert(rows, on_conflict="user_id,location_id", ignore_duplicates=True),
+            access_token,
+        ))
+        _replace_favorites(user_id, favorites)
+    else:
+        _mock_favorites[user_id] = set(favorites)
+    
+    for location_id in favorites - old_favorites:
+        _rank_location_event(location_id, settings.RANKING_FAVORITE_WEIGHT)
+    return favorites
+
+async def remove_favorites(user_id: str, location_ids: Iterable[int], access_token: Optional[str] = None) -> FrozenSet[int]:
+    """Remove locations from a user's favorites with one delete, returning the updated set."""
+    location_ids = sorted(set(location_ids))
+    old_favorites = await get_favorite_ids(user_id, access_token)
+    favorites = old_favorites - frozenset(location_ids)
+    if not location_ids:
+        return favorites
+    
+    if supabase:
+        await execute(_as_user(
+            supabase.table("user_favorites").delete().eq("user_id", user_id).in_("location_id", location_ids),
+            access_token,
+        ))
+        _replace_favorites(user_id, favorites)
+    else:
+        _mock_favorites[user_id] = set(favorites)
+    
+    for location_id in old_favorites - favorites:
+        _rank_location_event(location_id, -settings.RANKING_FAVORITE_WEIGHT)
+    return favorites
+
 async def get_subscription_plans() -> List[Dict[str, Any]]:
     """Get all subscription plans."""
     if not supabase:
         return SAMPLE_SUBSCRIPTION_PLANS
     
     try:
-        response = supabase.table("subscription_plans").select("*").execute()
+        response = await execute(supabase.table("subscription_plans").select("*"))
         return response.data
     except Exception as e:
         logger.error(f"Error getting subscription plans: {str(e)}")
-        return SAMPLE_SUBSCRIPTION_PLANS
+        return _fallback_subscription_plans()
 
 async def get_user_subscription(user_id: str) -> Optional[Dict[str, Any]]:
-    """Get a user's subscription."""
+    """
+    Get a user's active subscription, or None if they have none.
+    
+    Raises on database errors rather than guessing a plan, so callers that
+    cache the result can tell a failed lookup from a free user.
+    """
     if not supabase:
         # Return free plan for development
         return {"plan_id": "free", "name": "Free Plan"}
     
+    response = await execute(supabase.table("user_subscriptions").select("*, subscription_plans(*)").eq("user_id", user_id).eq("is_active", True))
+    if response.data and len(response.data) > 0:
+        return response.data[0]
+    return None
+
+# Repeat-view filter and recent per-location view counts
+location_views = ViewRecorder(
+    window=settings.VIEW_DEDUP_WINDOW,
+    max_viewers=settings.VIEW_DEDUP_SIZE,
+    hours=settings.VIEW_COUNT_HOURS,
+    days=settings.VIEW_COUNT_DAYS,
+    tz=location_timezone,
+)
+
+async def _write_location_views(events: List[Dict[str, Any]]) -> None:
+    """
+    Save a batch of views; used by the background view writer.
+    
+    Signed-in users' views go to user_view_history and every view is added
+    to the hourly and daily counts, in one transaction, so a batch that is
+    retried after a failure is never half applied. record_location_views is
+    only executable by the service role.
+    """
+    await execute(supabase_service.rpc("record_location_views", {
+        "views": [event for event in events if event.get("user_id")],
+        "counts": aggregate_views(events, location_timezone),
+    }))
+
+# Background writer that batches location views
+location_view_writer = BatchWriter(
+    _write_location_views,
+    name="location views",
+    max_queue=settings.VIEW_LOG_QUEUE_SIZE,
+    batch_size=settings.VIEW_LOG_BATCH_SIZE,
+    flush_interval=settings.VIEW_LOG_FLUSH_INTERVAL,
+    spill_path=settings.VIEW_LOG_SPILL_PATH,
+)
+
+def record_location_view(location_id: int, user_id: Optional[str] = None, client_address: Optional[str] = None) -> bool:
+    """
+    Record that a location was viewed, without waiting for the database.
+    
+    Repeat views by the same user (or anonymous client address) within
+    VIEW_DEDUP_WINDOW are ignored. Returns True if the view was counted.
+    """
+    viewer = ("user", user_id) if user_id else ("client", client_address)
+    if not location_views.record(location_id, viewer):
+        return False
+    
+    _rank_location_event(location_id, 1.0)
+    if supabase_service:
+        location_view_writer.submit({
+            "user_id": user_id,
+            "location_id": location_id,
+            "viewed_at": datetime.now(timezone.utc).isoformat(),
+        })
+    return True
+
+async def get_location_view_counts(location_id: int, period: str = "hour", limit: int = 24) -> List[Dict[str, Any]]:
+    """
+    Get a location's view counts per hour or day, newest first.
+    
+    Read from the rollup table, which every worker adds to; falls back to
+    this process's own recent counts when the database can't be reached.
+    """
+    if not supabase:
+        return location_views.counts(location_id, period, limit)
+    
     try:
-        response = supabase.table("user_subscriptions").select("*, subscription_plans(*)").eq("user_id", user_id).eq("is_active", True).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0]
-        return None
+        response = await execute(
+            supabase.table("location_view_counts")
+            .select("bucket, views")
+            .eq("location_id", location_id)
+            .eq("period", period)
+            .order("bucket", desc=True)
+            .limit(limit)
+        )
+        return response.data
     except Exception as e:
-        logger.error(f"Error getting user subscription: {str(e)}")
-        return {"plan_id": "free", "name": "Free Plan"}
+        logger.error(f"Error getting location view counts: {str(e)}")
+        return location_views.counts(location_id, period, limit)
+
+def _rank_location_event(location_id: int, weight: float) -> None:
+    """Add a view (1) or a favorite's weight (negative when removed) to the rankings."""
+    now = datetime.now(timezone.utc).timestamp()
+    for ranking in location_rankings.values():
+        ranking.add(location_id, weight, now)
+
+# Page size used when reading the view counts and favorites for the rankings
+RANKING_LOAD_PAGE_SIZE = 1000
+
+async def _fetch_ranking_events() -> List[Any]:
+    """
+    Read every view and favorite as `(location_id, weight, timestamp)` events.
+    
+    Views come from the hourly counts for the last VIEW_COUNT_HOURS and from
+    the daily counts for the VIEW_COUNT_DAYS before that, each bucket taken
+    at its midpoint; favorites count RANKING_FAVORITE_WEIGHT at the time they
+    were added. Every user's favorites are only readable with the service key.
+    """
+    now = datetime.now(timezone.utc).timestamp()
+    # Hourly counts from the start of the local day VIEW_COUNT_HOURS ago,
+    # daily counts before it, so no view is counted twice
+    start = datetime.fromtimestamp(now - settings.VIEW_COUNT_HOURS * 3600, location_timezone)
+    split = start.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+    oldest = split - timedelta(days=settings.VIEW_COUNT_DAYS)
+    
+    events: List[Any] = []
+    for period, since, until, length in (
+        ("hour", split, None, 3600),
+        ("day", oldest, split, 86400),
+    ):
+        offset = 0
+        while True:
+            query = (
+                supabase_service.table("location_view_counts")
+                .select("location_id, bucket, views")
+                .eq("period", period)
+                .gte("bucket", since.isoformat())
+            )
+            if until is not None:
+                query = query.lt("bucket", until.isoformat())
+            response = await execute(
+                query.order("bucket,location_id").range(offset, offset + RANKING_LOAD_PAGE_SIZE)
+            )
+            for row in response.data:
+                timestamp = datetime.fromisoformat(row["bucket"]).timestamp() + length / 2
+                events.append((row["location_id"], float(row["views"]), min(timestamp, now)))
+            if len(response.data) < RANKING_LOAD_PAGE_SIZE:
+                break
+            offset += RANKING_LOAD_PAGE_SIZE
+    
+    last_id = None
+    while True:
+        query = supabase_service.table("user_favorites").select("id, location_id, created_at").order("id").limit(RANKING_LOAD_PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = await execute(query)
+        for row in response.data:
+            timestamp = datetime.fromisoformat(row["created_at"]).timestamp() if row.get("created_at") else now
+            events.append((row["location_id"], settings.RANKING_FAVORITE_WEIGHT, timestamp))
+        if len(response.data) < RANKING_LOAD_PAGE_SIZE:
+            break
+        last_id = response.data[-1]["id"]
+    
+    return events
+
+async def refresh_location_rankings() -> bool:
+    """
+    Recompute the popular and trending scores from the database.
+    
+    Between refreshes the rankings only see the views and favorites made
+    through this process; a refresh picks up every worker's. Returns False
+    if the tables couldn't be read, or without SUPABASE_SERVICE_KEY.
+    """
+    if not supabase_service:
+        return False
+    
+    try:
+        events = await _fetch_ranking_events()
+    except Exception as e:
+        logger.error(f"Error reading location ranking events: {str(e)}")
+        return False
+    
+    for ranking in location_rankings.values():
+        ranking.replace_scores(events)
+    logger.info(f"Refreshed location rankings from {len(events)} view and favorite rows")
+    return True
+
+async def _refresh_rankings_periodically() -> None:
+    while True:
+        await refresh_location_rankings()
+        await asyncio.sleep(settings.RANKING_REFRESH_INTERVAL)
+
+async def start_location_rankings() -> None:
+    """Load the rankings and start refreshing them."""
+    global _ranking_task
+    
+    if supabase_service and settings.RANKING_REFRESH_INTERVAL > 0 and _ranking_task is None:
+        _ranking_task = asyncio.create_task(_refresh_rankings_periodically())
+
+async def stop_location_rankings() -> None:
+    """Stop refreshing the rankings."""
+    global _ranking_task
+    
+    if _ranking_task is not None:
+        _ranking_task.cancel()
+        try:
+            await _ranking_task
+        except asyncio.CancelledError:
+            pass
+        _ranking_task = None
+
+# Placeholder user ID for failed logins, since login_activities.user_id is a UUID
+UNKNOWN_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+# Login counts by status and each day's most frequent IP addresses and
+# user agents, for the logins made through this process
+login_stats = LoginStats(
+    minutes=settings.LOGIN_STATS_MINUTES,
+    hours=settings.LOGIN_STATS_HOURS,
+    days=settings.LOGIN_STATS_DAYS,
+    top_size=settings.LOGIN_STATS_TOP_SIZE,
+    tz=location_timezone,
+)
+
+async def _insert_login_activities(rows: List[Dict[str, Any]]) -> None:
+    """
+    Save a batch of login activities; used by the background login writer.
+    
+    The activities and their increments of the login rollup tables are
+    written in one transaction by record_login_activities, which only the
+    service role may call. Without SUPABASE_SERVICE_KEY or
+    migrations/05_login_stats.sql the activities are inserted on their own.
+    """
+    if supabase_service:
+        counts, top = aggregate_logins(rows, location_timezone)
+        try:
+            await execute(supabase_service.rpc("record_login_activities", {"activities": rows, "counts": counts, "top": top}))
+            return
+        except Exception as e:
+            if "PGRST202" not in str(e):
+                raise
+            logger.warning("record_login_activities not found, saving login activities without rollups")
+    
+    try:
+        await execute(supabase.table("login_activities").insert(rows))
+    except Exception as e:
+        # Check if it's an RLS error
+        if "violates row-level security policy" in str(e):
+            logger.warning(f"RLS policy prevented login activity logging. This is expected if you haven't set up the proper policies.")
+        raise
+
+# Background writer that batches login activity inserts
+login_activity_writer = BatchWriter(
+    _insert_login_activities,
+    name="login activities",
+    max_queue=settings.LOGIN_LOG_QUEUE_SIZE,
+    batch_size=settings.LOGIN_LOG_BATCH_SIZE,
+    flush_interval=settings.LOGIN_LOG_FLUSH_INTERVAL,
+    spill_path=settings.LOGIN_LOG_SPILL_PATH,
+)
 
 async def log_login_activity(
     user_id: str,
@@ -283,6 +1592,9 @@ async def log_login_activity(
     """
     Log a user login activity.
     
+    The activity is queued for the background login writer, which inserts
+    it in bulk shortly afterwards, so this never waits for the database.
+    
     Args:
         user_id: The user's ID
         email: The user's email
@@ -293,12 +1605,11 @@ async def log_login_activity(
         location: Approximate location based on IP
         
     Returns:
-        The created login activity record
+        The queued login activity record
     """
     # Create login activity data
     login_data = {
-        "id": 0,
-        "user_id": user_id,
+        "user_id": user_id if user_id and user_id != "unknown" else UNKNOWN_USER_ID,
         "email": email,
         "ip_address": ip_address,
         "user_agent": user_agent,
@@ -307,65 +1618,63 @@ async def log_login_activity(
         "login_time": datetime.now().isoformat(),
         "location": location
     }
+    login_stats.record(login_data)
     
     if not supabase:
         logger.warning("Cannot log login activity: Supabase not configured")
         return login_data
     
-    try:
-        # Always try to insert login activity
-        logger.info(f"Logging login activity for {email} ({login_status})")
-        
-        # In development mode, just log locally and return
-        if settings.DEBUG:
-            logger.info(f"DEBUG mode: Login activity logged locally for {email} ({login_status})")
-            return login_data
-        
-        # Try with regular client in production
-        try:
-            response = supabase.table("login_activities").insert(login_data).execute()
-            
-            if response.data and len(response.data) > 0:
-                logger.info(f"Login activity recorded with ID: {response.data[0].get('id')}")
-                return response.data[0]
-        except Exception as insert_error:
-            logger.error(f"Error inserting login activity: {str(insert_error)}")
-            # Continue with local logging
-        
-        # If insert fails or returns no data, just log and return the data
-        logger.info(f"Login activity: {login_data['email']} ({login_data['login_status']})")
-        return login_data
-    except Exception as e:
-        # Check if it's an RLS error
-        if "violates row-level security policy" in str(e):
-            logger.warning(f"RLS policy prevented login activity logging. This is expected if you haven't set up the proper policies.")
-            # Still log the activity locally
-            logger.info(f"Login activity (local only): {login_data['email']} ({login_data['login_status']})")
-        else:
-            logger.error(f"Error logging login activity: {str(e)}")
-        
+    logger.info(f"Logging login activity for {email} ({login_status})")
+    
+    # In development mode, just log locally and return
+    if settings.DEBUG:
+        logger.info(f"DEBUG mode: Login activity logged locally for {email} ({login_status})")
         return login_data
+    
+    login_activity_writer.submit(login_data)
+    return login_data
+
+def login_activity_cursor(activity: Dict[str, Any]) -> str:
+    """Cursor for the page of login activities after this one."""
+    return encode_cursor(activity["login_time"], activity["id"])
+
+def _decode_login_activity_cursor(cursor: str) -> tuple:
+    login_time, activity_id = decode_cursor(cursor, 2)
+    if not isinstance(login_time, str) or not isinstance(activity_id, int):
+        raise ValueError("Malformed cursor")
+    return login_time, activity_id
 
 async def get_login_activities(
     user_id: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Get login activities with optional filtering by user.
+    Get login activities with optional filtering by user, most recent first.
+    
+    Activities are ordered by (login_time, id), so `cursor` (from
+    `login_activity_cursor` on the last row of the previous page) continues
+    after that row using the login_time index, however deep the page.
     
     Args:
         user_id: Filter by user ID (optional)
         limit: Maximum number of results
         offset: Pagination offset
+        cursor: Continue after the page this cursor was taken from
         
     Returns:
         List of login activities
+    
+    Raises:
+        ValueError: If the cursor is malformed
     """
+    after = _decode_login_activity_cursor(cursor) if cursor else None
+    
     if not supabase or settings.DEBUG:
         logger.info("Using mock login activities in development mode")
         # Return mock data for development
-        return [
+        activities = [
             {
                 "id": 1,
                 "user_id": "1",
@@ -394,6 +1703,9 @@ async def get_login_activities(
                 "login_time": (datetime.now() - timedelta(hours=3)).isoformat(),
             }
         ]
+        if after is not None:
+            activities = [a for a in activities if (a["login_time"], a["id"]) < after]
+        return activities[offset:offset + limit]
     
     try:
         query = supabase.table("login_activities").select("*")
@@ -402,16 +1714,98 @@ async def get_login_activities(
         if user_id:
             query = query.eq("user_id", user_id)
         
-        # Order by login_time descending (most recent first)
-        query = query.order("login_time", desc=True)
+        # Order by login_time descending (most recent first), with the ID
+        # breaking ties so the order is total. PostgREST takes a single
+        # order parameter listing every column.
+        query = query.order("login_time.desc,id", desc=True)
         
-        # Apply pagination
-        query = query.range(offset, offset + limit - 1)
+        # Continue after the cursor row: (login_time, id) < cursor
+        if after is not None:
+            login_time, activity_id = after
+            query = _or_filter(
+                query,
+                f'login_time.lt."{login_time}",and(login_time.eq."{login_time}",id.lt.{activity_id})',
+            )
+        
+        # Apply pagination (the end of range() is exclusive)
+        query = query.range(offset, offset + limit)
         
         # Execute query
-        response = query.execute()
+        response = await execute(query)
         return response.data
     except Exception as e:
         logger.error(f"Error getting login activities: {str(e)}")
         # Return empty list on error
-        return []
\ No newline at end of file
+        return []
+
+def _local_login_stats(period: str, limit: int, top_limit: int, now: float) -> Dict[str, Any]:
+    """Login stats from this process's own rollups."""
+    return {
+        "period": period,
+        "counts": login_stats.counts(period, limit, now),
+        "top": {kind: login_stats.top(kind, top_limit, now) for kind in TOP_KINDS},
+    }
+
+async def get_login_stats(period: str = "hour", limit: int = 24, top_limit: int = 10) -> Dict[str, Any]:
+    """
+    Get login counts by status and today's most frequent IP addresses and
+    user agents.
+    
+    Read from the rollup tables, which every worker adds to, with queries
+    that touch at most `limit` buckets and `top_limit` rows per list however
+    large login_activities is. The tables are only readable with the service
+    key, so callers must check the user is an admin. Falls back to this
+    process's own rollups in development, without SUPABASE_SERVICE_KEY or
+    when the database can't be reached.
+    
+    Args:
+        period: "minute", "hour" or "day"
+        limit: Number of most recent buckets, empty ones included
+        top_limit: Number of IP addresses and user agents
+        
+    Returns:
+        `counts` (newest bucket first, each with `by_status` login counts)
+        and `top` (per kind, values with `logins` and `failures`)
+    """
+    now = datetime.now(timezone.utc).timestamp()
+    
+    if not supabase_service or settings.DEBUG:
+        return _local_login_stats(period, limit, top_limit, now)
+    
+    buckets = recent_buckets(period, limit, now, location_timezone)
+    today = datetime.fromtimestamp(bucket_start(now, "day", location_timezone), timezone.utc).isoformat()
+    try:
+        response = await execute(
+            supabase_service.table("login_activity_counts")
+            .select("bucket, login_status, logins")
+            .eq("period", period)
+            .gte("bucket", datetime.fromtimestamp(buckets[-1], timezone.utc).isoformat())
+        )
+        by_bucket: Dict[float, Dict[str, int]] = {}
+        for row in response.data:
+            statuses = by_bucket.setdefault(datetime.fromisoformat(row["bucket"]).timestamp(), {})
+            statuses[row["login_status"]] = row["logins"]
+        
+        top = {}
+        for kind in TOP_KINDS:
+            response = await execute(
+                supabase_service.table("login_activity_top")
+                .select("value, logins, failures")
+                .eq("day", today)
+                .eq("kind", kind)
+                .order("logins", desc=True)
+                .limit(top_limit)
+            )
+            top[kind] = response.data
+    except Exception as e:
+        logger.error(f"Error getting login stats: {str(e)}")
+        return _local_login_stats(period, limit, top_limit, now)
+    
+    return {
+        "period": period,
+        "counts": [
+            {"bucket": datetime.fromtimestamp(bucket, timezone.utc).isoformat(), "by_status": by_bucket.get(bucket, {})}
+            for bucket in buckets
+        ],
+        "top": top,
+    }
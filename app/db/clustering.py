@@ -0,0 +1,197 @@
+from typing import Any, Dict, List, Tuple
+import math
+
+from app.db.spatial import BBox, SpatialIndex
+
+# Web Mercator's latitude limit; points beyond it are clamped onto the edge
+MAX_MERCATOR_LAT = 85.0511287798
+
+def project_mercator(lng: float, lat: float) -> Tuple[float, float]:
+    """Project to Web Mercator world coordinates in [0, 1], y growing south."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    sin = math.sin(math.radians(lat))
+    x = lng / 360.0 + 0.5
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return (min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0))
+
+class _Cluster:
+    """Running aggregate of the points that fall in one grid cell."""
+
+    __slots__ = ("count", "sum_lng", "sum_lat", "id_sum", "categories")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lng = 0.0
+        self.sum_lat = 0.0
+        # While count == 1 this is the ID of the only member, which lets a
+        # cell be reported as a plain point without storing its members.
+        self.id_sum = 0
+        self.categories: Dict[str, int] = {}
+
+    def add(self, item_id: int, lng: float, lat: float, category: str, sign: int) -> None:
+        self.count += sign
+        self.sum_lng += sign * lng
+        self.sum_lat += sign * lat
+        self.id_sum += sign * item_id
+        remaining = self.categories.get(category, 0) + sign
+        if remaining:
+            self.categories[category] = remaining
+        else:
+            self.categories.pop(category, None)
+
+class ClusterIndex:
+    """
+    Hierarchical grid clustering over points, one level per zoom.
+
+    At zoom z the world is split into square cells `radius` pixels wide on a
+    `extent`-pixel tile grid, and each cell keeps a running count, centroid
+    and per-category breakdown of the points inside it. Cells at zoom z are
+    exactly four cells at zoom z + 1, so the levels nest like supercluster's
+    hierarchy, but updates are incremental: a write touches one cell per zoom
+    instead of rebuilding the tree.
+
+    Above `max_zoom` individual points are returned.
+    """
+
+    def __init__(self, min_zoom: int = 0, max_zoom: int = 16, radius: int = 64, extent: int = 256):
+        if radius <= 0 or extent % radius:
+            raise ValueError("radius must be a positive divisor of extent")
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._cells_per_tile = extent // radius
+        self._levels: List[Dict[Tuple[int, int], _Cluster]] = [
+            {} for _ in range(max_zoom + 1)
+        ]
+        self._points: Dict[int, Tuple[float, float, float, float, str]] = {}
+        self._leaves = SpatialIndex()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _scale(self, zoom: int) -> int:
+        return self._cells_per_tile * (1 << zoom)
+
+    def _update(self, item_id: int, sign: int) -> None:
+        x, y, lng, lat, category = self._points[item_id]
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            scale = self._scale(zoom)
+            key = (min(int(x * scale), scale - 1), min(int(y * scale), scale - 1))
+            level = self._levels[zoom]
+            cluster = level.get(key)
+            if cluster is None:
+                cluster = level[key] = _Cluster()
+            cluster.add(item_id, lng, lat, category, sign)
+            if cluster.count == 0:
+                del level[key]
+
+    def insert(self, item_id: int, lng: float, lat: float, category: str) -> None:
+        """Add a point, or move it if the ID is already indexed."""
+        if item_id in self._points:
+            self.remove(item_id)
+
+        x, y = project_mercator(lng, lat)
+        self._points[item_id] = (x, y, lng, lat, category)
+        self._leaves.insert(item_id, lng, lat)
+        self._update(item_id, 1)
+
+    def remove(self, item_id: int) -> bool:
+        """Remove a point. Returns False if the ID was not indexed."""
+        if item_id not in self._points:
+            return False
+
+        self._update(item_id, -1)
+        self._leaves.remove(item_id)
+        del self._points[item_id]
+        return True
+
+    def clear(self) -> None:
+        """Remove every point from the index."""
+        for level in self._levels:
+            level.clear()
+        self._points.clear()
+        self._leaves.clear()
+
+    def get_clusters(self, bbox: BBox, zoom: int) -> List[Dict[str, Any]]:
+        """
+        Return the clusters and single points visible in `bbox` at `zoom`.
+
+        Each entry has `count`, `latitude`, `longitude` and `categories`;
+        single points also carry `location_id`, and clusters carry the
+        `expansion_zoom` at which they start to split.
+        """
+        min_lng, min_lat, max_lng, max_lat = bbox
+
+        if zoom > self.max_zoom:
+            results = []
+            for item_id in self._leaves.query(bbox):
+                _, _, lng, lat, category = self._points[item_id]
+                results.append(self._point(item_id, lng, lat, category))
+            return results
+
+        zoom = max(zoom, self.min_zoom)
+        level = self._levels[zoom]
+        scale = self._scale(zoom)
+        min_x, min_y = project_mercator(min_lng, max_lat)
+        max_x, max_y = project_mercator(max_lng, min_lat)
+        min_cx, min_cy = int(min_x * scale), int(min_y * scale)
+        max_cx, max_cy = min(int(max_x * scale), scale - 1), min(int(max_y * scale), scale - 1)
+
+        # Cells are selected by overlap with the viewport, so clusters just
+        # outside the edge still show up while the user is panning. Walk the
+        # cell range unless it is larger than the level itself.
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(level):
+            keys = [
+                key for key in level
+                if min_cx <= key[0] <= max_cx and min_cy <= key[1] <= max_cy
+            ]
+        else:
+            keys = [
+                (cx, cy)
+                for cx in range(min_cx, max_cx + 1)
+                for cy in range(min_cy, max_cy + 1)
+                if (cx, cy) in level
+            ]
+
+        results = []
+        for key in keys:
+            cluster = level[key]
+
+            if cluster.count == 1:
+                _, _, lng, lat, category = self._points[cluster.id_sum]
+                results.append(self._point(cluster.id_sum, lng, lat, category))
+            else:
+                results.append({
+                    "id": f"{zoom}/{key[0]}/{key[1]}",
+                    "count": cluster.count,
+                    "latitude": cluster.sum_lat / cluster.count,
+                    "longitude": cluster.sum_lng / cluster.count,
+                    "categories": dict(cluster.categories),
+                    "expansion_zoom": self._expansion_zoom(zoom, key),
+                })
+        return results
+
+    def _expansion_zoom(self, zoom: int, key: Tuple[int, int]) -> int:
+        """Find the first zoom at which the points in a cell split up."""
+        cx, cy = key
+        while zoom < self.max_zoom:
+            zoom += 1
+            level = self._levels[zoom]
+            children = [
+                (cx * 2 + dx, cy * 2 + dy) for dx in (0, 1) for dy in (0, 1)
+                if (cx * 2 + dx, cy * 2 + dy) in level
+            ]
+            if len(children) > 1:
+                return zoom
+            cx, cy = children[0]
+        return self.max_zoom + 1
+
+    @staticmethod
+    def _point(item_id: int, lng: float, lat: float, category: str) -> Dict[str, Any]:
+        return {
+            "id": f"location/{item_id}",
+            "count": 1,
+            "latitude": lat,
+            "longitude": lng,
+            "categories": {category: 1},
+            "location_id": item_id,
+        }
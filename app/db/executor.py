@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+import asyncio
+import functools
+import logging
+import time
+
+from app.core import metrics
+from app.core.config import settings
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Dedicated pool for blocking Supabase calls. Its size bounds how many
+# PostgREST/Auth requests are in flight at once; further calls queue here
+# instead of stalling the event loop. Each Supabase client keeps a pooled
+# keep-alive HTTP session that the worker threads share.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_POOL_SIZE,
+    thread_name_prefix="supabase",
+)
+
+# PostgREST HTTP methods and the operations they perform
+_OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+async def _timed(func: Callable[[], T], table: str, operation: str, timeout: Optional[float]) -> T:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await asyncio.wait_for(loop.run_in_executor(_executor, func), timeout or settings.DB_TIMEOUT)
+        outcome = "ok"
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        labels = (table, operation)
+        metrics.supabase_request_duration.observe(time.perf_counter() - start, labels)
+        metrics.supabase_requests.inc(labels + (outcome,))
+
+async def run_sync(func: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+    """
+    Run a blocking function in the Supabase thread pool and await its result.
+
+    Raises asyncio.TimeoutError if the call (including time spent queued)
+    takes longer than `timeout` seconds, or `settings.DB_TIMEOUT` by default.
+    The worker thread itself can't be interrupted and finishes in the
+    background, bounded by the HTTP client's own timeout.
+    """
+    # Calls that aren't table queries are Supabase Auth calls
+    operation = getattr(func, "__name__", "call")
+    return await _timed(functools.partial(func, *args, **kwargs), "auth", operation, timeout)
+
+async def execute(query: Any, timeout: Optional[float] = None) -> Any:
+    """Execute a PostgREST query builder without blocking the event loop."""
+    table = getattr(query, "path", "").lstrip("/") or "unknown"
+    method = getattr(query, "http_method", "")
+    operation = _OPERATIONS.get(method, method.lower() or "unknown")
+    if operation == "insert" and "resolution=merge-duplicates" in str(getattr(query, "headers", {}).get("Prefer", "")):
+        operation = "upsert"
+    return await _timed(query.execute, table, operation, timeout)
+
+def shutdown() -> None:
+    """Stop accepting work and let in-flight calls finish."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("Supabase executor shut down")
@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+import numpy as np
+
+# Mean earth radius in meters, matching PostGIS' spherical distance
+EARTH_RADIUS_METERS = 6371008.8
+
+def haversine_distances(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters from one point to arrays of points."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - np.radians(lng)
+
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _geohash_grid(precision: int) -> tuple:
+    """Number of longitude and latitude cells of the geohash grid at a precision."""
+    bits = 5 * precision
+    return 1 << ((bits + 1) // 2), 1 << (bits // 2)
+
+def _geohash_encode(ix: int, iy: int, precision: int) -> str:
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    # Interleave the bits, longitude first, most significant first
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (ix >> (lng_bits - 1 - i // 2)) & 1
+        else:
+            bit = (iy >> (lat_bits - 1 - i // 2)) & 1
+        value = (value << 1) | bit
+    return "".join(_GEOHASH_ALPHABET[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+def _geohash_cell(lat: float, lng: float, precision: int) -> tuple:
+    columns, rows = _geohash_grid(precision)
+    ix = min(int((lng + 180.0) / 360.0 * columns), columns - 1)
+    iy = min(int((lat + 90.0) / 180.0 * rows), rows - 1)
+    return max(ix, 0), max(iy, 0)
+
+def geohash(lat: float, lng: float, precision: int) -> str:
+    """Geohash of a point (precision 5 cells are about 4.9 x 4.9 km, precision 6 about 1.2 x 0.6 km)."""
+    return _geohash_encode(*_geohash_cell(lat, lng, precision), precision)
+
+def geohash_cover(bbox: tuple, precision: int, max_cells: int = 64) -> Optional[List[str]]:
+    """
+    Geohashes of the cells overlapping a (min_lng, min_lat, max_lng, max_lat)
+    box, or None if there would be more than `max_cells`.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    min_ix, min_iy = _geohash_cell(min_lat, min_lng, precision)
+    max_ix, max_iy = _geohash_cell(max_lat, max_lng, precision)
+    if (max_ix - min_ix + 1) * (max_iy - min_iy + 1) > max_cells:
+        return None
+    return [
+        _geohash_encode(ix, iy, precision)
+        for ix in range(min_ix, max_ix + 1)
+        for iy in range(min_iy, max_iy + 1)
+    ]
@@ -0,0 +1,233 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+import logging
+import re
+
+import numpy as np
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# A span of the week in minutes since Monday 00:00, end exclusive
+Interval = Tuple[int, int]
+
+# Day names (English and Indonesian, full and short) to weekday numbers
+_DAY_NUMBERS = {}
+for _number, _names in enumerate([
+    ("monday", "mon", "senin", "sen"),
+    ("tuesday", "tue", "tues", "selasa", "sel"),
+    ("wednesday", "wed", "rabu", "rab"),
+    ("thursday", "thu", "thur", "thurs", "kamis", "kam"),
+    ("friday", "fri", "jumat", "jum'at", "jum"),
+    ("saturday", "sat", "sabtu", "sab"),
+    ("sunday", "sun", "minggu", "min", "ahad"),
+]):
+    for _name in _names:
+        _DAY_NUMBERS[_name] = _number
+
+# Keys meaning every day of the week
+_EVERY_DAY = {"daily", "everyday", "every day", "all days", "setiap hari", "tiap hari"}
+
+_CLOSED = {"closed", "tutup", "libur", "-", ""}
+_ALL_DAY = {"24 hours", "open 24 hours", "24h", "24/7", "24 jam", "buka 24 jam"}
+
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*(?:m\.?)?"
+_RANGE = re.compile(rf"^{_TIME}\s*(?:-|–|—|to|until|s/d|sampai)\s*{_TIME}$", re.IGNORECASE)
+_DAY_RANGE = re.compile(r"^\s*([\w']+)\s*(?:-|–|—|to|s/d|sampai)\s*([\w']+)\s*$")
+
+def _minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> int:
+    hours = int(hour)
+    if meridiem:
+        hours = hours % 12 + (12 if meridiem.lower() == "p" else 0)
+    minutes = hours * 60 + int(minute or 0)
+    if not 0 <= minutes <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time: {hour}:{minute}")
+    return minutes
+
+def parse_day_hours(text: str) -> List[Interval]:
+    """
+    Parse one day's hours into spans of minutes since that day's midnight.
+
+    Accepts "11:00 - 22:00", "10.00-14.00, 17.00-22.00", "9am - 5pm",
+    "Closed" and "24 hours". A range ending at or before its start runs past
+    midnight, so the span ends after 1440.
+
+    Raises:
+        ValueError: If the text isn't recognized
+    """
+    text = text.strip()
+    if text.lower() in _CLOSED:
+        return []
+    if text.lower() in _ALL_DAY:
+        return [(0, MINUTES_PER_DAY)]
+
+    spans = []
+    for part in re.split(r"[,;&]|\band\b|\bdan\b", text):
+        match = _RANGE.match(part.strip())
+        if not match:
+            raise ValueError(f"Unrecognized hours: {text!r}")
+        start = _minutes(*match.group(1, 2, 3))
+        end = _minutes(*match.group(4, 5, 6))
+        if end <= start:
+            # Overnight, or "00:00 - 00:00" for open all day
+            end += MINUTES_PER_DAY
+        spans.append((start, end))
+    return spans
+
+def _days(key: str) -> List[int]:
+    """Weekday numbers (Monday is 0) a key of operating_hours applies to."""
+    key = key.strip().lower()
+    if key in _EVERY_DAY:
+        return list(range(7))
+    if key in _DAY_NUMBERS:
+        return [_DAY_NUMBERS[key]]
+    match = _DAY_RANGE.match(key)
+    if match and match.group(1) in _DAY_NUMBERS and match.group(2) in _DAY_NUMBERS:
+        first, last = _DAY_NUMBERS[match.group(1)], _DAY_NUMBERS[match.group(2)]
+        return [(first + offset) % 7 for offset in range((last - first) % 7 + 1)]
+    raise ValueError(f"Unrecognized day: {key!r}")
+
+def merge_intervals(intervals: Sequence[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or touch."""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def parse_operating_hours(hours: Optional[Dict[str, Any]]) -> List[Interval]:
+    """
+    Turn an operating_hours dict into sorted, merged weekly intervals.
+
+    Keys are day names ("Monday", "Mon", "Senin"), day ranges ("Mon - Fri")
+    or "Daily"; a single day's entry overrides a range or "Daily". Times are
+    local to the location. Overnight hours spill into the next day, and
+    Sunday night wraps around to Monday morning. A single day whose hours
+    can't be parsed is treated as closed, even if a range covers it; other
+    entries that can't be parsed are skipped.
+    """
+    if not hours or not isinstance(hours, dict):
+        return []
+
+    per_day: Dict[int, List[Interval]] = {}
+    # Apply ranges and "Daily" first, so single days override them
+    entries = sorted(hours.items(), key=lambda item: item[0].strip().lower() in _DAY_NUMBERS)
+    for key, value in entries:
+        try:
+            days = _days(str(key))
+        except ValueError as e:
+            logger.debug(f"Skipping operating hours entry: {str(e)}")
+            continue
+        try:
+            spans = parse_day_hours(str(value))
+        except ValueError as e:
+            if str(key).strip().lower() not in _DAY_NUMBERS:
+                logger.debug(f"Skipping operating hours entry: {str(e)}")
+                continue
+            logger.debug(f"Treating {key} as closed: {str(e)}")
+            spans = []
+        for day in days:
+            per_day[day] = spans
+
+    intervals = []
+    for day, spans in per_day.items():
+        for start, end in spans:
+            start += day * MINUTES_PER_DAY
+            end += day * MINUTES_PER_DAY
+            if end > MINUTES_PER_WEEK:
+                intervals.append((start, MINUTES_PER_WEEK))
+                intervals.append((0, end - MINUTES_PER_WEEK))
+            else:
+                intervals.append((start, end))
+    return merge_intervals(intervals)
+
+def minute_of_week(when: datetime, timezone: ZoneInfo) -> int:
+    """
+    Minutes since Monday 00:00 of a moment in the given timezone.
+
+    Naive datetimes are taken to already be in that timezone.
+    """
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone)
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+def is_open(intervals: Sequence[Interval], minute: int) -> bool:
+    """Whether a minute of the week falls inside one of the intervals."""
+    index = bisect_right(intervals, (minute, MINUTES_PER_WEEK + 1)) - 1
+    return index >= 0 and intervals[index][0] <= minute < intervals[index][1]
+
+class OpeningHoursIndex:
+    """
+    Interval index over the week for a set of opening-hours patterns.
+
+    Each pattern (an operating_hours dict, identified by an integer code) is
+    parsed once. The week is then cut at every pattern's opening and closing
+    minute into segments during which the same patterns are open, so asking
+    which patterns are open at a moment is a binary search over the
+    segment boundaries, whatever the number of locations sharing them.
+    """
+
+    def __init__(self):
+        # Parsed intervals per pattern code
+        self.intervals: List[List[Interval]] = []
+        self._boundaries: Optional[List[int]] = None
+        self._segments: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def sync(self, patterns: Sequence[Any]) -> None:
+        """
+        Parse the patterns not seen yet.
+
+        `patterns` is indexed by code and only ever appended to (like a
+        `StringTable`'s values); if it got shorter it was cleared, and the
+        index is rebuilt.
+        """
+        if len(patterns) < len(self.intervals):
+            self.clear()
+        if len(patterns) == len(self.intervals):
+            return
+        for hours in patterns[len(self.intervals):]:
+            self.intervals.append(parse_operating_hours(hours))
+        # The timeline is rebuilt on the next query
+        self._boundaries = None
+
+    def clear(self) -> None:
+        self.intervals.clear()
+        self._boundaries = None
+        self._segments = []
+
+    def _build(self) -> None:
+        events: Dict[int, List[Tuple[int, int]]] = {0: []}
+        for code, intervals in enumerate(self.intervals):
+            for start, end in intervals:
+                events.setdefault(start, []).append((code, 1))
+                events.setdefault(end, []).append((code, -1))
+
+        boundaries, segments = [], []
+        open_counts: Dict[int, int] = {}
+        for minute in sorted(events):
+            if minute >= MINUTES_PER_WEEK:
+                break
+            for code, change in events[minute]:
+                open_counts[code] = open_counts.get(code, 0) + change
+            boundaries.append(minute)
+            segments.append(np.array(sorted(code for code, count in open_counts.items() if count > 0), dtype=np.int32))
+
+        self._boundaries = boundaries
+        self._segments = segments
+
+    def open_codes(self, minute: int) -> np.ndarray:
+        """Codes of the patterns open at a minute of the week."""
+        if self._boundaries is None:
+            self._build()
+        minute %= MINUTES_PER_WEEK
+        return self._segments[bisect_right(self._boundaries, minute) - 1]
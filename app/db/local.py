@@ -0,0 +1,566 @@
+from copy import deepcopy
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import fnmatch
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+import httpx
+import numpy as np
+from postgrest import SyncPostgrestClient
+
+from app.db.geo import haversine_distances
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Base URL the local PostgREST client talks to; requests never leave the process
+LOCAL_URL = "http://local-db/rest/v1"
+
+# Primary key of each table; integer keys are assigned on insert
+PRIMARY_KEYS = {
+    "locations": "id",
+    "categories": "id",
+    "subscription_plans": "id",
+    "user_subscriptions": "id",
+    "login_activities": "id",
+    "user_favorites": "id",
+    "user_view_history": "id",
+    "location_view_counts": "id",
+    "login_activity_counts": "id",
+    "login_activity_top": "id",
+}
+
+# Unique constraints other than the primary key
+UNIQUE_KEYS = {
+    "user_favorites": ("user_id", "location_id"),
+    "location_view_counts": ("location_id", "period", "bucket"),
+    "login_activity_counts": ("period", "bucket", "login_status"),
+    "login_activity_top": ("day", "kind", "value"),
+}
+
+# Embeddable relations: (table, embedded table) -> (foreign key, referenced key)
+FOREIGN_KEYS = {
+    ("user_subscriptions", "subscription_plans"): ("plan_id", "id"),
+    ("locations", "categories"): ("category_id", "id"),
+}
+
+_FILTER_OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "in", "is", "cs", "cd")
+
+class FaultInjector:
+    """
+    Latency and failures added to every local database call.
+
+    Each call sleeps for a normally distributed delay (`latency` seconds
+    with `jitter` standard deviation). A share `error_rate` of calls then
+    fail with a PostgREST 503 error, and a share `stall_rate` hang for
+    `stall_seconds` first, to exercise client timeouts. The sleep happens in
+    the calling worker thread, so it holds a pool slot like a slow network
+    call would. Attributes can be changed while the app is running.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 30.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        """Seconds the next call should take before it is answered."""
+        delay = self.latency
+        if self.jitter:
+            delay = self._random.gauss(self.latency, self.jitter)
+        if self.stall_rate and self._random.random() < self.stall_rate:
+            delay += self.stall_seconds
+        return max(delay, 0.0)
+
+    def should_fail(self) -> bool:
+        return bool(self.error_rate) and self._random.random() < self.error_rate
+
+class QueryError(Exception):
+    """A request the local database rejects, reported as a PostgREST error."""
+
+    def __init__(self, status_code: int, code: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that aren't inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def _coerce(raw: str, current: Any) -> Any:
+    """Convert a filter value from the query string to the column's type."""
+    raw = raw.strip('"')
+    if isinstance(current, bool):
+        return raw.lower() == "true"
+    if isinstance(current, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(current, float):
+        return float(raw)
+    return raw
+
+def _like(value: Any, pattern: str, case_sensitive: bool) -> bool:
+    if value is None:
+        return False
+    # PostgREST accepts * as well as % as the wildcard
+    glob = pattern.replace("%", "*").replace("_", "?")
+    if case_sensitive:
+        return fnmatch.fnmatchcase(str(value), glob)
+    return fnmatch.fnmatchcase(str(value).lower(), glob.lower())
+
+def _compare(value: Any, operator: str, raw: str) -> bool:
+    if operator == "is":
+        expected = {"null": None, "true": True, "false": False}.get(raw.lower(), raw)
+        return value is expected if expected is None else value == expected
+    if operator == "in":
+        options = [option.strip('"') for option in _split_top_level(raw.strip("()"))]
+        return value is not None and any(value == _coerce(option, value) for option in options)
+    if operator in ("like", "ilike"):
+        return _like(value, raw, operator == "like")
+    if operator in ("cs", "cd"):
+        expected = set(json.loads(raw.replace("{", "[").replace("}", "]"))) if raw.startswith(("{", "[")) else {raw}
+        actual = set(value or [])
+        return expected <= actual if operator == "cs" else actual <= expected
+    if value is None:
+        # Comparisons with NULL are never true in SQL
+        return False
+
+    expected = _coerce(raw, value)
+    if operator == "eq":
+        return value == expected
+    if operator == "neq":
+        return value != expected
+    try:
+        if operator == "gt":
+            return value > expected
+        if operator == "gte":
+            return value >= expected
+        if operator == "lt":
+            return value < expected
+        if operator == "lte":
+            return value <= expected
+    except TypeError:
+        return False
+    raise QueryError(400, "PGRST100", f"Unknown operator: {operator}")
+
+def _parse_condition(column: str, expression: str) -> Callable[[Dict[str, Any]], bool]:
+    """Compile `column=[not.]operator.value` into a row predicate."""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[len("not."):]
+    operator, _, raw = expression.partition(".")
+    if operator not in _FILTER_OPERATORS:
+        raise QueryError(400, "PGRST100", f"Failed to parse filter: {column}={expression}")
+
+    def predicate(row: Dict[str, Any]) -> bool:
+        return _compare(row.get(column), operator, raw) != negate
+    return predicate
+
+def _parse_logic(expression: str, combine: Callable[[Iterable[bool]], bool]) -> Callable[[Dict[str, Any]], bool]:
+    """Compile the body of an `or=(...)`/`and=(...)` filter."""
+    predicates = []
+    for part in _split_top_level(expression.strip()[1:-1]):
+        nested = re.match(r"^(not\.)?(and|or)(\(.*\))$", part)
+        if nested:
+            inner = _parse_logic(nested.group(3), any if nested.group(2) == "or" else all)
+            predicates.append((lambda p: lambda row: not p(row))(inner) if nested.group(1) else inner)
+            continue
+        column, _, condition = part.partition(".")
+        predicates.append(_parse_condition(column, condition))
+    return lambda row: combine(predicate(row) for predicate in predicates)
+
+def _sort_rows(rows: List[Dict[str, Any]], order: str) -> List[Dict[str, Any]]:
+    """Apply a PostgREST `order` parameter (`col[.asc|.desc][.nullsfirst|.nullslast],...`)."""
+    # Stable sorts applied from the last key to the first
+    for term in reversed(_split_top_level(order)):
+        column, *modifiers = term.split(".")
+        descending = "desc" in modifiers
+        # Postgres puts NULLs last ascending and first descending by default
+        nulls_first = "nullsfirst" in modifiers or (descending and "nullslast" not in modifiers)
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse=descending)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+class LocalDatabase:
+    """
+    In-memory tables answering the PostgREST HTTP API.
+
+    Requests built by the real postgrest-py query builders are routed here
+    through an httpx transport, so filters (including `or=(...)`),
+    ordering, `limit`, `Range` headers, inserts, upserts, updates, deletes,
+    embedded relations and the `nearest_locations` function all go through
+    the same client code as against Supabase.
+    """
+
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.tables: Dict[str, Dict[Any, Dict[str, Any]]] = {table: {} for table in PRIMARY_KEYS}
+        self._next_ids: Dict[str, int] = {table: 1 for table in PRIMARY_KEYS}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def seed(self, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Load rows into a table, keeping their primary keys. Returns the row count."""
+        with self._lock:
+            count = 0
+            for row in rows:
+                self._store(table, dict(row))
+                count += 1
+            return count
+
+    def _store(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        key = PRIMARY_KEYS[table]
+        if row.get(key) is None:
+            row[key] = self._next_ids[table]
+        if isinstance(row[key], int):
+            self._next_ids[table] = max(self._next_ids[table], row[key] + 1)
+        self.tables[table][row[key]] = row
+        return row
+
+    def _table(self, name: str) -> Dict[Any, Dict[str, Any]]:
+        table = self.tables.get(name)
+        if table is None:
+            raise QueryError(404, "42P01", f'relation "public.{name}" does not exist')
+        return table
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer one PostgREST request (the httpx transport handler)."""
+        self.requests += 1
+        delay = self.faults.delay()
+        if delay:
+            time.sleep(delay)
+        if self.faults.should_fail():
+            return self._error(QueryError(503, "PGRST000", "Injected failure"))
+
+        path = request.url.path[len(httpx.URL(LOCAL_URL).path):].strip("/")
+        params = list(request.url.params.multi_items())
+        body = json.loads(request.content) if request.content else None
+        try:
+            with self._lock:
+                if path.startswith("rpc/"):
+                    data = self._rpc(path[len("rpc/"):], body or {})
+                    return httpx.Response(200, json=data)
+                return self._table_request(request, path, params, body)
+        except QueryError as e:
+            return self._error(e)
+
+    @staticmethod
+    def _error(error: QueryError) -> httpx.Response:
+        return httpx.Response(
+            error.status_code,
+            json={"code": error.code, "message": error.message, "details": None, "hint": None},
+        )
+
+    def _matching(self, table: str, params: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        predicates = []
+        for name, value in params:
+            if name in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            if name in ("or", "and"):
+                predicates.append(_parse_logic(value, any if name == "or" else all))
+            elif name in ("not.or", "not.and"):
+                inner = _parse_logic(value, any if name == "not.or" else all)
+                predicates.append(lambda row, inner=inner: not inner(row))
+            else:
+                predicates.append(_parse_condition(name, value))
+        return [row for row in self._table(table).values() if all(p(row) for p in predicates)]
+
+    def _select(self, table: str, rows: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+        """Project rows onto the `select` columns, embedding related rows."""
+        columns = _split_top_level(select or "*")
+        result = []
+        for row in rows:
+            projected: Dict[str, Any] = {}
+            for column in columns:
+                embedded = re.match(r"^(\w+)\((.*)\)$", column)
+                if embedded:
+                    related, inner = embedded.groups()
+                    relation = FOREIGN_KEYS.get((table, related))
+                    if relation is None:
+                        raise QueryError(400, "PGRST200", f"Could not find a relationship between '{table}' and '{related}'")
+                    foreign_key, referenced = relation
+                    match = next(
+                        (other for other in self._table(related).values() if other.get(referenced) == row.get(foreign_key)),
+                        None,
+                    )
+                    projected[related] = self._select(related, [match], inner)[0] if match else None
+                elif column == "*":
+                    projected.update(row)
+                else:
+                    projected[column] = row.get(column)
+            result.append(deepcopy(projected))
+        return result
+
+    def _table_request(
+        self,
+        request: httpx.Request,
+        table: str,
+        params: List[Tuple[str, str]],
+        body: Any,
+    ) -> httpx.Response:
+        query = dict(params)
+        prefer = request.headers.get("prefer", "")
+        representation = "return=minimal" not in prefer
+
+        if request.method in ("GET", "HEAD"):
+            rows = self._matching(table, params)
+            if "order" in query:
+                rows = _sort_rows(rows, query["order"])
+            total = len(rows)
+
+            start = int(query.get("offset", 0))
+            end = start + int(query["limit"]) - 1 if "limit" in query else total - 1
+            range_header = request.headers.get("range")
+            if range_header:
+                range_start, _, range_end = range_header.partition("-")
+                start = int(range_start)
+                if range_end:
+                    end = min(end, int(range_end)) if "limit" in query else int(range_end)
+            page = rows[start:end + 1]
+
+            headers = {"Content-Range": f"{start}-{start + len(page) - 1}/{total if 'count=' in prefer else '*'}"}
+            if not page:
+                headers["Content-Range"] = f"*/{total if 'count=' in prefer else '*'}"
+            data = self._select(table, page, query.get("select", "*")) if request.method == "GET" else []
+            return httpx.Response(200, json=data, headers=headers)
+
+        if request.method == "POST":
+            rows = body if isinstance(body, list) else [body]
+            upsert = "resolution=merge-duplicates" in prefer
+            ignore = "resolution=ignore-duplicates" in prefer
+            if query.get("on_conflict"):
+                keys = [tuple(query["on_conflict"].split(","))]
+            else:
+                keys = [(PRIMARY_KEYS[table],)] + ([UNIQUE_KEYS[table]] if table in UNIQUE_KEYS else [])
+            existing_by_key = {
+                (columns, tuple(row.get(column) for column in columns)): row
+                for row in self._table(table).values() for columns in keys
+            }
+            saved = []
+            for row in rows:
+                current = next((
+                    existing_by_key[(columns, values)] for columns in keys
+                    for values in [tuple(row.get(column) for column in columns)]
+                    if None not in values and (columns, values) in existing_by_key
+                ), None)
+                if current is not None:
+                    if ignore:
+                        continue
+                    if not upsert:
+                        raise QueryError(409, "23505", f'duplicate key value violates unique constraint "{table}_pkey"')
+                    current.update(row)
+                    saved.append(current)
+                else:
+                    stored = self._store(table, dict(row))
+                    for columns in keys:
+                        existing_by_key[(columns, tuple(stored.get(column) for column in columns))] = stored
+                    saved.append(stored)
+            return httpx.Response(201, json=deepcopy(saved) if representation else [])
+
+        if request.method == "PATCH":
+            rows = self._matching(table, params)
+            for row in rows:
+                row.update(body or {})
+            return httpx.Response(200, json=deepcopy(rows) if representation else [])
+
+        if request.method == "DELETE":
+            rows = self._matching(table, params)
+            primary_key = PRIMARY_KEYS[table]
+            for row in rows:
+                del self.tables[table][row[primary_key]]
+            return httpx.Response(200, json=deepcopy(rows) if representation else [])
+
+        raise QueryError(405, "PGRST117", f"Unsupported HTTP method: {request.method}")
+
+    def _rpc(self, function: str, args: Dict[str, Any]) -> Any:
+        if function == "nearest_locations":
+            return self._nearest_locations(**args)
+        if function == "record_location_views":
+            return self._record_location_views(**args)
+        if function == "record_login_activities":
+            return self._record_login_activities(**args)
+        raise QueryError(404, "PGRST202", f"Could not find the function public.{function}")
+
+    def _record_location_views(self, views: List[Dict[str, Any]], counts: List[Dict[str, Any]]) -> int:
+        """Same effect as the `record_location_views` SQL function."""
+        locations = self.tables["locations"]
+        written = 0
+        for view in views:
+            if view.get("location_id") in locations and view.get("user_id"):
+                self._store("user_view_history", dict(view))
+                written += 1
+
+        existing = {
+            (row["location_id"], row["period"], row["bucket"]): row
+            for row in self.tables["location_view_counts"].values()
+        }
+        for increment in counts:
+            if increment["location_id"] not in locations:
+                continue
+            row = existing.get((increment["location_id"], increment["period"], increment["bucket"]))
+            if row is None:
+                row = self._store("location_view_counts", {**increment, "views": 0})
+                existing[(row["location_id"], row["period"], row["bucket"])] = row
+            row["views"] += increment["views"]
+        return written
+
+    def _increment(self, table: str, increments: List[Dict[str, Any]], fields: Tuple[str, ...]) -> None:
+        """Add increments to the rows matching on the table's unique key."""
+        keys = UNIQUE_KEYS[table]
+        existing = {tuple(row[key] for key in keys): row for row in self.tables[table].values()}
+        for increment in increments:
+            key = tuple(increment[key] for key in keys)
+            row = existing.get(key)
+            if row is None:
+                row = existing[key] = self._store(table, {**increment, **{field: 0 for field in fields}})
+            for field in fields:
+                row[field] += increment[field]
+
+    def _record_login_activities(
+        self,
+        activities: List[Dict[str, Any]],
+        counts: List[Dict[str, Any]],
+        top: List[Dict[str, Any]],
+    ) -> int:
+        """Same effect as the `record_login_activities` SQL function."""
+        for activity in activities:
+            self._store("login_activities", dict(activity))
+        self._increment("login_activity_counts", counts, ("logins",))
+        self._increment("login_activity_top", top, ("logins", "failures"))
+        return len(activities)
+
+    def _nearest_locations(
+        self,
+        lat: float,
+        lng: float,
+        radius_meters: Optional[float] = None,
+        max_results: int = 10,
+        result_offset: int = 0,
+        category_filter: Optional[str] = None,
+        premium_filter: Optional[bool] = None,
+        search_filter: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Same results as the `nearest_locations` SQL function."""
+        rows = [
+            row for row in self.tables["locations"].values()
+            if (category_filter is None or row.get("category_id") == category_filter)
+            and (premium_filter is None or row.get("premium_only") == premium_filter)
+            and (
+                search_filter is None
+                or _like(row.get("name"), f"%{search_filter}%", False)
+                or _like(row.get("description"), f"%{search_filter}%", False)
+            )
+        ]
+        if not rows:
+            return []
+
+        distances = haversine_distances(
+            lat, lng,
+            np.array([row["latitude"] for row in rows], dtype=np.float64),
+            np.array([row["longitude"] for row in rows], dtype=np.float64),
+        )
+        order = np.argsort(distances, kind="stable")
+        if radius_meters is not None:
+            order = order[distances[order] <= radius_meters]
+        order = order[result_offset:result_offset + max_results]
+        return [{**deepcopy(rows[index]), "distance_meters": float(distances[index])} for index in order]
+
+class LocalBackend:
+    """
+    Stand-in for the Supabase client backed by a `LocalDatabase`.
+
+    It exposes the same `table()`/`rpc()` query builders (they are the real
+    postgrest-py builders), so it can replace the Supabase client wherever
+    the data tables are queried.
+    """
+
+    def __init__(self, database: Optional[LocalDatabase] = None):
+        self.database = database or LocalDatabase()
+        self.postgrest = SyncPostgrestClient(LOCAL_URL)
+        self.postgrest.session = httpx.Client(
+            base_url=LOCAL_URL,
+            headers=self.postgrest.session.headers,
+            transport=httpx.MockTransport(self.database.handle),
+        )
+
+    @property
+    def faults(self) -> FaultInjector:
+        return self.database.faults
+
+    def table(self, table_name: str):
+        """Query builder for a table."""
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, fn: str, params: Dict[str, Any]):
+        """Query builder calling a database function."""
+        return self.postgrest.rpc(fn, params)
+
+def _read_ndjson(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def create_local_backend(
+    categories: List[Dict[str, Any]],
+    locations: List[Dict[str, Any]],
+    subscription_plans: List[Dict[str, Any]],
+    locations_path: str = "",
+    faults: Optional[FaultInjector] = None,
+) -> LocalBackend:
+    """
+    Create a local backend seeded with the given rows.
+
+    Args:
+        categories: Category rows
+        locations: Location rows, unless `locations_path` is given
+        subscription_plans: Subscription plan rows
+        locations_path: NDJSON file of locations to seed instead (as written
+            by `manage.py export-locations` or `benchmarks.catalogue`)
+        faults: Latency and error injection settings
+    """
+    backend = LocalBackend(LocalDatabase(faults))
+    now = datetime.now(timezone.utc).isoformat()
+    backend.database.seed("categories", categories)
+    backend.database.seed("subscription_plans", subscription_plans)
+    count = backend.database.seed(
+        "locations",
+        ({"created_at": now, "updated_at": now, **row} for row in (_read_ndjson(locations_path) if locations_path else locations)),
+    )
+    logger.info(f"Local database backend seeded with {count} locations")
+    return backend
@@ -0,0 +1,188 @@
+from datetime import datetime, timezone, tzinfo
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import time
+
+from app.db.views import bucket_start
+
+# Rollup periods of the login counts
+PERIODS = ("minute", "hour", "day")
+
+# Columns whose most frequent values are tracked per day
+TOP_KINDS = ("ip_address", "user_agent")
+
+def _timestamp(event: Dict[str, Any]) -> float:
+    login_time = event.get("login_time")
+    return datetime.fromisoformat(login_time).timestamp() if login_time else time.time()
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def recent_buckets(period: str, limit: int, now: float, tz: tzinfo) -> List[float]:
+    """Starts of the last `limit` buckets of a period, newest first."""
+    buckets = []
+    bucket = bucket_start(now, period, tz)
+    for _ in range(limit):
+        buckets.append(bucket)
+        bucket = bucket_start(bucket - 1, period, tz)
+    return buckets
+
+def aggregate_logins(events: Iterable[Dict[str, Any]], tz: tzinfo) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Sum login activities into rollup increments.
+
+    Returns the per-minute, hour and day counts by login_status (rows of
+    `period`, `bucket`, `login_status` and `logins`) and the per-day counts
+    of each IP address and user agent (rows of `day`, `kind`, `value`,
+    `logins` and `failures`). Buckets are ISO timestamps.
+    """
+    counts: Dict[Tuple[str, float, str], int] = {}
+    top: Dict[Tuple[float, str, str], List[int]] = {}
+    for event in events:
+        timestamp = _timestamp(event)
+        status = event.get("login_status") or "unknown"
+        for period in PERIODS:
+            key = (period, bucket_start(timestamp, period, tz), status)
+            counts[key] = counts.get(key, 0) + 1
+
+        day = bucket_start(timestamp, "day", tz)
+        for kind in TOP_KINDS:
+            if event.get(kind):
+                totals = top.setdefault((day, kind, event[kind]), [0, 0])
+                totals[0] += 1
+                totals[1] += status == "failed"
+
+    return (
+        [
+            {"period": period, "bucket": _isoformat(bucket), "login_status": status, "logins": logins}
+            for (period, bucket, status), logins in counts.items()
+        ],
+        [
+            {"day": _isoformat(day), "kind": kind, "value": value, "logins": logins, "failures": failures}
+            for (day, kind, value), (logins, failures) in top.items()
+        ],
+    )
+
+class TopCounter:
+    """
+    Approximate most frequent values of a stream in bounded memory.
+
+    Space-Saving: at most `capacity` values are counted. A new value
+    arriving when the counter is full replaces the least counted one and
+    starts from its count, which is kept as the value's possible overcount.
+    Every value seen more than total / capacity times is kept, and no count
+    is ever lower than the true one. Failures are only counted from when a
+    value was last admitted.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        # value -> [logins, failures, overcount]
+        self._counts: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, value: str, failed: bool = False) -> None:
+        entry = self._counts.get(value)
+        if entry is None:
+            floor = 0
+            if len(self._counts) >= self.capacity:
+                evicted = min(self._counts, key=lambda key: self._counts[key][0])
+                floor = self._counts.pop(evicted)[0]
+            entry = self._counts[value] = [floor, 0, floor]
+        entry[0] += 1
+        entry[1] += failed
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        """The `limit` most counted values, most first."""
+        return [
+            {"value": value, "logins": logins, "failures": failures, "overcount": overcount}
+            for value, (logins, failures, overcount) in heapq.nlargest(
+                limit, self._counts.items(), key=lambda item: (item[1][0], item[0])
+            )
+        ]
+
+class LoginStats:
+    """
+    Login activity rollups kept up to date as logins happen.
+
+    Logins are counted by login_status per minute, hour and day for the
+    last `minutes`, `hours` and `days`, and each day's most frequent IP
+    addresses and user agents are tracked with a `TopCounter` of
+    `top_size` values. Every update and read touches a bounded number of
+    buckets, so dashboards never depend on the size of login_activities.
+    These are this process's logins only; the database rollups written with
+    the activities sum every worker's.
+    """
+
+    def __init__(
+        self,
+        minutes: int = 120,
+        hours: int = 48,
+        days: int = 30,
+        top_size: int = 100,
+        tz: tzinfo = timezone.utc,
+    ):
+        self.retention = {"minute": minutes * 60, "hour": hours * 3600, "day": days * 86400}
+        self.top_size = top_size
+        self.tz = tz
+        self.recorded = 0
+        # Per period: bucket start -> {login_status: logins}
+        self._counts: Dict[str, Dict[float, Dict[str, int]]] = {period: {} for period in PERIODS}
+        # Per kind: day start -> most frequent values
+        self._top: Dict[str, Dict[float, TopCounter]] = {kind: {} for kind in TOP_KINDS}
+        self._current_minute = 0.0
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Count a login activity (a row of login_activities)."""
+        timestamp = _timestamp(event)
+        status = event.get("login_status") or "unknown"
+
+        minute = bucket_start(timestamp, "minute", self.tz)
+        if minute > self._current_minute:
+            self._current_minute = minute
+            self._prune(timestamp)
+        for period in PERIODS:
+            bucket = minute if period == "minute" else bucket_start(timestamp, period, self.tz)
+            statuses = self._counts[period].setdefault(bucket, {})
+            statuses[status] = statuses.get(status, 0) + 1
+
+        day = bucket_start(timestamp, "day", self.tz)
+        for kind in TOP_KINDS:
+            if event.get(kind):
+                counter = self._top[kind].get(day)
+                if counter is None:
+                    counter = self._top[kind][day] = TopCounter(self.top_size)
+                counter.add(event[kind], status == "failed")
+
+        self.recorded += 1
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets older than the retention, once per minute."""
+        for period, buckets in self._counts.items():
+            oldest = now - self.retention[period]
+            for bucket in [bucket for bucket in buckets if bucket < oldest]:
+                del buckets[bucket]
+        oldest = now - self.retention["day"]
+        for days in self._top.values():
+            for day in [day for day in days if day < oldest]:
+                del days[day]
+
+    def counts(self, period: str, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Logins per bucket by status for the last `limit` buckets, newest
+        first, including empty ones.
+        """
+        now = time.time() if now is None else now
+        buckets = self._counts[period]
+        return [
+            {"bucket": _isoformat(bucket), "by_status": dict(buckets.get(bucket, {}))}
+            for bucket in recent_buckets(period, limit, now, self.tz)
+        ]
+
+    def top(self, kind: str, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Today's most frequent values of an IP address or user agent."""
+        now = time.time() if now is None else now
+        counter = self._top[kind].get(bucket_start(now, "day", self.tz))
+        return counter.top(limit) if counter is not None else []
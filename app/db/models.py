@@ -61,6 +61,11 @@ class LocationUpdate(BaseModel):
     images: Optional[List[str]] = None
     premium_only: Optional[bool] = None
 
+class FavoritesUpdate(BaseModel):
+    """Model for adding and removing many favorites at once."""
+    add: List[int] = Field(default_factory=list)
+    remove: List[int] = Field(default_factory=list)
+
 class SubscriptionPlan(BaseModel):
     """Subscription plan model."""
     id: str
@@ -0,0 +1,355 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from app.core.config import settings
+from app.db import client
+from app.db.clustering import ClusterIndex
+from app.db.spatial import BBox, parse_bbox
+from app.db.tiles import encode_tile, tiles_for_point
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+PACK_FORMAT = 1
+
+_VERSION_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+def parse_regions(value: str) -> Dict[str, BBox]:
+    """
+    Parse region definitions written as `name:minLng,minLat,maxLng,maxLat`
+    and separated by `;`.
+    """
+    regions = {}
+    for definition in value.split(";"):
+        if not definition.strip():
+            continue
+        name, _, bbox = definition.partition(":")
+        name = name.strip().lower()
+        if not re.match(r"^[a-z0-9_-]+$", name):
+            raise ValueError(f"Invalid region name: {name!r}")
+        regions[name] = parse_bbox(bbox)
+    return regions
+
+def is_version(value: str) -> bool:
+    """Check that a string looks like a pack version."""
+    return bool(_VERSION_PATTERN.match(value))
+
+def _canonical(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str).encode("utf-8")
+
+def _diff(old: Dict[Any, Dict[str, Any]], new: Dict[Any, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """Entries added or changed between two keyed collections, and keys removed."""
+    upserted = [item for key, item in new.items() if old.get(key) != item]
+    deleted = [key for key in old if key not in new]
+    return upserted, deleted
+
+class PackInfo:
+    """A built pack on disk and the delta packs that lead to it."""
+
+    __slots__ = ("region", "variant", "version", "path", "size", "sha256", "created_at", "deltas", "checked_at", "dataset")
+
+    def __init__(self, region: str, variant: str, version: str, path: Path, created_at: str):
+        self.region = region
+        self.variant = variant
+        self.version = version
+        self.path = path
+        self.size = path.stat().st_size
+        self.sha256 = hashlib.sha256(path.read_bytes()).hexdigest()
+        self.created_at = created_at
+        # Previous version -> delta file
+        self.deltas: Dict[str, Path] = {}
+        self.checked_at = 0.0
+        self.dataset: Tuple[int, int] = (-1, -1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "region": self.region,
+            "version": self.version,
+            "size": self.size,
+            "sha256": self.sha256,
+            "created_at": self.created_at,
+            "deltas": {
+                version: {"size": path.stat().st_size}
+                for version, path in self.deltas.items()
+                if path.exists()
+            },
+        }
+
+def build_pack_document(
+    region: str,
+    bbox: BBox,
+    locations: List[Dict[str, Any]],
+    categories: List[Dict[str, Any]],
+    category_filter: Optional[List[str]],
+    include_tiles: bool,
+    min_zoom: int = settings.PACK_MIN_ZOOM,
+    tile_max_zoom: int = settings.PACK_TILE_MAX_ZOOM,
+) -> Dict[str, Any]:
+    """
+    Build the contents of a region pack.
+
+    The pack holds the full location rows, their categories and the marker
+    clusters of every zoom from `min_zoom` to the clustering max zoom, so a
+    client can browse the region without calling the API. Above the max
+    zoom clients draw the locations themselves. With `include_tiles`, the
+    GeoJSON tiles from `min_zoom` to `tile_max_zoom` are included as well.
+
+    The version is a hash of the locations and categories, so rebuilding
+    unchanged data yields the same version.
+    """
+    version = hashlib.sha256(_canonical([locations, categories])).hexdigest()[:16]
+
+    cluster_index = ClusterIndex(min_zoom=min_zoom, max_zoom=settings.CLUSTER_MAX_ZOOM, radius=settings.CLUSTER_RADIUS)
+    for loc in locations:
+        cluster_index.insert(loc["id"], loc["longitude"], loc["latitude"], loc["category_id"])
+    clusters = {
+        str(zoom): cluster_index.get_clusters(bbox, zoom)
+        for zoom in range(min_zoom, settings.CLUSTER_MAX_ZOOM + 1)
+    }
+
+    document = {
+        "format": PACK_FORMAT,
+        "type": "full",
+        "region": region,
+        "bbox": list(bbox),
+        "category_filter": category_filter,
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "categories": categories,
+        "locations": locations,
+        "clusters": clusters,
+    }
+
+    if include_tiles:
+        by_tile: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for loc in locations:
+            for z, x, y in tiles_for_point(loc["longitude"], loc["latitude"], tile_max_zoom)[min_zoom:]:
+                by_tile[f"{z}/{x}/{y}"].append(loc)
+        document["tiles"] = {key: json.loads(encode_tile(tile_locations)) for key, tile_locations in by_tile.items()}
+
+    return document
+
+def build_delta_document(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a delta pack that turns the `old` pack into the `new` one.
+
+    Locations are keyed by ID, clusters by zoom and cluster ID and tiles by
+    `z/x/y`; each section lists what was added or changed and what was
+    removed. Categories are small, so they are always sent in full.
+    """
+    locations, deleted_locations = _diff(
+        {loc["id"]: loc for loc in old["locations"]},
+        {loc["id"]: loc for loc in new["locations"]},
+    )
+
+    clusters: Dict[str, Dict[str, Any]] = {}
+    for zoom, new_clusters in new["clusters"].items():
+        upserted, deleted = _diff(
+            {cluster["id"]: cluster for cluster in old["clusters"].get(zoom, [])},
+            {cluster["id"]: cluster for cluster in new_clusters},
+        )
+        if upserted or deleted:
+            clusters[zoom] = {"upserted": upserted, "deleted": deleted}
+
+    document = {
+        "format": PACK_FORMAT,
+        "type": "delta",
+        "region": new["region"],
+        "from": old["version"],
+        "version": new["version"],
+        "created_at": new["created_at"],
+        "categories": new["categories"],
+        "locations": {"upserted": locations, "deleted": deleted_locations},
+        "clusters": clusters,
+    }
+
+    if "tiles" in new:
+        old_tiles = old.get("tiles", {})
+        document["tiles"] = {
+            "upserted": {key: tile for key, tile in new["tiles"].items() if old_tiles.get(key) != tile},
+            "deleted": [key for key in old_tiles if key not in new["tiles"]],
+        }
+
+    return document
+
+def _write_gzip(path: Path, document: Dict[str, Any]) -> None:
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        # mtime=0 keeps the bytes (and so the hash) the same for the same content
+        with gzip.GzipFile(temp, "wb", compresslevel=9, mtime=0) as f:
+            f.write(json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+        os.replace(temp, path)
+    finally:
+        if temp.exists():
+            temp.unlink()
+
+def _read_gzip(path: Path) -> Dict[str, Any]:
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.read())
+
+class PackBuilder:
+    """
+    Builds offline region packs and keeps them on disk.
+
+    Each region and category set (a "variant") is stored under
+    `<directory>/<region>/<variant>/`, as `<version>.pack.json.gz` for full
+    packs and `<from>-<to>.delta.json.gz` for deltas. When the data changes
+    a new version is written, deltas from the last `history` versions to it
+    are built, and older versions are deleted.
+
+    A pack is rebuilt on demand once the location or category data it was
+    built from changes in this process, or after `max_age` seconds to pick
+    up writes made by other workers.
+    """
+
+    def __init__(
+        self,
+        regions: Dict[str, BBox],
+        directory: str,
+        history: int = 5,
+        max_age: float = 300,
+    ):
+        self.regions = regions
+        self.directory = Path(directory)
+        self.history = history
+        self.max_age = max_age
+        self._packs: Dict[Tuple[str, str], PackInfo] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def variant(categories: Optional[Iterable[str]], include_tiles: bool) -> str:
+        """Directory name of a category set, e.g. "all" or "cafes+restaurants+tiles"."""
+        name = "+".join(sorted(set(categories))) if categories is not None else "all"
+        return f"{name}+tiles" if include_tiles else name
+
+    def _variant_dir(self, region: str, variant: str) -> Path:
+        return self.directory / region / variant
+
+    def _versions_on_disk(self, directory: Path) -> List[Path]:
+        """Full packs in a variant directory, newest first."""
+        return sorted(directory.glob("*.pack.json.gz"), key=lambda path: path.stat().st_mtime, reverse=True)
+
+    async def get_pack(
+        self,
+        region: str,
+        categories: Optional[List[str]] = None,
+        include_tiles: bool = False,
+    ) -> Optional[PackInfo]:
+        """
+        Get the current pack of a region and category set, building it if
+        the data changed.
+
+        Returns None if the locations could not be loaded.
+
+        Raises:
+            KeyError: If the region is unknown
+        """
+        bbox = self.regions[region]
+        variant = self.variant(categories, include_tiles)
+        key = (region, variant)
+        dataset = (client.dataset_versions["locations"], client.dataset_versions["categories"])
+
+        pack = self._packs.get(key)
+        if pack is not None and pack.dataset == dataset and time.monotonic() - pack.checked_at < self.max_age:
+            return pack
+
+        async with self._lock:
+            pack = self._packs.get(key)
+            if pack is not None and pack.dataset == dataset and time.monotonic() - pack.checked_at < self.max_age:
+                return pack
+
+            locations = await client.get_region_locations(bbox, categories)
+            if locations is None:
+                # Keep serving the last pack while the data can't be read
+                return pack
+            all_categories = await client.get_categories()
+            pack_categories = [
+                cat for cat in all_categories
+                if categories is None or cat["id"] in categories
+            ]
+
+            try:
+                # Clustering, diffing and compressing are CPU-bound, so keep
+                # them off the event loop
+                pack = await asyncio.get_running_loop().run_in_executor(
+                    None, self._build, region, bbox, variant, locations, pack_categories, categories, include_tiles,
+                )
+            except OSError as e:
+                logger.error(f"Error writing region pack {region}/{variant}: {str(e)}")
+                return self._packs.get(key)
+
+            pack.dataset = dataset
+            pack.checked_at = time.monotonic()
+            self._packs[key] = pack
+            return pack
+
+    def _build(
+        self,
+        region: str,
+        bbox: BBox,
+        variant: str,
+        locations: List[Dict[str, Any]],
+        categories: List[Dict[str, Any]],
+        category_filter: Optional[List[str]],
+        include_tiles: bool,
+    ) -> PackInfo:
+        directory = self._variant_dir(region, variant)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        document = build_pack_document(
+            region, bbox, locations, categories,
+            sorted(category_filter) if category_filter is not None else None,
+            include_tiles,
+        )
+        version = document["version"]
+        path = directory / f"{version}.pack.json.gz"
+
+        previous = [old for old in self._versions_on_disk(directory) if old != path]
+        if path.exists():
+            # Unchanged since it was last built (possibly by another worker)
+            document["created_at"] = _read_gzip(path)["created_at"]
+            os.utime(path)
+        else:
+            _write_gzip(path, document)
+            logger.info(f"Built region pack {region}/{variant} {version} with {len(locations)} locations")
+
+        pack = PackInfo(region, variant, version, path, document["created_at"])
+
+        kept = previous[:self.history]
+        for old_path in kept:
+            old_version = old_path.name.split(".")[0]
+            delta_path = directory / f"{old_version}-{version}.delta.json.gz"
+            if not delta_path.exists():
+                try:
+                    _write_gzip(delta_path, build_delta_document(_read_gzip(old_path), document))
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"Error building delta pack {old_version}-{version}: {str(e)}")
+                    continue
+            pack.deltas[old_version] = delta_path
+
+        # Drop versions that fell out of the history, and deltas to older versions
+        for old_path in previous[self.history:]:
+            old_path.unlink(missing_ok=True)
+        for delta_path in directory.glob("*.delta.json.gz"):
+            if not delta_path.name.endswith(f"-{version}.delta.json.gz"):
+                delta_path.unlink(missing_ok=True)
+
+        return pack
+
+# Shared pack builder for the configured regions
+pack_builder = PackBuilder(
+    parse_regions(settings.OFFLINE_REGIONS),
+    settings.PACK_DIR,
+    settings.PACK_HISTORY,
+    settings.PACK_MAX_AGE,
+)
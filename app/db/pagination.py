@@ -0,0 +1,30 @@
+from typing import Any, Tuple
+import base64
+import binascii
+import json
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    payload = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """
+    Decode a cursor made by `encode_cursor`.
+
+    Args:
+        cursor: The opaque cursor
+        size: Number of values the cursor must hold
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Malformed cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Malformed cursor")
+    return tuple(values)
@@ -0,0 +1,195 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import heapq
+import math
+import time
+
+# Group holding every location
+ALL = "all"
+
+# Rebase scores before exp() of the elapsed time gets near float overflow
+_MAX_EXPONENT = 500.0
+
+def category_group(category_id: str) -> str:
+    return f"category:{category_id}"
+
+def cell_group(cell: str) -> str:
+    return f"cell:{cell}"
+
+class DecayedRanking:
+    """
+    Locations ranked by an exponentially time-decayed score.
+
+    Each event adds `weight` to a location's score, and scores halve every
+    `half_life` seconds. Scores are kept relative to a fixed origin
+    ("forward decay"): an event at time t adds `weight * exp(rate * (t -
+    origin))`, so the decay factor is the same for every location and the
+    order of the stored values never changes as time passes. Ranked lists
+    therefore only change when an event arrives.
+
+    Every location belongs to groups (all locations, its category, its
+    geohash cell). Each group keeps its `top_k` best locations as a list
+    sorted by (score desc, ID) that is updated per event in O(k), so ranked
+    queries read the first entries instead of sorting every score. Lists
+    are only rebuilt from the scores when a score drop (a favorite removed)
+    may have let an untracked location overtake a listed one.
+    """
+
+    def __init__(self, half_life: float, top_k: int = 200, origin: Optional[float] = None):
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.top_k = top_k
+        self.origin = time.time() if origin is None else origin
+        self.scores: Dict[int, float] = {}
+        self.groups_of: Dict[int, Tuple[str, ...]] = {}
+        self.members: Dict[str, Set[int]] = {}
+        self._top: Dict[str, List[Tuple[float, int]]] = {}
+        self._dirty: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _weight(self, weight: float, timestamp: float) -> float:
+        exponent = self.rate * (timestamp - self.origin)
+        if exponent > _MAX_EXPONENT:
+            self._rebase(timestamp)
+            exponent = 0.0
+        return weight * math.exp(exponent)
+
+    def _rebase(self, timestamp: float) -> None:
+        """Move the origin forward, scaling every stored score down alike."""
+        factor = math.exp(-self.rate * (timestamp - self.origin))
+        self.origin = timestamp
+        self.scores = {location_id: score * factor for location_id, score in self.scores.items()}
+        self._top = {group: [(score * factor, location_id) for score, location_id in top] for group, top in self._top.items()}
+
+    def score(self, location_id: int, now: Optional[float] = None) -> float:
+        """A location's current decayed score."""
+        now = time.time() if now is None else now
+        return self.scores.get(location_id, 0.0) * math.exp(-self.rate * (now - self.origin))
+
+    def set_groups(self, location_id: int, groups: Iterable[str]) -> None:
+        """Set the groups a location is ranked in, moving it out of its old ones."""
+        groups = tuple(groups)
+        old_groups = self.groups_of.get(location_id, ())
+        if groups == old_groups:
+            return
+        self._leave(location_id, [group for group in old_groups if group not in groups])
+        self.groups_of[location_id] = groups
+        score = self.scores.get(location_id, 0.0)
+        for group in groups:
+            if group in old_groups:
+                continue
+            self.members.setdefault(group, set()).add(location_id)
+            if score > 0:
+                self._update_top(group, location_id, 0.0, score)
+
+    def remove(self, location_id: int) -> None:
+        """Forget a deleted location."""
+        self._leave(location_id, self.groups_of.pop(location_id, ()))
+        self.scores.pop(location_id, None)
+
+    def clear_groups(self) -> None:
+        """Drop every group membership, keeping the scores."""
+        self.groups_of.clear()
+        self.members.clear()
+        self._top.clear()
+        self._dirty.clear()
+
+    def _leave(self, location_id: int, groups: Iterable[str]) -> None:
+        score = self.scores.get(location_id, 0.0)
+        for group in groups:
+            members = self.members.get(group)
+            if members is not None:
+                members.discard(location_id)
+            if score > 0:
+                self._update_top(group, location_id, score, 0.0)
+
+    def add(self, location_id: int, weight: float, timestamp: Optional[float] = None) -> None:
+        """Record an event worth `weight` (negative to take some back)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        # May rebase the stored scores, so it comes before reading them
+        weight = self._weight(weight, timestamp)
+        old_score = self.scores.get(location_id, 0.0)
+        new_score = max(old_score + weight, 0.0)
+        self.scores[location_id] = new_score
+        for group in self.groups_of.get(location_id, ()):
+            self._update_top(group, location_id, old_score, new_score)
+
+    def _update_top(self, group: str, location_id: int, old_score: float, new_score: float) -> None:
+        """Keep a group's top list in line with a score change."""
+        if group in self._dirty:
+            return
+        top = self._top.setdefault(group, [])
+        was_full = len(top) >= self.top_k
+        listed = False
+        if old_score > 0:
+            index = bisect_left(top, (-old_score, location_id))
+            if index < len(top) and top[index] == (-old_score, location_id):
+                del top[index]
+                listed = True
+
+        if listed and was_full and new_score < old_score:
+            # A listed location dropped; an untracked location may now
+            # belong in its place
+            self._dirty.add(group)
+            return
+
+        entry = (-new_score, location_id)
+        if new_score > 0 and (len(top) < self.top_k or entry < top[-1]):
+            insort(top, entry)
+            if len(top) > self.top_k:
+                top.pop()
+
+    def _rebuild(self, group: str) -> None:
+        scores = self.scores
+        scored = ((-scores[location_id], location_id) for location_id in self.members.get(group, ()) if scores.get(location_id, 0.0) > 0)
+        self._top[group] = heapq.nsmallest(self.top_k, scored)
+        self._dirty.discard(group)
+
+    def replace_scores(self, events: Iterable[Tuple[int, float, float]]) -> None:
+        """
+        Recompute every score from `(location_id, weight, timestamp)` events
+        and rebuild the top lists.
+        """
+        self.origin = time.time()
+        self.scores = {}
+        for location_id, weight, timestamp in events:
+            self.scores[location_id] = self.scores.get(location_id, 0.0) + self._weight(weight, timestamp)
+        for group in self.members:
+            self._rebuild(group)
+
+    def ranked(self, group: str = ALL) -> Iterator[int]:
+        """
+        IDs of a group's locations from highest to lowest score.
+
+        The top list is served first; only if the caller reads past it are
+        the remaining members sorted (unscored ones by ID).
+        """
+        if group in self._dirty:
+            self._rebuild(group)
+        top = list(self._top.get(group, ()))
+        for _, location_id in top:
+            yield location_id
+
+        members = self.members.get(group, set())
+        if len(top) >= len(members):
+            return
+        listed = {location_id for _, location_id in top}
+        scores = self.scores
+        rest = sorted(
+            (location_id for location_id in members if location_id not in listed),
+            key=lambda location_id: (-scores.get(location_id, 0.0), location_id),
+        )
+        yield from rest
+
+    def ranked_groups(self, groups: Iterable[str]) -> Iterator[int]:
+        """IDs of the locations of several disjoint groups, merged by score."""
+        scores = self.scores
+        return heapq.merge(
+            *(self.ranked(group) for group in groups),
+            key=lambda location_id: (-scores.get(location_id, 0.0), location_id),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {"scored": len(self.scores), "groups": len(self.members), "stale_groups": len(self._dirty)}
@@ -0,0 +1,210 @@
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import re
+import unicodedata
+
+# Weight of a match in each indexed field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "address": 1.0,
+    "description": 1.0,
+}
+
+# Extra search keywords per category, so Indonesian and English queries both
+# find them ("kopi" finds cafes, "rumah sakit" finds hospitals)
+CATEGORY_KEYWORDS = {
+    "restaurants": "restaurant restoran rumah makan warung kuliner food",
+    "cafes": "cafe kafe coffee kopi kedai",
+    "sports": "sport olahraga gym lapangan fitness",
+    "hospitals": "hospital rumah sakit rs klinik clinic",
+    "shopping": "shop belanja mal mall toko pasar",
+}
+
+# Words too common to be worth indexing
+STOP_WORDS = frozenset([
+    "dan", "di", "ke", "dari", "yang", "untuk", "dengan", "atau", "ini", "itu",
+    "the", "and", "of", "in", "at", "a", "an", "to", "for", "with",
+])
+
+# Indonesian particles and possessive suffixes stripped from longer words
+# ("kopinya" -> "kopi", "enaklah" -> "enak")
+SUFFIXES = ("nya", "lah", "kah", "pun", "ku", "mu")
+
+# Score multipliers for how a query token matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.5
+
+# Limits that keep expansions of very short or very common prefixes cheap
+MAX_PREFIX_EXPANSIONS = 50
+MAX_FUZZY_EXPANSIONS = 10
+MIN_FUZZY_SIMILARITY = 0.45
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _normalize(text: str) -> str:
+    # Fold accents ("café" -> "cafe") and case
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+def _stem(token: str) -> str:
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalized, lightly stemmed search terms."""
+    if not text:
+        return []
+    return [
+        _stem(token) for token in _TOKEN_RE.findall(_normalize(text))
+        if token not in STOP_WORDS
+    ]
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """
+    Incrementally maintained inverted index for location search.
+
+    Each term maps to the documents containing it with a field-weighted
+    score. Query tokens match indexed terms exactly, by prefix (so the word
+    being typed matches as you type) or, when neither finds anything, by
+    trigram similarity to tolerate typos. Every query token has to match
+    for a document to be returned, and results are ranked by total score.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[Hashable, float]] = {}
+        self._documents: Dict[Hashable, Dict[str, float]] = {}
+        # Sorted vocabulary for prefix lookups, and trigrams for typo lookups
+        self._terms: List[str] = []
+        self._trigram_terms: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, doc_id: Hashable, fields: Dict[str, Optional[str]]) -> None:
+        """Index a document, replacing any previous version of it."""
+        self.remove(doc_id)
+
+        weights: Dict[str, float] = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + weight
+
+        self._documents[doc_id] = weights
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[doc_id] = weight
+
+    def remove(self, doc_id: Hashable) -> bool:
+        """Remove a document. Returns False if it was not indexed."""
+        weights = self._documents.pop(doc_id, None)
+        if weights is None:
+            return False
+
+        for term in weights:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+        return True
+
+    def clear(self) -> None:
+        """Remove every document from the index."""
+        self._postings.clear()
+        self._documents.clear()
+        self._terms.clear()
+        self._trigram_terms.clear()
+
+    def _add_term(self, term: str) -> None:
+        self._terms.insert(bisect_left(self._terms, term), term)
+        for trigram in _trigrams(term):
+            self._trigram_terms.setdefault(trigram, set()).add(term)
+
+    def _remove_term(self, term: str) -> None:
+        del self._terms[bisect_left(self._terms, term)]
+        for trigram in _trigrams(term):
+            terms = self._trigram_terms[trigram]
+            terms.discard(term)
+            if not terms:
+                del self._trigram_terms[trigram]
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Find the indexed terms a query token matches, with a match weight."""
+        matches: List[Tuple[str, float]] = []
+        if token in self._postings:
+            matches.append((token, EXACT_MATCH))
+
+        if prefix:
+            start = bisect_left(self._terms, token)
+            for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    matches.append((term, PREFIX_MATCH))
+
+        if matches or len(token) < 3:
+            return matches
+
+        # Nothing matched, so look for terms that share enough trigrams
+        query_trigrams = _trigrams(token)
+        shared: Dict[str, int] = {}
+        for trigram in query_trigrams:
+            for term in self._trigram_terms.get(trigram, ()):
+                shared[term] = shared.get(term, 0) + 1
+
+        similar = []
+        for term, count in shared.items():
+            similarity = count / (len(query_trigrams) + len(_trigrams(term)) - count)
+            if similarity >= MIN_FUZZY_SIMILARITY:
+                similar.append((similarity, term))
+        similar.sort(reverse=True)
+
+        return [(term, FUZZY_MATCH * similarity) for similarity, term in similar[:MAX_FUZZY_EXPANSIONS]]
+
+    def search(self, query: str, candidates: Optional[Iterable[Hashable]] = None) -> List[Hashable]:
+        """
+        Return the IDs of documents matching every query token, best first.
+
+        The last token is also matched as a prefix, since it is usually the
+        word still being typed. Pass `candidates` to restrict the results to
+        a subset of documents.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        allowed = set(candidates) if candidates is not None else None
+        scores: Optional[Dict[Hashable, float]] = None
+
+        for position, token in enumerate(tokens):
+            token_scores: Dict[Hashable, float] = {}
+            for term, match_weight in self._expand(token, prefix=position == len(tokens) - 1):
+                for doc_id, weight in self._postings[term].items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    score = weight * match_weight
+                    if score > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items()}
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
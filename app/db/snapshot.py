@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import numpy as np
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KURASNAP"
+FORMAT_VERSION = 1
+
+# magic, format version, created_at, location count, metadata offset and
+# length, row data offset, column arrays offset
+_HEADER = struct.Struct("<8sIdQQQQQ")
+
+def _align(offset: int, alignment: int = 8) -> int:
+    return offset + (-offset % alignment)
+
+def write_snapshot(
+    path: str,
+    locations: Iterable[Dict[str, Any]],
+    categories: List[Dict[str, Any]],
+    subscription_plans: List[Dict[str, Any]],
+) -> str:
+    """
+    Write a catalogue snapshot and atomically replace the file at `path`.
+
+    Location rows are stored as JSON one after another, sorted by ID, with
+    ID, coordinate, premium and offset columns after them so readers can
+    find and filter rows without parsing any JSON. The file is written
+    next to `path` and renamed over it, so readers only ever see complete
+    snapshots.
+
+    Returns the version of the snapshot (a hash of its rows).
+    """
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+
+    rows = sorted(locations, key=lambda location: location["id"])
+    digest = hashlib.sha256()
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+
+    try:
+        with open(temp, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+
+            # Row data, remembering where each row starts
+            data_offset = f.tell()
+            for index, location in enumerate(rows):
+                encoded = json.dumps(location, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+                digest.update(encoded)
+                f.write(encoded)
+                offsets[index + 1] = offsets[index] + len(encoded)
+
+            version = digest.hexdigest()[:16]
+            meta = json.dumps({
+                "version": version,
+                "categories": categories,
+                "subscription_plans": subscription_plans,
+            }, ensure_ascii=False, default=str).encode("utf-8")
+            meta_offset = f.tell()
+            f.write(meta)
+
+            # Fixed-width columns, 8-byte aligned for zero-copy reads
+            arrays_offset = _align(f.tell())
+            f.write(b"\0" * (arrays_offset - f.tell()))
+            f.write(np.fromiter((location["id"] for location in rows), dtype=np.int64, count=len(rows)).tobytes())
+            f.write(np.fromiter((location["latitude"] for location in rows), dtype=np.float64, count=len(rows)).tobytes())
+            f.write(np.fromiter((location["longitude"] for location in rows), dtype=np.float64, count=len(rows)).tobytes())
+            f.write(offsets.tobytes())
+            f.write(np.fromiter((bool(location.get("premium_only")) for location in rows), dtype=np.bool_, count=len(rows)).tobytes())
+
+            f.seek(0)
+            f.write(_HEADER.pack(
+                MAGIC, FORMAT_VERSION, time.time(), len(rows),
+                meta_offset, len(meta), data_offset, arrays_offset,
+            ))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp, target)
+    finally:
+        if temp.exists():
+            temp.unlink()
+
+    return version
+
+class CatalogueSnapshot:
+    """
+    Read-only, memory-mapped view of a catalogue snapshot file.
+
+    Opening is instant whatever the catalogue size: the column arrays are
+    numpy views over the mapped file and a location's JSON is only parsed
+    when that location is read. Pages are shared between every worker that
+    maps the same file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, format_version, self.created_at, count,
+         meta_offset, meta_length, self._data_offset, arrays_offset) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot file: {path}")
+
+        meta = json.loads(self._mmap[meta_offset:meta_offset + meta_length])
+        self.path = path
+        self.version: str = meta["version"]
+        self.categories: List[Dict[str, Any]] = meta["categories"]
+        self.subscription_plans: List[Dict[str, Any]] = meta["subscription_plans"]
+
+        offset = arrays_offset
+        self.ids = np.frombuffer(self._mmap, dtype=np.int64, count=count, offset=offset)
+        offset += self.ids.nbytes
+        self.lats = np.frombuffer(self._mmap, dtype=np.float64, count=count, offset=offset)
+        offset += self.lats.nbytes
+        self.lngs = np.frombuffer(self._mmap, dtype=np.float64, count=count, offset=offset)
+        offset += self.lngs.nbytes
+        self._offsets = np.frombuffer(self._mmap, dtype=np.int64, count=count + 1, offset=offset)
+        offset += self._offsets.nbytes
+        self.premium = np.frombuffer(self._mmap, dtype=np.bool_, count=count, offset=offset)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was written."""
+        return time.time() - self.created_at
+
+    def _row(self, index: int) -> Dict[str, Any]:
+        start = self._data_offset + int(self._offsets[index])
+        end = self._data_offset + int(self._offsets[index + 1])
+        return json.loads(self._mmap[start:end])
+
+    def location(self, location_id: int) -> Optional[Dict[str, Any]]:
+        """Get one location by ID, or None."""
+        index = int(np.searchsorted(self.ids, location_id))
+        if index < len(self.ids) and self.ids[index] == location_id:
+            return self._row(index)
+        return None
+
+    def locations(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over every location, ordered by ID."""
+        for index in range(len(self.ids)):
+            yield self._row(index)
+
+def open_snapshot(path: str) -> Optional[CatalogueSnapshot]:
+    """Open a snapshot file, or return None if it is missing or unreadable."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snapshot = CatalogueSnapshot(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.error(f"Error opening catalogue snapshot {path}: {str(e)}")
+        return None
+
+    logger.info(f"Opened catalogue snapshot {snapshot.version} with {len(snapshot)} locations")
+    return snapshot
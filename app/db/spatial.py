@@ -0,0 +1,122 @@
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+import math
+
+# A bounding box is (min_lng, min_lat, max_lng, max_lat), the same order
+# Leaflet's `map.getBounds().toBBoxString()` produces.
+BBox = Tuple[float, float, float, float]
+
+def parse_bbox(value: str) -> BBox:
+    """
+    Parse a `minLng,minLat,maxLng,maxLat` string into a bounding box.
+
+    Raises ValueError if the string is malformed or out of range.
+    """
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in parts)
+
+    # Leaflet reports longitudes past the antimeridian when zoomed out far
+    # enough to see the world wrap, so clamp rather than reject them.
+    min_lng = max(min_lng, -180.0)
+    max_lng = min(max_lng, 180.0)
+
+    if not (-90.0 <= min_lat <= max_lat <= 90.0):
+        raise ValueError("bbox latitudes must be between -90 and 90 with minLat <= maxLat")
+    if min_lng > max_lng:
+        raise ValueError("bbox minLng must not be greater than maxLng")
+
+    return (min_lng, min_lat, max_lng, max_lat)
+
+class SpatialIndex:
+    """
+    Uniform grid index over point coordinates.
+
+    Points are bucketed into square cells of `cell_size` degrees, so a
+    viewport query only visits the cells it overlaps instead of every point.
+    Inserts, moves and removals are O(1), which keeps the index cheap to
+    maintain on every location write.
+    """
+
+    def __init__(self, cell_size: float = 0.01):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = cell_size
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, item_id: Hashable) -> bool:
+        return item_id in self._points
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return (math.floor(lng / self.cell_size), math.floor(lat / self.cell_size))
+
+    def insert(self, item_id: Hashable, lng: float, lat: float) -> None:
+        """Add a point, or move it if the ID is already indexed."""
+        if item_id in self._points:
+            self.remove(item_id)
+
+        self._points[item_id] = (lng, lat)
+        self._cells.setdefault(self._cell(lng, lat), set()).add(item_id)
+
+    def remove(self, item_id: Hashable) -> bool:
+        """Remove a point. Returns False if the ID was not indexed."""
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return False
+
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(item_id)
+            if not bucket:
+                del self._cells[cell]
+        return True
+
+    def clear(self) -> None:
+        """Remove every point from the index."""
+        self._points.clear()
+        self._cells.clear()
+
+    def bulk_load(self, points: Iterable[Tuple[Hashable, float, float]]) -> None:
+        """Replace the index contents with `(id, lng, lat)` tuples."""
+        self.clear()
+        for item_id, lng, lat in points:
+            self.insert(item_id, lng, lat)
+
+    def query(self, bbox: BBox) -> List[Hashable]:
+        """Return the IDs of all points inside the bounding box, inclusive."""
+        min_lng, min_lat, max_lng, max_lat = bbox
+        min_cx, min_cy = self._cell(min_lng, min_lat)
+        max_cx, max_cy = self._cell(max_lng, max_lat)
+
+        # Zoomed far out the box spans more cells than there are points,
+        # so a straight scan is cheaper than walking empty cells.
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(self._cells):
+            return [
+                item_id for item_id, (lng, lat) in self._points.items()
+                if min_lng <= lng <= max_lng and min_lat <= lat <= max_lat
+            ]
+
+        results: List[Hashable] = []
+        for cx in range(min_cx, max_cx + 1):
+            edge_x = cx == min_cx or cx == max_cx
+            for cy in range(min_cy, max_cy + 1):
+                bucket = self._cells.get((cx, cy))
+                if not bucket:
+                    continue
+
+                # Interior cells are fully covered; only edge cells need a
+                # per-point containment check.
+                if edge_x or cy == min_cy or cy == max_cy:
+                    for item_id in bucket:
+                        lng, lat = self._points[item_id]
+                        if min_lng <= lng <= max_lng and min_lat <= lat <= max_lat:
+                            results.append(item_id)
+                else:
+                    results.extend(bucket)
+        return results
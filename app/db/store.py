@@ -0,0 +1,423 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import json
+import sys
+import numpy as np
+
+from app.db.geo import haversine_distances
+
+# Free-text columns, kept as plain strings in Python lists
+TEXT_FIELDS = ("name", "description", "address", "instagram", "phone", "website", "created_at", "updated_at")
+
+# Columns with few distinct values, stored as codes into a shared table
+INTERNED_FIELDS = ("category_id", "typical_spending", "operating_hours")
+
+# Every column a location row is stored in; other keys go to `extras`
+STORED_FIELDS = ("id", "latitude", "longitude", "premium_only", "images", *TEXT_FIELDS, *INTERNED_FIELDS)
+_STORED_FIELD_SET = frozenset(STORED_FIELDS)
+
+class StringTable:
+    """Interns hashable values as small integer codes."""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: Any, key: Optional[Hashable] = None) -> int:
+        """Get the code of a value, adding it to the table if it's new."""
+        key = value if key is None else key
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Hashable) -> int:
+        """Get the code of a value, or -1 if it isn't in the table."""
+        return self._codes.get(value, -1)
+
+    def clear(self) -> None:
+        self.values.clear()
+        self._codes.clear()
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _hours_key(hours: Dict[str, Any]) -> Hashable:
+    # Opening hours are usually flat {day: "hh:mm - hh:mm"} dicts. Nested
+    # values (lists, dicts) make the tuple unhashable, so hash it here,
+    # where the TypeError can still be caught.
+    try:
+        key = tuple(sorted(hours.items()))
+        hash(key)
+        return key
+    except TypeError:
+        return json.dumps(hours, sort_keys=True)
+
+def _extras(location: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    keys = location.keys() - _STORED_FIELD_SET
+    return {key: location[key] for key in keys} if keys else None
+
+class LocationView:
+    """
+    Read-only view of one stored location.
+
+    Supports `view["field"]` and `view.get("field")` like the row dicts it
+    replaces. A view is only valid until its location is removed, so keep
+    views short-lived and call `to_dict()` to hold on to a row.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "LocationStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field: str) -> Any:
+        value = self._store.value(self._row, field, KeyError)
+        if value is KeyError:
+            raise KeyError(field)
+        return value
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = self._store.value(self._row, field, KeyError)
+        return default if value is KeyError else value
+
+    @property
+    def id(self) -> int:
+        return int(self._store.ids[self._row])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._store.to_dict(self._row)
+
+class LocationStore:
+    """
+    Columnar in-memory store for the location catalogue.
+
+    Coordinates, category codes and the premium flag live in numpy arrays
+    so filters and distance queries run vectorized over every location.
+    Repeated strings (categories, price ranges, opening hours) are stored
+    once in string tables, and free text in plain string lists. Rows are
+    only turned into dicts, with `to_dict`, when they are about to be
+    serialized.
+
+    Removed rows leave a hole that the next insert reuses.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._id_rows: Dict[int, int] = {}
+        self._free_rows: List[int] = []
+        self._size = 0
+
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.lats = np.zeros(capacity, dtype=np.float64)
+        self.lngs = np.zeros(capacity, dtype=np.float64)
+        self.premium = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.interned = {field: np.full(capacity, -1, dtype=np.int32) for field in INTERNED_FIELDS}
+        self.tables = {field: StringTable() for field in INTERNED_FIELDS}
+
+        self.text: Dict[str, List[Optional[str]]] = {field: [] for field in TEXT_FIELDS}
+        self.images: List[Optional[Tuple[str, ...]]] = []
+        # Columns the store doesn't know about, per row (usually None)
+        self.extras: List[Optional[Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self._id_rows)
+
+    def __contains__(self, location_id: int) -> bool:
+        return location_id in self._id_rows
+
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+
+    def _grow(self, needed: int = 1) -> None:
+        capacity = max(self.capacity, 1)
+        while capacity < self._size + needed:
+            capacity *= 2
+        for name in ("ids", "lats", "lngs", "premium", "alive"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+        for field, column in self.interned.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:len(column)] = column
+            self.interned[field] = grown
+
+    def _allocate(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._size == self.capacity:
+            self._grow()
+        row = self._size
+        self._size += 1
+        for column in self.text.values():
+            column.append(None)
+        self.images.append(None)
+        self.extras.append(None)
+        return row
+
+    def put(self, location: Dict[str, Any]) -> None:
+        """Insert a location row, replacing any stored row with the same ID."""
+        location_id = int(location["id"])
+        row = self._id_rows.get(location_id)
+        if row is None:
+            row = self._allocate()
+            self._id_rows[location_id] = row
+
+        self.ids[row] = location_id
+        self.lats[row] = float(location["latitude"])
+        self.lngs[row] = float(location["longitude"])
+        self.premium[row] = bool(location.get("premium_only"))
+        self.alive[row] = True
+
+        for field in TEXT_FIELDS:
+            self.text[field][row] = location.get(field)
+        for field in INTERNED_FIELDS:
+            self.interned[field][row] = self._code(field, location.get(field))
+        self.images[row] = self._images(location.get("images"))
+        self.extras[row] = _extras(location)
+
+    def _code(self, field: str, value: Any) -> int:
+        if value is None:
+            return -1
+        if field == "operating_hours":
+            return self.tables[field].code(value, _hours_key(value))
+        return self.tables[field].code(value)
+
+    @staticmethod
+    def _images(images: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+        return None if images is None else tuple(_intern(image) for image in images)
+
+    def bulk_load(self, locations: Iterable[Dict[str, Any]]) -> None:
+        """
+        Insert many location rows.
+
+        New rows are appended a column at a time, which is several times
+        faster than inserting them one by one; rows already stored are
+        replaced with `put`.
+        """
+        rows = []
+        for location in locations:
+            if int(location["id"]) in self._id_rows:
+                self.put(location)
+            else:
+                rows.append(location)
+
+        # Duplicate IDs within the batch: the last row wins, as with put
+        unique = {int(location["id"]): location for location in rows}
+        rows = list(unique.values())
+        count = len(rows)
+        if not count:
+            return
+
+        if self._size + count > self.capacity:
+            self._grow(count)
+        start, end = self._size, self._size + count
+        self._size = end
+
+        self.ids[start:end] = np.fromiter(unique.keys(), dtype=np.int64, count=count)
+        self.lats[start:end] = np.fromiter((float(loc["latitude"]) for loc in rows), dtype=np.float64, count=count)
+        self.lngs[start:end] = np.fromiter((float(loc["longitude"]) for loc in rows), dtype=np.float64, count=count)
+        self.premium[start:end] = np.fromiter((bool(loc.get("premium_only")) for loc in rows), dtype=bool, count=count)
+        self.alive[start:end] = True
+
+        for field in TEXT_FIELDS:
+            self.text[field].extend([loc.get(field) for loc in rows])
+        for field in INTERNED_FIELDS:
+            code = self._code
+            self.interned[field][start:end] = np.fromiter(
+                (code(field, loc.get(field)) for loc in rows), dtype=np.int32, count=count
+            )
+        self.images.extend([self._images(loc.get("images")) for loc in rows])
+        self.extras.extend([_extras(loc) for loc in rows])
+
+        self._id_rows.update(zip(unique.keys(), range(start, end)))
+
+    def remove(self, location_id: int) -> bool:
+        """Remove a location. Returns False if it wasn't stored."""
+        row = self._id_rows.pop(location_id, None)
+        if row is None:
+            return False
+
+        self.alive[row] = False
+        for column in self.text.values():
+            column[row] = None
+        self.images[row] = None
+        self.extras[row] = None
+        self._free_rows.append(row)
+        return True
+
+    def clear(self) -> None:
+        """Remove every location, keeping the allocated capacity."""
+        self._id_rows.clear()
+        self._free_rows.clear()
+        self._size = 0
+        self.alive[:] = False
+        for table in self.tables.values():
+            table.clear()
+        for column in self.text.values():
+            column.clear()
+        self.images.clear()
+        self.extras.clear()
+
+    def get(self, location_id: int) -> Optional[LocationView]:
+        """Get a view of a location, or None."""
+        row = self._id_rows.get(location_id)
+        return None if row is None else LocationView(self, row)
+
+    def value(self, row: int, field: str, default: Any = None) -> Any:
+        """Read one field of a row as a plain Python value."""
+        if field == "id":
+            return int(self.ids[row])
+        if field == "latitude":
+            return float(self.lats[row])
+        if field == "longitude":
+            return float(self.lngs[row])
+        if field == "premium_only":
+            return bool(self.premium[row])
+        if field in self.text:
+            return self.text[field][row]
+        if field in self.interned:
+            code = self.interned[field][row]
+            if code < 0:
+                return None
+            value = self.tables[field].values[code]
+            # Opening hours are shared between rows, so hand out copies
+            return dict(value) if field == "operating_hours" else value
+        if field == "images":
+            images = self.images[row]
+            return None if images is None else list(images)
+
+        extras = self.extras[row]
+        if extras is not None and field in extras:
+            return extras[field]
+        return default
+
+    def to_dict(self, row: int) -> Dict[str, Any]:
+        """Materialize a row as the dict the API serializes."""
+        location = {field: self.value(row, field) for field in STORED_FIELDS}
+        extras = self.extras[row]
+        if extras:
+            location.update(extras)
+        return location
+
+    def get_dict(self, location_id: int) -> Optional[Dict[str, Any]]:
+        """Materialize a location by ID, or None."""
+        row = self._id_rows.get(location_id)
+        return None if row is None else self.to_dict(row)
+
+    def rows(self, location_ids: Iterable[int]) -> np.ndarray:
+        """Row numbers of stored locations, in the order given (unknown IDs are skipped)."""
+        id_rows = self._id_rows
+        return np.fromiter(
+            (id_rows[location_id] for location_id in location_ids if location_id in id_rows),
+            dtype=np.int64,
+        )
+
+    def mask(
+        self,
+        category_id: Optional[str] = None,
+        premium_only: Optional[bool] = None,
+        categories: Optional[Iterable[str]] = None,
+        hours_codes: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Boolean mask over rows of the live locations matching the filters.
+
+        Args:
+            category_id: Only this category
+            premium_only: Only premium (True) or non-premium (False) locations
+            categories: Only these categories
+            hours_codes: Only locations whose operating_hours have one of
+                these codes (see `OpeningHoursIndex`)
+        """
+        mask = self.alive.copy()
+        codes = self.interned["category_id"]
+        if category_id:
+            mask &= codes == self.tables["category_id"].lookup(category_id)
+        if categories is not None:
+            allowed = [self.tables["category_id"].lookup(category) for category in categories]
+            mask &= np.isin(codes, [code for code in allowed if code >= 0])
+        if premium_only is not None:
+            mask &= self.premium == premium_only
+        if hours_codes is not None:
+            mask &= np.isin(self.interned["operating_hours"], hours_codes)
+        return mask
+
+    def filter_ids(
+        self,
+        location_ids: Iterable[int],
+        category_id: Optional[str] = None,
+        premium_only: Optional[bool] = None,
+        categories: Optional[Iterable[str]] = None,
+        hours_codes: Optional[np.ndarray] = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[int]:
+        """
+        Keep the IDs whose locations match the filters, preserving order.
+
+        Callers filtering several batches against the same filters can pass
+        the `mask()` of those filters instead, so it is only built once.
+        """
+        rows = self.rows(location_ids)
+        if mask is None and (category_id or premium_only is not None or categories is not None or hours_codes is not None):
+            mask = self.mask(category_id, premium_only, categories, hours_codes)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return self.ids[rows].tolist()
+
+    def sorted_ids(
+        self,
+        category_id: Optional[str] = None,
+        premium_only: Optional[bool] = None,
+        hours_codes: Optional[np.ndarray] = None,
+    ) -> List[int]:
+        """IDs of every live location matching the filters, in ascending order."""
+        return np.sort(self.ids[self.mask(category_id, premium_only, hours_codes=hours_codes)]).tolist()
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        limit: int,
+        radius: Optional[float] = None,
+        category_id: Optional[str] = None,
+        premium_only: Optional[bool] = None,
+        hours_codes: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Return up to `limit` `(id, distance_meters)` pairs sorted by distance.
+
+        If `radius` is given only points within that many meters are returned.
+        Category, premium and opening-hours filters are applied before the
+        limit.
+        """
+        if not self._id_rows or limit <= 0:
+            return []
+
+        lats = self.lats[:self._size]
+        lngs = self.lngs[:self._size]
+        distances = haversine_distances(lat, lng, lats, lngs)
+
+        mask = self.mask(category_id, premium_only, hours_codes=hours_codes)[:self._size]
+        if radius is not None:
+            mask &= distances <= radius
+        candidates = np.flatnonzero(mask)
+
+        # Partial selection keeps k-NN O(n) instead of sorting every distance
+        if len(candidates) > limit:
+            nearest = np.argpartition(distances[candidates], limit - 1)[:limit]
+            candidates = candidates[nearest]
+
+        ordered = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(int(self.ids[row]), float(distances[row])) for row in ordered]
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the numeric columns and code arrays."""
+        arrays = [self.ids, self.lats, self.lngs, self.premium, self.alive, *self.interned.values()]
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+
+from app.db.clustering import project_mercator
+from app.db.spatial import BBox
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Entitlement tiers tiles are generated for
+TILE_TIERS = ("free", "premium")
+
+TileKey = Tuple[str, int, int, int]
+
+def tile_bounds(z: int, x: int, y: int) -> BBox:
+    """Return the (min_lng, min_lat, max_lng, max_lat) covered by a slippy-map tile."""
+    n = 1 << z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+def tiles_for_point(lng: float, lat: float, max_zoom: int) -> List[Tuple[int, int, int]]:
+    """Return the `(z, x, y)` of the tile containing a point at every zoom up to `max_zoom`."""
+    px, py = project_mercator(lng, lat)
+    tiles = []
+    for z in range(max_zoom + 1):
+        n = 1 << z
+        tiles.append((z, min(int(px * n), n - 1), min(int(py * n), n - 1)))
+    return tiles
+
+def encode_tile(locations: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Encode locations as a compact GeoJSON FeatureCollection.
+
+    Only the fields needed to draw and identify a marker are included; the
+    full record is fetched from `/api/locations/{id}` when a marker is opened.
+    """
+    features = [
+        {
+            "type": "Feature",
+            "id": loc["id"],
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(loc["longitude"], 6), round(loc["latitude"], 6)],
+            },
+            "properties": {
+                "name": loc["name"],
+                "category_id": loc["category_id"],
+                "premium_only": bool(loc.get("premium_only")),
+            },
+        }
+        for loc in locations
+    ]
+    return json.dumps(
+        {"type": "FeatureCollection", "features": features},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+class TileCache:
+    """
+    Two-level cache of encoded tiles keyed by entitlement tier and tile.
+
+    A bounded in-memory LRU sits in front of an optional on-disk cache laid
+    out as `<directory>/<tier>/<z>/<x>/<y>.json`, which is shared by workers
+    on the same host. Tiles older than `max_age` seconds (0 for no limit) are
+    rebuilt, so a change made through another worker, which only drops that
+    worker's copies, shows up within `max_age`.
+
+    Disk reads, writes and removals never run on the event loop. They are
+    queued to a single thread and run in order, so a tile written before an
+    invalidation is always removed by it, and a read never finds a file an
+    earlier invalidation hasn't removed yet.
+    """
+
+    def __init__(self, max_size: int = 2048, directory: Optional[str] = None, max_age: float = 0):
+        self.max_size = max_size
+        self.directory = Path(directory) if directory else None
+        self.max_age = max_age
+        # Bumped by every invalidation, so a disk read that was in flight
+        # meanwhile isn't kept
+        self.generation = 0
+        # key -> (time stored, tile)
+        self._tiles: "OrderedDict[TileKey, Tuple[float, bytes]]" = OrderedDict()
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiles") if self.directory else None
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def _path(self, key: TileKey) -> Path:
+        tier, z, x, y = key
+        return self.directory / tier / str(z) / str(x) / f"{y}.json"
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.max_age) and time.time() - stored_at > self.max_age
+
+    async def get(self, key: TileKey) -> Optional[bytes]:
+        """Return a cached tile, promoting disk hits into memory."""
+        entry = self._tiles.get(key)
+        if entry is not None:
+            if not self._expired(entry[0]):
+                self._tiles.move_to_end(key)
+                return entry[1]
+            del self._tiles[key]
+
+        if self._disk is None:
+            return None
+
+        generation = self.generation
+        entry = await asyncio.wrap_future(self._disk.submit(self._read, key))
+        if entry is None or generation != self.generation:
+            return None
+
+        stored_at, tile = entry
+        self._remember(key, tile, stored_at)
+        return tile
+
+    def put(self, key: TileKey, tile: bytes) -> None:
+        """Store a tile in memory, and queue writing it to disk."""
+        self._remember(key, tile, time.time())
+        if self._disk is not None:
+            self._disk.submit(self._write, key, tile)
+
+    def _remember(self, key: TileKey, tile: bytes, stored_at: float) -> None:
+        self._tiles[key] = (stored_at, tile)
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_size:
+            self._tiles.popitem(last=False)
+
+    def invalidate(self, tiles: Iterable[Tuple[int, int, int]]) -> None:
+        """Drop the given `(z, x, y)` tiles for every tier."""
+        keys = [(tier, z, x, y) for z, x, y in tiles for tier in TILE_TIERS]
+        for key in keys:
+            self._tiles.pop(key, None)
+        self.generation += 1
+        if self._disk is not None:
+            self._disk.submit(self._remove, keys)
+
+    def clear(self) -> None:
+        """Drop every cached tile, in memory and on disk."""
+        self._tiles.clear()
+        self.generation += 1
+        if self._disk is not None:
+            self._disk.submit(self._remove_all)
+
+    # The methods below run on the disk thread
+
+    def _read(self, key: TileKey) -> Optional[Tuple[float, bytes]]:
+        path = self._path(key)
+        try:
+            stored_at = path.stat().st_mtime
+            if self._expired(stored_at):
+                return None
+            return stored_at, path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading cached tile {key}: {str(e)}")
+            return None
+
+    def _write(self, key: TileKey, tile: bytes) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial tile
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(tile)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing cached tile {key}: {str(e)}")
+
+    def _remove(self, keys: List[TileKey]) -> None:
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing cached tile {key}: {str(e)}")
+
+    def _remove_all(self) -> None:
+        for tier in TILE_TIERS:
+            try:
+                shutil.rmtree(self.directory / tier)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error clearing cached {tier} tiles: {str(e)}")
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from datetime import datetime, timezone, tzinfo
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import time
+
+# Rollup periods of the view counters, and how long a bucket of each lasts
+PERIODS = ("hour", "day")
+
+def bucket_start(timestamp: float, period: str, tz: tzinfo) -> float:
+    """
+    Start of the minute, hour or day a timestamp falls in.
+
+    Days start at midnight in `tz`, so daily counts line up with the
+    locations' own calendar days.
+    """
+    if period == "minute":
+        return timestamp - timestamp % 60
+    if period == "hour":
+        return timestamp - timestamp % 3600
+    local = datetime.fromtimestamp(timestamp, tz)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+def aggregate_views(events: Iterable[Dict[str, Any]], tz: tzinfo) -> List[Dict[str, Any]]:
+    """
+    Sum view events into per-location hourly and daily count increments.
+
+    Events carry `location_id` and an ISO `viewed_at`. Returns rows of
+    `location_id`, `period`, `bucket` (ISO timestamp) and `views`.
+    """
+    totals: Dict[Tuple[int, str, float], int] = {}
+    for event in events:
+        timestamp = datetime.fromisoformat(event["viewed_at"]).timestamp()
+        for period in PERIODS:
+            key = (event["location_id"], period, bucket_start(timestamp, period, tz))
+            totals[key] = totals.get(key, 0) + 1
+    return [
+        {
+            "location_id": location_id,
+            "period": period,
+            "bucket": datetime.fromtimestamp(bucket, timezone.utc).isoformat(),
+            "views": views,
+        }
+        for (location_id, period, bucket), views in totals.items()
+    ]
+
+class ViewRecorder:
+    """
+    Filters repeated location views and counts views per location.
+
+    A viewer (a user ID, or the client address of an anonymous visitor)
+    viewing the same location again within `window` seconds of the first
+    view is not counted again, so reloads and a page plus its API call
+    count once. Viewers are remembered in insertion order, which is also
+    time order, so expired entries are dropped from the front in amortized
+    constant time; at most `max_viewers` pairs are kept.
+
+    Views are also counted per location by hour and by day, for the last
+    `hours` hours and `days` days, so this process can answer recent counts
+    without querying the database.
+    """
+
+    def __init__(
+        self,
+        window: float = 1800,
+        max_viewers: int = 100000,
+        hours: int = 48,
+        days: int = 30,
+        tz: tzinfo = timezone.utc,
+    ):
+        self.window = window
+        self.max_viewers = max_viewers
+        self.retention = {"hour": hours * 3600, "day": days * 86400}
+        self.tz = tz
+        self.recorded = 0
+        self.repeats = 0
+        self._seen: "OrderedDict[Tuple[Hashable, int], float]" = OrderedDict()
+        # Per period: location ID -> {bucket start: views}
+        self._counts: Dict[str, Dict[int, Dict[float, int]]] = {period: {} for period in PERIODS}
+        self._current_hour = 0.0
+
+    def record(self, location_id: int, viewer: Hashable, now: Optional[float] = None) -> bool:
+        """
+        Count a view unless the viewer saw the location within the window.
+
+        Returns True if the view was counted.
+        """
+        now = time.time() if now is None else now
+        seen = self._seen
+        while seen:
+            if now - next(iter(seen.values())) < self.window:
+                break
+            seen.popitem(last=False)
+
+        key = (viewer, location_id)
+        if key in seen:
+            self.repeats += 1
+            return False
+        seen[key] = now
+        if len(seen) > self.max_viewers:
+            seen.popitem(last=False)
+
+        hour = bucket_start(now, "hour", self.tz)
+        if hour != self._current_hour:
+            self._current_hour = hour
+            self._prune(now)
+        for period in PERIODS:
+            buckets = self._counts[period].setdefault(location_id, {})
+            bucket = hour if period == "hour" else bucket_start(now, period, self.tz)
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+
+        self.recorded += 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets older than the retention, once per hour."""
+        for period, locations in self._counts.items():
+            oldest = now - self.retention[period]
+            for location_id in list(locations):
+                buckets = locations[location_id]
+                for bucket in [bucket for bucket in buckets if bucket < oldest]:
+                    del buckets[bucket]
+                if not buckets:
+                    del locations[location_id]
+
+    def counts(self, location_id: int, period: str, limit: int) -> List[Dict[str, Any]]:
+        """A location's most recent view counts, newest bucket first."""
+        buckets = self._counts[period].get(location_id, {})
+        return [
+            {"bucket": datetime.fromtimestamp(bucket, timezone.utc).isoformat(), "views": buckets[bucket]}
+            for bucket in sorted(buckets, reverse=True)[:limit]
+        ]
+
+    def forget(self, location_id: int) -> None:
+        """Drop the counts of a deleted location."""
+        for locations in self._counts.values():
+            locations.pop(location_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recorded": self.recorded, "repeats": self.repeats, "viewers": len(self._seen)}
@@ -2,15 +2,16 @@ import os
 from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
+from app.core import metrics
 from app.core.config import settings
-from app.api.routes import api_router
-from app.core.auth import get_current_user
-from app.db import client
+from app.api.routes import api_router, response_cache
+from app.core.auth import get_current_user, get_entitlement, load_signing_keys, verified_tokens
+from app.db import client, executor
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +23,9 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Record request latency and status for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory=Path(__file__).parent / "static"), name="static")
 
@@ -31,8 +35,69 @@ templates = Jinja2Templates(directory=Path(__file__).parent / "templates")
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
+# Rows per page on the admin pages
+ADMIN_PAGE_SIZE = 100
+
+@app.on_event("startup")
+async def startup():
+    """Load the JWT signing keys, start background writers and open the catalogue snapshot before serving requests."""
+    await executor.run_sync(load_signing_keys)
+    await client.login_activity_writer.start()
+    await client.location_view_writer.start()
+    await client.start_catalogue_snapshots()
+    await client.start_location_rankings()
+    metrics.start_event_loop_monitor(settings.METRICS_LOOP_INTERVAL)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush background writers and release the Supabase worker threads."""
+    await metrics.stop_event_loop_monitor()
+    await client.stop_catalogue_snapshots()
+    await client.stop_location_rankings()
+    await client.login_activity_writer.stop()
+    await client.location_view_writer.stop()
+    executor.shutdown()
+
+def _cache_stats() -> List[Dict[str, Any]]:
+    return client.get_cache_stats() + [response_cache.stats()]
+
+def _cache_metric(field: str) -> Dict[tuple, float]:
+    return {(stats["name"],): stats[field] for stats in _cache_stats()}
+
+metrics.registry.register(metrics.CallbackMetric(
+    "cache_hits_total", "Cache hits by cache.", ("cache",), lambda: _cache_metric("hits"), "counter",
+))
+metrics.registry.register(metrics.CallbackMetric(
+    "cache_misses_total", "Cache misses by cache.", ("cache",), lambda: _cache_metric("misses"), "counter",
+))
+metrics.registry.register(metrics.CallbackMetric(
+    "cache_hit_ratio", "Share of cache lookups that were hits.", ("cache",), lambda: _cache_metric("hit_ratio"),
+))
+metrics.registry.register(metrics.CallbackMetric(
+    "location_views_total", "Location views by outcome (counted, or repeat within the dedup window).", ("outcome",),
+    lambda: {("counted",): client.location_views.recorded, ("repeat",): client.location_views.repeats}, "counter",
+))
+metrics.registry.register(metrics.CallbackMetric(
+    "location_ranking_scored", "Locations with a popularity score, by ranking.", ("ranking",),
+    lambda: {(name,): len(ranking) for name, ranking in client.location_rankings.items()},
+))
+metrics.registry.register(metrics.CallbackMetric(
+    "cache_entries", "Entries currently held by each cache.", ("cache",), lambda: _cache_metric("size"),
+))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Expose metrics in the Prometheus text format."""
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+        )
+    
+    return Response(content=metrics.registry.expose(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, user=Depends(get_current_user)):
+async def home(request: Request, user=Depends(get_current_user), entitlement=Depends(get_entitlement)):
     """Render the home page with the map."""
     return templates.TemplateResponse(
         "index.html",
@@ -43,6 +108,7 @@ async def home(request: Request, user=Depends(get_current_user)):
             "default_lng": settings.DEFAULT_LNG,
             "default_zoom": settings.DEFAULT_ZOOM,
             "user": user,
+            "entitlement": entitlement,
         },
     )
 
@@ -69,6 +135,9 @@ async def location_detail(request: Request, location_id: int, user=Depends(get_c
     """Render the location detail page."""
     # In a real app, we would fetch the location from the database
     # and check if the user has access to it based on their subscription
+    if await client.get_location(location_id):
+        # The page's own API call for the location is a repeat view
+        client.record_location_view(location_id, user["id"] if user else None, request.client.host if request.client else None)
     return templates.TemplateResponse(
         "location_detail.html", 
         {"request": request, "location_id": location_id, "user": user}
@@ -82,9 +151,17 @@ async def admin_dashboard(request: Request, user=Depends(get_current_user)):
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     
+    # Login counts for the last day and today's top IPs and user agents,
+    # read from the rollups rather than the activities
+    login_stats = await client.get_login_stats("hour", 24, 5)
+    login_totals: Dict[str, int] = {}
+    for bucket in login_stats["counts"]:
+        for login_status, logins in bucket["by_status"].items():
+            login_totals[login_status] = login_totals.get(login_status, 0) + logins
+    
     return templates.TemplateResponse(
         "admin/dashboard.html", 
-        {"request": request, "user": user}
+        {"request": request, "user": user, "login_stats": login_stats, "login_totals": login_totals}
     )
 
 @app.get("/admin/users", response_class=HTMLResponse)
@@ -107,40 +184,71 @@ async def admin_users(request: Request, user=Depends(get_current_user)):
     )
 
 @app.get("/admin/locations", response_class=HTMLResponse)
-async def admin_locations(request: Request, user=Depends(get_current_user)):
+async def admin_locations(request: Request, cursor: Optional[str] = None, user=Depends(get_current_user)):
     """Render the admin locations page."""
     # For development, let's consider any logged-in user as admin
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     
-    # Get locations from the database
-    locations = await client.get_locations()
+    # Get a page of locations from the database
+    try:
+        locations = await client.get_locations(limit=ADMIN_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        return RedirectResponse(url="/admin/locations", status_code=status.HTTP_303_SEE_OTHER)
     categories = await client.get_categories()
     
+    next_cursor = None
+    if len(locations) == ADMIN_PAGE_SIZE:
+        next_cursor = client.location_cursor(locations[-1])
+    
     return templates.TemplateResponse(
         "admin/locations.html", 
-        {"request": request, "user": user, "locations": locations, "categories": categories}
+        {
+            "request": request,
+            "user": user,
+            "locations": locations,
+            "categories": categories,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+        }
     )
 
 @app.get("/admin/login-activities", response_class=HTMLResponse)
-async def admin_login_activities(request: Request, user=Depends(get_current_user)):
+async def admin_login_activities(request: Request, cursor: Optional[str] = None, user=Depends(get_current_user)):
     """Render the admin login activities page."""
     # For development, let's consider any logged-in user as admin
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     
-    # Get login activities from the database
-    login_activities = await client.get_login_activities(limit=100)
+    # Get a page of login activities from the database
+    try:
+        login_activities = await client.get_login_activities(limit=ADMIN_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        return RedirectResponse(url="/admin/login-activities", status_code=status.HTTP_303_SEE_OTHER)
+    
+    next_cursor = None
+    if len(login_activities) == ADMIN_PAGE_SIZE:
+        next_cursor = client.login_activity_cursor(login_activities[-1])
     
     return templates.TemplateResponse(
         "admin/login_activities.html", 
-        {"request": request, "user": user, "login_activities": login_activities}
+        {
+            "request": request,
+            "user": user,
+            "login_activities": login_activities,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+        }
     )
 
 # Add a logout route
 @app.get("/logout", response_class=HTMLResponse)
 async def logout(request: Request):
     """Log out the user and redirect to the home page."""
+    token = request.cookies.get("access_token")
+    if token:
+        verified_tokens.discard(token)
+    
     response = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(key="access_token")
     return response
@@ -0,0 +1,185 @@
+"""
+Synthetic location catalogues for benchmarks and load tests.
+
+Locations are spread over Jakarta as a mix of dense neighbourhood clusters
+and a sparser background, with the categories, price ranges, opening hours
+and images real listings have. Generation is deterministic for a seed.
+
+    python -m benchmarks.catalogue 100000 catalogue.ndjson
+
+writes a catalogue that `manage.py import-locations` can load.
+"""
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import random
+import sys
+
+from app.core.config import settings
+
+# (name, latitude, longitude, spread in degrees, weight) of the busiest areas
+NEIGHBOURHOODS: List[Tuple[str, float, float, float, float]] = [
+    ("Sudirman", -6.2146, 106.8227, 0.012, 0.16),
+    ("Senopati", -6.2297, 106.8096, 0.008, 0.12),
+    ("Kemang", -6.2607, 106.8142, 0.010, 0.12),
+    ("Menteng", -6.1957, 106.8322, 0.009, 0.09),
+    ("Kota Tua", -6.1352, 106.8133, 0.008, 0.07),
+    ("Kelapa Gading", -6.1587, 106.9055, 0.014, 0.09),
+    ("PIK", -6.1095, 106.7400, 0.015, 0.07),
+    ("Blok M", -6.2444, 106.7993, 0.006, 0.08),
+    ("Cikini", -6.1887, 106.8392, 0.006, 0.05),
+    ("Kuningan", -6.2297, 106.8310, 0.010, 0.07),
+    ("Pluit", -6.1165, 106.7900, 0.012, 0.04),
+    ("Cilandak", -6.2891, 106.7990, 0.014, 0.04),
+]
+
+# Share of locations scattered over the whole city instead of a neighbourhood
+BACKGROUND_SHARE = 0.2
+CITY_SPREAD = 0.12
+
+CATEGORIES: List[Dict[str, Any]] = [
+    {"id": "restaurants", "name": "Restaurants", "description": "Places to eat", "icon": "utensils", "premium_only": False},
+    {"id": "cafes", "name": "Cafes", "description": "Coffee shops and cafes", "icon": "coffee", "premium_only": False},
+    {"id": "sports", "name": "Sports Venues", "description": "Sports and fitness locations", "icon": "volleyball-ball", "premium_only": True},
+    {"id": "hospitals", "name": "Hospitals", "description": "Medical facilities", "icon": "hospital", "premium_only": True},
+    {"id": "shopping", "name": "Shopping", "description": "Retail stores and malls", "icon": "shopping-bag", "premium_only": True},
+]
+
+PREMIUM_CATEGORIES = {category["id"] for category in CATEGORIES if category["premium_only"]}
+
+# Relative frequency of each category
+CATEGORY_WEIGHTS = {"restaurants": 0.38, "cafes": 0.30, "shopping": 0.16, "sports": 0.10, "hospitals": 0.06}
+
+_NAME_PARTS = {
+    "restaurants": (["Warung", "Rumah Makan", "Sate", "Bakmi", "Soto", "Nasi Goreng", "Dapur", "Seafood"],
+                    ["Tekko", "Padang Sederhana", "Senayan", "Bu Rudy", "Betawi", "Pak Kumis", "Nusantara", "Mbok Berek"]),
+    "cafes": (["Kopi", "Kedai", "Toko Kopi", "Coffee", "Roastery"],
+              ["Tuku", "Kenangan", "Janji Jiwa", "Tanamera", "Anomali", "Kala", "Senja", "Ruang"]),
+    "sports": (["GOR", "Futsal", "Badminton Hall", "Fitness", "Padel Club", "Swimming Pool"],
+               ["Senayan", "Soemantri", "Rawamangun", "Bulungan", "Kuningan", "Kemayoran"]),
+    "hospitals": (["RS", "Klinik", "RSIA", "Puskesmas"],
+                  ["Pondok Indah", "Siloam", "Mitra Keluarga", "Medistra", "Premier", "Hermina"]),
+    "shopping": (["Mall", "Plaza", "Pasar", "Toko", "Square"],
+                 ["Grand Indonesia", "Senayan City", "Tanah Abang", "Blok M", "Kota Kasablanka", "Cilandak Town"]),
+}
+
+_STREETS = ["Jl. Senopati", "Jl. Kemang Raya", "Jl. Sudirman", "Jl. Thamrin", "Jl. Gatot Subroto",
+            "Jl. Panglima Polim", "Jl. Cikini Raya", "Jl. Boulevard Raya", "Jl. Pluit Raya", "Jl. Fatmawati"]
+
+_AREAS = ["Jakarta Selatan", "Jakarta Pusat", "Jakarta Utara", "Jakarta Barat", "Jakarta Timur"]
+
+_SPENDING = {
+    "restaurants": ["Rp 25,000 - Rp 50,000 per person", "Rp 50,000 - Rp 100,000 per person", "Rp 100,000 - Rp 200,000 per person", "Rp 300,000+ per person"],
+    "cafes": ["Rp 25,000 - Rp 50,000 per person", "Rp 50,000 - Rp 100,000 per person"],
+    "sports": ["Rp 50,000 per session", "Rp 150,000 per hour", "Rp 500,000 per month"],
+    "hospitals": ["Varies by treatment"],
+    "shopping": ["Varies by store", "Rp 100,000 - Rp 500,000"],
+}
+
+_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Weekly opening-hour patterns: (weekday hours, weekend hours, closed day)
+_HOURS = {
+    "restaurants": [("11:00 - 22:00", "11:00 - 23:00", None), ("10:00 - 21:00", "10:00 - 21:00", "Monday"),
+                    ("17:00 - 02:00", "17:00 - 03:00", None), ("07:00 - 15:00", "07:00 - 15:00", "Sunday")],
+    "cafes": [("07:00 - 22:00", "08:00 - 23:00", None), ("08:00 - 20:00", "09:00 - 21:00", None),
+              ("10:00 - 00:00", "10:00 - 02:00", None)],
+    "sports": [("06:00 - 22:00", "06:00 - 22:00", None), ("08:00 - 23:00", "07:00 - 23:00", None)],
+    "hospitals": [("00:00 - 24:00", "00:00 - 24:00", None), ("08:00 - 20:00", "08:00 - 14:00", "Sunday")],
+    "shopping": [("10:00 - 22:00", "10:00 - 22:00", None), ("05:00 - 17:00", "05:00 - 17:00", None)],
+}
+
+_CATEGORY_IDS = list(CATEGORY_WEIGHTS)
+_CATEGORY_CUM_WEIGHTS = list(accumulate(CATEGORY_WEIGHTS.values()))
+_NEIGHBOURHOOD_CUM_WEIGHTS = list(accumulate(n[4] for n in NEIGHBOURHOODS))
+
+def _pick_category(rng: random.Random) -> str:
+    return rng.choices(_CATEGORY_IDS, cum_weights=_CATEGORY_CUM_WEIGHTS)[0]
+
+def _coordinates(rng: random.Random, center_lat: float, center_lng: float) -> Tuple[float, float]:
+    if rng.random() < BACKGROUND_SHARE:
+        return rng.gauss(center_lat, CITY_SPREAD / 2), rng.gauss(center_lng, CITY_SPREAD)
+    _, lat, lng, spread, _ = rng.choices(NEIGHBOURHOODS, cum_weights=_NEIGHBOURHOOD_CUM_WEIGHTS)[0]
+    # Neighbourhood centres are given relative to the default map centre
+    lat += center_lat - settings.DEFAULT_LAT
+    lng += center_lng - settings.DEFAULT_LNG
+    return rng.gauss(lat, spread), rng.gauss(lng, spread)
+
+def _operating_hours(rng: random.Random, category: str) -> Dict[str, str]:
+    weekday, weekend, closed = rng.choice(_HOURS[category])
+    return {
+        day: "Closed" if day == closed else (weekend if day in ("Saturday", "Sunday") else weekday)
+        for day in _DAYS
+    }
+
+def generate_location(rng: random.Random, location_id: int, center_lat: float, center_lng: float) -> Dict[str, Any]:
+    """Generate one synthetic location row."""
+    category = _pick_category(rng)
+    prefixes, names = _NAME_PARTS[category]
+    name = f"{rng.choice(prefixes)} {rng.choice(names)}"
+    if rng.random() < 0.6:
+        name += f" {rng.choice(NEIGHBOURHOODS)[0]}"
+    latitude, longitude = _coordinates(rng, center_lat, center_lng)
+    slug = name.lower().replace(" ", "-")
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(0, 60 * 24 * 600))
+
+    return {
+        "id": location_id,
+        "name": name,
+        "description": f"{name} is a popular {category.rstrip('s')} spot in {rng.choice(_AREAS)}.",
+        "latitude": round(latitude, 6),
+        "longitude": round(longitude, 6),
+        "address": f"{rng.choice(_STREETS)} No. {rng.randint(1, 250)}, {rng.choice(_AREAS)}",
+        "instagram": slug.replace("-", "") if rng.random() < 0.7 else None,
+        "phone": f"+6221{rng.randint(1000000, 9999999)}" if rng.random() < 0.8 else None,
+        "website": f"https://{slug}.example.com" if rng.random() < 0.4 else None,
+        "category_id": category,
+        "typical_spending": rng.choice(_SPENDING[category]),
+        "operating_hours": _operating_hours(rng, category),
+        "images": [f"https://example.com/images/{slug}-{i}.jpg" for i in range(1, rng.randint(0, 4) + 1)],
+        "premium_only": rng.random() < (0.35 if category in PREMIUM_CATEGORIES else 0.1),
+        "created_at": created.isoformat(),
+        "updated_at": created.isoformat(),
+    }
+
+def generate_locations(
+    count: int,
+    seed: int = 42,
+    center_lat: Optional[float] = None,
+    center_lng: Optional[float] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate `count` synthetic locations with IDs 1..count.
+
+    Args:
+        count: Number of locations
+        seed: Random seed; the same seed always yields the same catalogue
+        center_lat: Centre of the city (defaults to settings.DEFAULT_LAT)
+        center_lng: Centre of the city (defaults to settings.DEFAULT_LNG)
+    """
+    rng = random.Random(seed)
+    center_lat = settings.DEFAULT_LAT if center_lat is None else center_lat
+    center_lng = settings.DEFAULT_LNG if center_lng is None else center_lng
+    for location_id in range(1, count + 1):
+        yield generate_location(rng, location_id, center_lat, center_lng)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic location catalogue as NDJSON")
+    parser.add_argument("count", type=int, help="Number of locations")
+    parser.add_argument("path", nargs="?", help="Output file (defaults to stdout)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    output = open(args.path, "w", encoding="utf-8") if args.path else sys.stdout
+    try:
+        for location in generate_locations(args.count, args.seed):
+            output.write(json.dumps(location, ensure_ascii=False) + "\n")
+    finally:
+        if args.path:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
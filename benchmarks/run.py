@@ -0,0 +1,333 @@
+"""
+Benchmarks of the API's hot paths against synthetic catalogues.
+
+    python -m benchmarks.run --sizes 10000 100000
+    python -m benchmarks.run --sizes 10000 --compare benchmarks/results/baseline.json
+
+Each case is timed call by call and reported as latency percentiles and
+throughput; the setup (catalogue generation, index load) is reported with
+the process's memory. Results are saved as JSON so a later run can be
+compared against them with `--compare`, which flags cases whose median
+latency regressed by more than `--threshold`.
+
+The app runs in mock mode (no Supabase credentials), with the synthetic
+catalogue standing in for the sample data, so the numbers cover the
+in-process code paths and not the network.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Benchmarks always run against the in-process stand-ins
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+
+import jwt
+from starlette.requests import Request
+
+from app.core import auth
+from app.core.config import settings
+from app.db import client
+from app.db.tiles import tiles_for_point
+from benchmarks.catalogue import CATEGORIES, generate_locations
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Inputs are drawn from this many variants per case, so caches see a
+# realistic mix instead of one repeated query
+VARIANTS = 64
+
+SEARCH_TERMS = ["kopi", "sate", "mall", "senayan", "kemang", "warung tekko", "rs pondok", "futsal"]
+
+BenchCall = Callable[[int], Any]
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def _call(func: BenchCall, variant: int) -> Any:
+    result = func(variant)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+async def measure(func: BenchCall, duration: float, min_iterations: int, max_iterations: int) -> Dict[str, Any]:
+    """Call `func` repeatedly for about `duration` seconds and summarize its latency."""
+    for variant in range(3):
+        await _call(func, variant)
+
+    timings: List[float] = []
+    iteration = 0
+    # Collections are paused so a GC pass isn't billed to one unlucky call
+    gc.collect()
+    gc.disable()
+    started = time.perf_counter()
+    try:
+        while iteration < max_iterations and (
+            iteration < min_iterations or time.perf_counter() - started < duration
+        ):
+            variant = iteration % VARIANTS
+            start = time.perf_counter()
+            await _call(func, variant)
+            timings.append(time.perf_counter() - start)
+            iteration += 1
+    finally:
+        gc.enable()
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    to_ms = 1000.0
+    return {
+        "iterations": len(timings),
+        "mean_ms": statistics.fmean(timings) * to_ms,
+        "p50_ms": _percentile(timings, 0.50) * to_ms,
+        "p90_ms": _percentile(timings, 0.90) * to_ms,
+        "p99_ms": _percentile(timings, 0.99) * to_ms,
+        "max_ms": timings[-1] * to_ms,
+        "ops_per_sec": len(timings) / elapsed if elapsed else 0.0,
+    }
+
+async def measure_allocations(func: BenchCall, iterations: int = 20) -> float:
+    """Peak memory allocated while making one call, in kilobytes (worst of `iterations`)."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for variant in range(iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await _call(func, variant % VARIANTS)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+def _admin_request() -> Request:
+    from app.main import app
+    return Request({
+        "type": "http",
+        "app": app,
+        "router": app.router,
+        "method": "GET",
+        "scheme": "http",
+        "server": ("benchmark", 80),
+        "path": "/admin/locations",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+    })
+
+def build_cases(rows: List[Dict[str, Any]], seed: int) -> Dict[str, BenchCall]:
+    """Create the benchmark cases, each a function of a variant number."""
+    from app.main import ADMIN_PAGE_SIZE, templates
+
+    rng = random.Random(seed)
+    ids = [row["id"] for row in rows]
+    # Query points are real locations, so viewports and radii hit data
+    anchors = [rows[rng.randrange(len(rows))] for _ in range(VARIANTS)]
+    viewports = [
+        (a["longitude"] - 0.015, a["latitude"] - 0.01, a["longitude"] + 0.015, a["latitude"] + 0.01)
+        for a in anchors
+    ]
+    city = (min(r["longitude"] for r in rows), min(r["latitude"] for r in rows),
+            max(r["longitude"] for r in rows), max(r["latitude"] for r in rows))
+    tiles = [tiles_for_point(a["longitude"], a["latitude"], 15)[15] for a in anchors]
+    location_ids = [rng.choice(ids) for _ in range(VARIANTS)]
+    cursors = [client.location_cursor({"id": rng.choice(ids)}) for _ in range(VARIANTS)]
+    categories = [CATEGORIES[i % len(CATEGORIES)]["id"] for i in range(VARIANTS)]
+    terms = [SEARCH_TERMS[i % len(SEARCH_TERMS)] for i in range(VARIANTS)]
+
+    # Tokens signed with a benchmark-only secret, verified locally
+    settings.SUPABASE_JWT_SECRET = "benchmark-secret"
+    tokens = [
+        jwt.encode({
+            "sub": f"user-{i}", "aud": "authenticated", "role": "authenticated",
+            "email": f"user{i}@example.com", "exp": int(time.time()) + 3600,
+        }, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+        for i in range(VARIANTS)
+    ]
+    for token in tokens:
+        auth.verified_tokens.put(token, auth.user_from_claims(auth.decode_token(token)))
+
+    # Views skewed towards a few locations, spread over the past week
+    now = time.time()
+    for ranking in client.location_rankings.values():
+        ranking.replace_scores(())
+    for _ in range(min(len(ids), 100000)):
+        location_id = ids[min(int(rng.paretovariate(1.2)) - 1, len(ids) - 1)] if rng.random() < 0.5 else rng.choice(ids)
+        timestamp = now - rng.random() * 7 * 86400
+        for ranking in client.location_rankings.values():
+            ranking.add(location_id, 1.0, timestamp)
+
+    admin_request = _admin_request()
+    admin_page = rows[:ADMIN_PAGE_SIZE]
+    admin_template = templates.get_template("admin/locations.html")
+
+    return {
+        "locations_first_page": lambda v: client.get_locations(limit=100),
+        "locations_cursor": lambda v: client.get_locations(limit=100, cursor=cursors[v]),
+        "locations_category": lambda v: client.get_locations(category_id=categories[v], limit=100),
+        "locations_premium": lambda v: client.get_locations(premium_only=True, limit=100),
+        "locations_search": lambda v: client.get_locations(search_query=terms[v], limit=100),
+        "locations_bbox": lambda v: client.get_locations(bbox=viewports[v], limit=100),
+        "locations_bbox_category": lambda v: client.get_locations(bbox=viewports[v], category_id=categories[v], limit=100),
+        "locations_bbox_search": lambda v: client.get_locations(bbox=viewports[v], search_query=terms[v], limit=100),
+        "locations_city_bbox": lambda v: client.get_locations(bbox=city, limit=100),
+        "locations_nearest": lambda v: client.get_locations(latitude=anchors[v]["latitude"], longitude=anchors[v]["longitude"], limit=20),
+        "locations_radius": lambda v: client.get_locations(latitude=anchors[v]["latitude"], longitude=anchors[v]["longitude"], radius=1000, limit=100),
+        "locations_popular": lambda v: client.get_locations(sort="popular", limit=100),
+        "locations_trending_category": lambda v: client.get_locations(sort="trending", category_id=categories[v], limit=100),
+        "locations_trending_bbox": lambda v: client.get_locations(sort="trending", bbox=viewports[v], limit=100),
+        "ranking_add_view": lambda v: client._rank_location_event(location_ids[v], 1.0),
+        "location_get": lambda v: client.get_location(location_ids[v]),
+        "location_clusters": lambda v: client.get_location_clusters(viewports[v], 14),
+        "location_clusters_city": lambda v: client.get_location_clusters(city, 11),
+        "location_tile": lambda v: client.get_location_tile(15, tiles[v][1], tiles[v][2], "premium"),
+        "search_index": lambda v: client.location_search.search(terms[v]),
+        "auth_verify_token": lambda v: auth.user_from_claims(auth.decode_token(tokens[v])),
+        "auth_cached_token": lambda v: auth.verified_tokens.get(tokens[v]),
+        "render_admin_locations": lambda v: admin_template.render(
+            request=admin_request, user={"email": "admin@example.com", "role": "admin"},
+            locations=admin_page, categories=CATEGORIES, cursor=None, next_cursor="next",
+        ),
+    }
+
+async def run_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Generate a catalogue of `size` locations and run every selected case on it."""
+    started = time.perf_counter()
+    rows = list(generate_locations(size, args.seed))
+    generate_seconds = time.perf_counter() - started
+
+    # Mock mode serves the sample data, so the catalogue replaces it
+    client.SAMPLE_LOCATIONS = rows
+    client.SAMPLE_CATEGORIES = CATEGORIES
+    client._location_index_loaded = False
+    started = time.perf_counter()
+    await client._ensure_location_index()
+    load_seconds = time.perf_counter() - started
+
+    cases = build_cases(rows, args.seed)
+    selected = [name for name in cases if not args.cases or any(pattern in name for pattern in args.cases)]
+
+    results: Dict[str, Any] = {}
+    for name in selected:
+        result = await measure(cases[name], args.duration, args.min_iterations, args.max_iterations)
+        if args.memory:
+            result["peak_alloc_kb"] = await measure_allocations(cases[name])
+        results[name] = result
+        print(
+            f"  {name:<26} p50 {result['p50_ms']:9.3f} ms  p90 {result['p90_ms']:9.3f} ms  "
+            f"p99 {result['p99_ms']:9.3f} ms  {result['ops_per_sec']:10.1f} ops/s",
+            flush=True,
+        )
+
+    return {
+        "size": size,
+        "setup": {
+            "generate_seconds": generate_seconds,
+            "index_load_seconds": load_seconds,
+            "store_mb": client.location_store.memory_usage() / (1024 * 1024),
+            "max_rss_mb": _max_rss_mb(),
+        },
+        "cases": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print how each case changed against a saved run; return the regressed ones."""
+    regressions = []
+    baseline_runs = {run["size"]: run for run in baseline["runs"]}
+    for run in current["runs"]:
+        base = baseline_runs.get(run["size"])
+        if base is None:
+            continue
+        print(f"\nsize {run['size']} vs {baseline.get('git_commit') or 'baseline'} ({baseline['created_at']})")
+        for name, result in run["cases"].items():
+            old = base["cases"].get(name)
+            if old is None:
+                continue
+            p50 = result["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 1.0
+            p99 = result["p99_ms"] / old["p99_ms"] if old["p99_ms"] else 1.0
+            # Tail latency is too noisy to gate on, so only the median is judged
+            regressed = p50 > 1 + threshold
+            if regressed:
+                regressions.append(f"{run['size']}/{name}")
+            print(f"  {name:<26} p50 {p50 - 1:+8.1%}  p99 {p99 - 1:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+async def run(args: argparse.Namespace) -> int:
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "duration": args.duration,
+        "runs": [],
+    }
+    for size in args.sizes:
+        print(f"size {size}", flush=True)
+        report["runs"].append(await run_size(size, args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the API's hot paths on synthetic catalogues")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="Catalogue sizes to run (10k-1M)")
+    parser.add_argument("--cases", nargs="*", help="Only run cases whose name contains one of these")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds spent on each case")
+    parser.add_argument("--min-iterations", type=int, default=20)
+    parser.add_argument("--max-iterations", type=int, default=100000)
+    parser.add_argument("--memory", action="store_true", help="Also measure peak allocations per call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Results file (defaults to benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Saved results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Median slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    # Keep per-request log lines out of the timings
+    logging.disable(logging.WARNING)
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from app.core.config import settings
+from app.db import bulk, executor
+
+async def _read_chunks(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+async def import_locations(args: argparse.Namespace) -> int:
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    report = await bulk.import_locations(_read_chunks(args.path), fmt, batch_size=args.batch_size)
+    print(json.dumps(report.to_dict(), indent=2))
+    return 0 if report.failed == 0 and not report.aborted else 1
+
+async def export_locations(args: argparse.Namespace) -> int:
+    output = open(args.path, "wb") if args.path else sys.stdout.buffer
+    try:
+        async for chunk in bulk.export_locations(args.format):
+            output.write(chunk)
+    finally:
+        if args.path:
+            output.close()
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kurasi Map management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import-locations", help="Bulk import locations from NDJSON or CSV")
+    import_parser.add_argument("path", help="File to import")
+    import_parser.add_argument("--format", choices=bulk.IMPORT_FORMATS, help="Defaults to the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    import_parser.set_defaults(handler=import_locations)
+
+    export_parser = commands.add_parser("export-locations", help="Export every location as NDJSON or CSV")
+    export_parser.add_argument("path", nargs="?", help="Output file (defaults to stdout)")
+    export_parser.add_argument("--format", choices=bulk.IMPORT_FORMATS, default="ndjson")
+    export_parser.set_defaults(handler=export_locations)
+
+    args = parser.parse_args()
+    try:
+        return asyncio.run(args.handler(args))
+    finally:
+        executor.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+-- Distance-sorted radius and k-nearest-neighbour search for Kurasi Map
+
+-- Function to get the locations nearest to a point, with their distance.
+-- When radius_meters is NULL this is a plain k-NN query; otherwise only
+-- locations within the radius are returned. Both use the GIST index on geom.
+CREATE OR REPLACE FUNCTION nearest_locations(
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    radius_meters DOUBLE PRECISION DEFAULT NULL,
+    max_results INTEGER DEFAULT 10,
+    result_offset INTEGER DEFAULT 0,
+    category_filter TEXT DEFAULT NULL,
+    premium_filter BOOLEAN DEFAULT NULL,
+    search_filter TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    name TEXT,
+    description TEXT,
+    category_id TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    address TEXT,
+    operating_hours JSONB,
+    instagram TEXT,
+    phone TEXT,
+    website TEXT,
+    typical_spending TEXT,
+    images TEXT[],
+    premium_only BOOLEAN,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    distance_meters DOUBLE PRECISION
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        l.id,
+        l.name,
+        l.description,
+        l.category_id,
+        l.latitude,
+        l.longitude,
+        l.address,
+        l.operating_hours,
+        l.instagram,
+        l.phone,
+        l.website,
+        l.typical_spending,
+        l.images,
+        l.premium_only,
+        l.created_at,
+        l.updated_at,
+        ST_Distance(l.geom, origin.geog) AS distance_meters
+    FROM locations l,
+        (SELECT ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography AS geog) origin
+    WHERE (
+        category_filter IS NULL
+        OR l.category_id = category_filter
+    )
+    AND (
+        premium_filter IS NULL
+        OR l.premium_only = premium_filter
+    )
+    AND (
+        search_filter IS NULL
+        OR l.name ILIKE '%' || search_filter || '%'
+        OR l.description ILIKE '%' || search_filter || '%'
+    )
+    AND (
+        radius_meters IS NULL
+        OR ST_DWithin(l.geom, origin.geog, radius_meters)
+    )
+    ORDER BY l.geom <-> origin.geog
+    LIMIT max_results
+    OFFSET result_offset;
+$$;
@@ -0,0 +1,68 @@
+-- Location view history and per-location view counts for Kurasi Map
+
+-- Views per location, summed by hour and by day (days start at midnight in
+-- the app's LOCATION_TIMEZONE). Rows are only ever incremented by
+-- record_location_views, so no request has to scan user_view_history.
+CREATE TABLE IF NOT EXISTS location_view_counts (
+    location_id BIGINT NOT NULL REFERENCES locations(id) ON DELETE CASCADE,
+    period TEXT NOT NULL CHECK (period IN ('hour', 'day')),
+    bucket TIMESTAMPTZ NOT NULL,
+    views BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (location_id, period, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_view_history_user ON user_view_history (user_id, viewed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_user_view_history_location ON user_view_history (location_id, viewed_at DESC);
+
+-- Deleting a location removes its history and favorites instead of failing
+ALTER TABLE user_view_history
+    DROP CONSTRAINT IF EXISTS user_view_history_location_id_fkey,
+    ADD CONSTRAINT user_view_history_location_id_fkey
+        FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE;
+
+ALTER TABLE user_favorites
+    DROP CONSTRAINT IF EXISTS user_favorites_location_id_fkey,
+    ADD CONSTRAINT user_favorites_location_id_fkey
+        FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE;
+
+ALTER TABLE location_view_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Location view counts are viewable by everyone"
+    ON location_view_counts FOR SELECT
+    USING (TRUE);
+
+-- Save a batch of views written by the app's background view writer:
+-- `views` are the signed-in users' views ({user_id, location_id, viewed_at})
+-- and `counts` the increments of the hourly and daily counts
+-- ({location_id, period, bucket, views}). Both happen in one transaction.
+-- Rows for locations or users that no longer exist are skipped, so one
+-- deleted location can't make a whole batch fail on every retry. Returns
+-- the number of history rows written (rather than VOID, which the client
+-- can't parse).
+CREATE OR REPLACE FUNCTION record_location_views(views JSONB, counts JSONB)
+RETURNS BIGINT
+LANGUAGE SQL
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO location_view_counts AS c (location_id, period, bucket, views)
+    SELECT i.location_id, i.period, i.bucket, i.views
+    FROM jsonb_to_recordset(counts) AS i(location_id BIGINT, period TEXT, bucket TIMESTAMPTZ, views BIGINT)
+    JOIN locations l ON l.id = i.location_id
+    ON CONFLICT (location_id, period, bucket) DO UPDATE SET views = c.views + EXCLUDED.views;
+
+    WITH history AS (
+        INSERT INTO user_view_history (user_id, location_id, viewed_at)
+        SELECT v.user_id, v.location_id, v.viewed_at
+        FROM jsonb_to_recordset(views) AS v(user_id UUID, location_id BIGINT, viewed_at TIMESTAMPTZ)
+        JOIN locations l ON l.id = v.location_id
+        JOIN auth.users u ON u.id = v.user_id
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM history;
+$$;
+
+-- The function bypasses row level security, so only the app's service key
+-- may call it (functions are executable by PUBLIC by default)
+REVOKE EXECUTE ON FUNCTION record_location_views(JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_location_views(JSONB, JSONB) TO service_role;
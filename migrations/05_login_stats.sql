@@ -0,0 +1,74 @@
+-- Login activity rollups for the Kurasi Map admin dashboard
+
+-- Logins per minute, hour and day by login_status (days start at midnight
+-- in the app's LOCATION_TIMEZONE). Rows are only ever incremented by
+-- record_login_activities, so dashboards never scan login_activities.
+-- Minute rows are kept for a day.
+CREATE TABLE IF NOT EXISTS login_activity_counts (
+    period TEXT NOT NULL CHECK (period IN ('minute', 'hour', 'day')),
+    bucket TIMESTAMPTZ NOT NULL,
+    login_status TEXT NOT NULL,
+    logins BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, bucket, login_status)
+);
+
+-- Logins and failed logins per day for each IP address and user agent.
+-- Rows older than 90 days are removed.
+CREATE TABLE IF NOT EXISTS login_activity_top (
+    day TIMESTAMPTZ NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('ip_address', 'user_agent')),
+    value TEXT NOT NULL,
+    logins BIGINT NOT NULL DEFAULT 0,
+    failures BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, kind, value)
+);
+
+-- A day's most frequent values are read from the top of this index
+CREATE INDEX IF NOT EXISTS idx_login_activity_top_logins ON login_activity_top (day, kind, logins DESC);
+
+-- Only readable with the service key, like the activities themselves
+ALTER TABLE login_activity_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE login_activity_top ENABLE ROW LEVEL SECURITY;
+
+-- Save a batch of login activities written by the app's background login
+-- writer, together with their increments of the login counts ({period,
+-- bucket, login_status, logins}) and of the per-day IP address and user
+-- agent counts ({day, kind, value, logins, failures}), in one transaction,
+-- so a batch that is retried after a failure is never half applied.
+-- Returns the number of activities written.
+CREATE OR REPLACE FUNCTION record_login_activities(activities JSONB, counts JSONB, top JSONB)
+RETURNS BIGINT
+LANGUAGE SQL
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO login_activity_counts AS c (period, bucket, login_status, logins)
+    SELECT i.period, i.bucket, i.login_status, i.logins
+    FROM jsonb_to_recordset(counts) AS i(period TEXT, bucket TIMESTAMPTZ, login_status TEXT, logins BIGINT)
+    ON CONFLICT (period, bucket, login_status) DO UPDATE SET logins = c.logins + EXCLUDED.logins;
+
+    INSERT INTO login_activity_top AS t (day, kind, value, logins, failures)
+    SELECT i.day, i.kind, i.value, i.logins, i.failures
+    FROM jsonb_to_recordset(top) AS i(day TIMESTAMPTZ, kind TEXT, value TEXT, logins BIGINT, failures BIGINT)
+    ON CONFLICT (day, kind, value) DO UPDATE
+        SET logins = t.logins + EXCLUDED.logins, failures = t.failures + EXCLUDED.failures;
+
+    DELETE FROM login_activity_counts WHERE period = 'minute' AND bucket < NOW() - INTERVAL '1 day';
+    DELETE FROM login_activity_top WHERE day < NOW() - INTERVAL '90 days';
+
+    WITH written AS (
+        INSERT INTO login_activities (user_id, email, ip_address, user_agent, device_info, login_status, login_time, location)
+        SELECT a.user_id, a.email, a.ip_address, a.user_agent, a.device_info, a.login_status, a.login_time, a.location
+        FROM jsonb_to_recordset(activities) AS a(
+            user_id UUID, email TEXT, ip_address TEXT, user_agent TEXT, device_info TEXT,
+            login_status TEXT, login_time TIMESTAMPTZ, location TEXT
+        )
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM written;
+$$;
+
+-- The function bypasses row level security, so only the app's service key
+-- may call it (functions are executable by PUBLIC by default)
+REVOKE EXECUTE ON FUNCTION record_login_activities(JSONB, JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_login_activities(JSONB, JSONB, JSONB) TO service_role;
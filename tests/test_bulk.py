@@ -0,0 +1,138 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+from postgrest.exceptions import APIError
+
+from app.db import bulk, client
+
+def _chunks(data: bytes, size: int) -> AsyncIterator[bytes]:
+    async def chunks():
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+    return chunks()
+
+def _collect(rows) -> List[Any]:
+    async def collect():
+        return [row async for row in rows]
+    return asyncio.run(collect())
+
+def _location(name: str, **fields: Any) -> Dict[str, Any]:
+    return {"name": name, "category_id": "cafes", "latitude": -6.2, "longitude": 106.8, "address": "Jl. Sudirman", **fields}
+
+CSV = (
+    '﻿name,category_id,latitude,longitude,address,description,images,operating_hours\r\n'
+    'Kopi Kenangan,cafes,-6.2,106.8,"Jl. Sudirman, Jakarta",,a.jpg|b.jpg,\r\n'
+    'Warung "Sate",restaurants,-6.3,106.9,Jl. Kemang,"Two\n'
+    'lines, and ""quotes""",,"{""Daily"": ""10:00 - 22:00""}"\r\n'
+    '\r\n'
+    'Short,row\r\n'
+    'Nasi Goreng,restaurants,-6.1,106.7,Jl. Menteng,"Kedai ☕",,\r\n'
+).encode("utf-8")
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, len(CSV)])
+def test_iter_csv_whatever_the_chunking(chunk_size):
+    rows = _collect(bulk.iter_csv(_chunks(CSV, chunk_size)))
+    assert rows == [
+        (2, {"name": "Kopi Kenangan", "category_id": "cafes", "latitude": "-6.2", "longitude": "106.8",
+             "address": "Jl. Sudirman, Jakarta", "images": ["a.jpg", "b.jpg"]}),
+        (3, {"name": 'Warung "Sate"', "category_id": "restaurants", "latitude": "-6.3", "longitude": "106.9",
+             "address": "Jl. Kemang", "description": 'Two\nlines, and "quotes"',
+             "operating_hours": {"Daily": "10:00 - 22:00"}}),
+        (6, "Expected 8 columns, got 2"),
+        (7, {"name": "Nasi Goreng", "category_id": "restaurants", "latitude": "-6.1", "longitude": "106.7",
+             "address": "Jl. Menteng", "description": "Kedai ☕"}),
+    ]
+
+def test_iter_csv_reports_bad_json_cells_and_unterminated_quotes():
+    data = b'name,operating_hours\nA,"{not json}"\nB,"never closed\n'
+    assert _collect(bulk.iter_csv(_chunks(data, 5))) == [
+        (2, "Invalid JSON cell: Expecting property name enclosed in double quotes: line 1 column 2 (char 1)"),
+        (3, "Unterminated quoted cell"),
+    ]
+
+def test_iter_ndjson():
+    data = b'{"name": "A"}\n\n[1, 2]\n{"name": \n{"name": "\xe2\x98\x95"}'
+    rows = _collect(bulk.iter_ndjson(_chunks(data, 3)))
+    assert [line for line, _ in rows] == [1, 3, 4, 5]
+    assert rows[0] == (1, {"name": "A"})
+    assert rows[1] == (3, "Expected a JSON object")
+    assert rows[2][1].startswith("Invalid JSON")
+    assert rows[3] == (5, {"name": "☕"})
+
+def test_validate_batch_reports_invalid_rows_and_keeps_ids():
+    report = bulk.ImportReport()
+    batch = [
+        (1, _location("A")),
+        (2, _location("B", id="7")),
+        (3, _location("C", latitude="north")),
+        (4, _location("D", id="x")),
+        (5, {"name": "E"}),
+    ]
+    valid = bulk._validate_batch(batch, report)
+    assert [(line, row["id"], row["name"]) for line, row in valid] == [(1, None, "A"), (2, 7, "B")]
+    assert valid[0][1]["latitude"] == -6.2
+    assert report.failed == 3
+    assert [error["line"] for error in report.errors] == [3, 4, 5]
+    assert report.errors[0]["error"].startswith("latitude: ")
+    assert report.errors[1]["error"] == "id: Input should be a valid integer"
+
+class FakeDatabase:
+    """Stands in for the bulk save functions, rejecting rows by name."""
+
+    def __init__(self, rejected=(), error: Exception = None):
+        self.rejected = set(rejected)
+        self.error = error
+        self.requests: List[List[str]] = []
+        self.saved: List[str] = []
+
+    def save(self, kind: str):
+        async def save(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            names = [row["name"] for row in rows]
+            self.requests.append([kind, *names])
+            if self.error is not None:
+                raise self.error
+            if self.rejected & set(names):
+                raise APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+            self.saved.extend(names)
+            return rows
+        return save
+
+@pytest.fixture
+def database(monkeypatch):
+    def install(**kwargs):
+        fake = FakeDatabase(**kwargs)
+        monkeypatch.setattr(client, "bulk_insert_locations", fake.save("insert"))
+        monkeypatch.setattr(client, "bulk_upsert_locations", fake.save("upsert"))
+        return fake
+    return install
+
+def _import(rows: List[Dict[str, Any]], batch_size: int = 100) -> bulk.ImportReport:
+    data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+    return asyncio.run(bulk.import_locations(_chunks(data, 1024), "ndjson", batch_size=batch_size))
+
+def test_new_and_existing_rows_are_saved_separately(database):
+    fake = database()
+    report = _import([_location("A"), _location("B", id=1), _location("C")])
+    assert report.to_dict()["imported"] == 3
+    assert fake.requests == [["insert", "A", "C"], ["upsert", "B"]]
+
+def test_rejected_rows_are_found_by_bisecting(database):
+    fake = database(rejected={"F"})
+    report = _import([_location(name) for name in "ABCDEFGH"])
+    assert report.imported == 7
+    assert report.errors == [{"line": 6, "error": "duplicate key value violates unique constraint"}]
+    assert sorted(fake.saved) == list("ABCDEGH")
+    # 8 rows, then halves, quarters and pairs down to the bad row
+    assert len(fake.requests) == 7
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError(), APIError({"code": "PGRST000", "message": "Could not connect"})])
+def test_timeouts_and_server_errors_abort_without_retrying(database, error):
+    fake = database(error=error)
+    report = _import([_location(name) for name in "ABCDE"], batch_size=2)
+    assert fake.requests == [["insert", "A", "B"]]
+    assert report.imported == 0
+    assert report.failed == 0
+    assert report.aborted["line"] == 1
+    assert report.to_dict()["aborted"] == report.aborted
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.db.hours import (
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    OpeningHoursIndex,
+    is_open,
+    minute_of_week,
+    parse_day_hours,
+    parse_operating_hours,
+)
+
+JAKARTA = ZoneInfo("Asia/Jakarta")
+
+def _at(day: int, hour: int, minute: int = 0) -> int:
+    return day * MINUTES_PER_DAY + hour * 60 + minute
+
+@pytest.mark.parametrize("text, spans", [
+    ("11:00 - 22:00", [(660, 1320)]),
+    ("10.00-14.00, 17.00-22.00", [(600, 840), (1020, 1320)]),
+    ("9am - 5pm", [(540, 1020)]),
+    ("08:00 s/d 16:00", [(480, 960)]),
+    ("Closed", []),
+    ("Tutup", []),
+    ("24 jam", [(0, MINUTES_PER_DAY)]),
+    ("00:00 - 00:00", [(0, MINUTES_PER_DAY)]),
+    ("22:00 - 02:00", [(1320, MINUTES_PER_DAY + 120)]),
+])
+def test_parse_day_hours(text, spans):
+    assert parse_day_hours(text) == spans
+
+@pytest.mark.parametrize("text", ["call us", "25:00 - 26:00", "10:00"])
+def test_parse_day_hours_rejects_unrecognized_text(text):
+    with pytest.raises(ValueError):
+        parse_day_hours(text)
+
+def test_indonesian_day_range():
+    intervals = parse_operating_hours({"Senin - Jumat": "08:00 - 17:00"})
+    assert intervals == [(_at(day, 8), _at(day, 17)) for day in range(5)]
+
+def test_day_range_wraps_around_the_week():
+    intervals = parse_operating_hours({"Sat - Mon": "10:00 - 12:00"})
+    assert intervals == [(_at(0, 10), _at(0, 12)), (_at(5, 10), _at(5, 12)), (_at(6, 10), _at(6, 12))]
+
+def test_single_day_overrides_daily():
+    intervals = parse_operating_hours({"Sunday": "Closed", "Daily": "09:00 - 17:00"})
+    assert intervals == [(_at(day, 9), _at(day, 17)) for day in range(6)]
+
+def test_overnight_hours_spill_into_the_next_day():
+    intervals = parse_operating_hours({"Friday": "20:00 - 02:00"})
+    assert intervals == [(_at(4, 20), _at(5, 2))]
+    assert is_open(intervals, _at(5, 1, 59))
+    assert not is_open(intervals, _at(5, 2))
+
+def test_sunday_night_wraps_to_monday_morning():
+    intervals = parse_operating_hours({"Minggu": "22:00 - 02:00"})
+    assert intervals == [(0, _at(0, 2)), (_at(6, 22), MINUTES_PER_WEEK)]
+    assert is_open(intervals, _at(0, 1))
+    assert is_open(intervals, _at(6, 23))
+
+def test_touching_spans_are_merged():
+    intervals = parse_operating_hours({"Monday": "00:00 - 00:00", "Tuesday": "00:00 - 12:00"})
+    assert intervals == [(0, _at(1, 12))]
+
+def test_unparseable_single_day_is_closed():
+    intervals = parse_operating_hours({"Daily": "09:00 - 17:00", "Monday": "call us"})
+    assert intervals == [(_at(day, 9), _at(day, 17)) for day in range(1, 7)]
+
+def test_unparseable_range_and_unknown_day_are_skipped():
+    intervals = parse_operating_hours({"Mon - Tue": "call us", "Holidays": "10:00 - 12:00", "Monday": "10:00 - 11:00"})
+    assert intervals == [(_at(0, 10), _at(0, 11))]
+
+@pytest.mark.parametrize("hours", [None, {}, "11:00 - 22:00"])
+def test_missing_hours_are_never_open(hours):
+    assert parse_operating_hours(hours) == []
+
+def test_minute_of_week():
+    # 2026-10-19 is a Monday
+    assert minute_of_week(datetime(2026, 10, 19, 8, 30), JAKARTA) == _at(0, 8, 30)
+    assert minute_of_week(datetime(2026, 10, 19, 1, 30, tzinfo=timezone.utc), JAKARTA) == _at(0, 8, 30)
+    assert minute_of_week(datetime(2026, 10, 18, 20, 0, tzinfo=timezone.utc), JAKARTA) == _at(0, 3)
+
+def test_is_open_bounds():
+    intervals = [(_at(0, 8), _at(0, 17))]
+    assert is_open(intervals, _at(0, 8))
+    assert not is_open(intervals, _at(0, 7, 59))
+    assert not is_open(intervals, _at(0, 17))
+    assert not is_open([], 0)
+
+def test_index_open_codes_match_is_open():
+    patterns = [
+        {"Daily": "09:00 - 17:00"},
+        {"Minggu": "22:00 - 02:00"},
+        {"Mon - Fri": "24 hours", "Saturday": "Closed"},
+        None,
+    ]
+    index = OpeningHoursIndex()
+    index.sync(patterns)
+    for minute in range(0, MINUTES_PER_WEEK, 15):
+        expected = [code for code, hours in enumerate(patterns) if is_open(parse_operating_hours(hours), minute)]
+        assert sorted(index.open_codes(minute).tolist()) == expected
+
+def test_index_sync_only_parses_new_patterns_and_rebuilds_after_clear():
+    patterns = [{"Monday": "08:00 - 10:00"}]
+    index = OpeningHoursIndex()
+    index.sync(patterns)
+    patterns.append({"Monday": "09:00 - 12:00"})
+    index.sync(patterns)
+    assert index.open_codes(_at(0, 11)).tolist() == [1]
+
+    index.sync([{"Tuesday": "08:00 - 10:00"}])
+    assert index.open_codes(_at(0, 9)).tolist() == []
+    assert index.open_codes(_at(1, 9)).tolist() == [0]
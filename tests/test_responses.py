@@ -0,0 +1,27 @@
+import pytest
+
+from app.api.responses import parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=50-500", (50, 99)),
+    (None, None),
+    ("items=0-10", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=10-5", None),
+    # Malformed ranges are ignored, not answered with 416
+    ("bytes=-abc", None),
+    ("bytes=a-10", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)